@@ -0,0 +1,133 @@
+"""Server memory (RSS) per idle client connection for the default
+    `StreamReader`/`StreamWriter` transport, `use_buffered_protocol=True`,
+    and `compact_connections=True`, at 10k, 50k, and 100k connections
+    (or the counts given on the command line). The server runs in its
+    own process; the clients are plain sockets that connect and then
+    stay idle. Counts above the open file limit are skipped, and client
+    sockets are spread over several loopback addresses so that ephemeral
+    ports do not run out.
+"""
+from context import netaio
+import asyncio
+import gc
+import logging
+import multiprocessing
+import random
+import resource
+import socket
+import struct
+import sys
+import time
+
+
+MODES = {
+    'streams': {},
+    'buffered': {'use_buffered_protocol': True},
+    'compact': {'compact_connections': True},
+}
+PORTS_PER_ADDRESS = 20_000
+BATCH = 50
+
+
+def raise_fd_limit() -> int:
+    """Raise the open file limit to the hard limit and return it."""
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def rss() -> int:
+    """Resident set size of this process in bytes."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def serve(port: int, mode: str, pipe):
+    raise_fd_limit()
+    # connections are reset on teardown; the resulting errors are noise
+    logging.disable(logging.CRITICAL)
+    asyncio.run(_serve(port, mode, pipe))
+
+
+async def _serve(port: int, mode: str, pipe):
+    """Report the RSS once started, then again each time the parent
+        sends a connection count and exactly that many clients are
+        connected. Exits once the parent sends `None` and every client is gone.
+    """
+    server = netaio.TCPServer(port=port, interface='127.0.0.1', **MODES[mode])
+    task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.1)
+    loop = asyncio.get_running_loop()
+    gc.collect()
+    pipe.send(rss())
+    while True:
+        ready = loop.create_future()
+        loop.add_reader(pipe.fileno(), ready.set_result, None)
+        await ready
+        loop.remove_reader(pipe.fileno())
+        expected = pipe.recv()
+        if expected is None:
+            break
+        while len(server.clients) != expected:
+            await asyncio.sleep(0.01)
+        gc.collect()
+        pipe.send(rss())
+    task.cancel()
+
+
+def measure(mode: str, count: int) -> float:
+    """Server RSS growth per idle connection, in bytes."""
+    port = random.randint(20000, 30000)
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(port, mode, child))
+    process.start()
+    baseline = parent.recv()
+    clients = []
+    try:
+        for i in range(count):
+            source = f'127.0.0.{2 + i // PORTS_PER_ADDRESS}'
+            clients.append(socket.create_connection(
+                ('127.0.0.1', port), source_address=(source, 0)
+            ))
+            if len(clients) % BATCH == 0:
+                # let the server catch up so the accept backlog never fills
+                parent.send(len(clients))
+                parent.recv()
+        time.sleep(0.5)
+        parent.send(count)
+        loaded = parent.recv()
+    finally:
+        for sock in clients:
+            # reset instead of leaving ports in TIME_WAIT for later runs
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0)
+            )
+            sock.close()
+        parent.send(0)
+        parent.recv()
+        parent.send(None)
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+    return (loaded - baseline) / count
+
+
+def main():
+    limit = raise_fd_limit()
+    counts = [int(a) for a in sys.argv[1:]] or [10_000, 50_000, 100_000]
+    print(f'{"clients":>8} ' + ' '.join(f'{mode:>12}' for mode in MODES))
+    for count in counts:
+        if count + 100 > limit:
+            print(f'{count:>8} skipped: open file limit is {limit}')
+            continue
+        results = [measure(mode, count) for mode in MODES]
+        print(f'{count:>8} ' + ' '.join(
+            f'{r / 1024:>9.2f} KB' for r in results
+        ))
+
+
+if __name__ == '__main__':
+    main()
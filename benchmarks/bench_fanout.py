@@ -0,0 +1,113 @@
+"""Fan-out cost per recipient of `TCPServer.notify` and `UDPNode.notify`
+    with an auth plugin that is not peer-specific, at 1k and 10k
+    subscribers (or the counts given on the command line), versus
+    sending to each subscriber with `send` as the fan-out did before.
+    Writers and the datagram transport are in-memory stand-ins that
+    discard data, so only the Python-level work per recipient is timed.
+"""
+from context import netaio
+from time import perf_counter
+import asyncio
+import sys
+
+
+class NullTransport:
+    """Transport stand-in that never buffers."""
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def sendto(self, data: bytes, addr: tuple[str, int]):
+        pass
+
+
+class NullWriter:
+    """`StreamWriter` stand-in that discards writes."""
+    transport = NullTransport()
+
+    def __init__(self, port: int):
+        self.peername = ('127.0.0.1', port)
+
+    def write(self, data: bytes):
+        pass
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+    def get_extra_info(self, name: str, default=None):
+        return self.peername if name == 'peername' else default
+
+
+def message() -> netaio.Message:
+    return netaio.Message.prepare(
+        netaio.Body.prepare(b'x' * 64, b'news'),
+        netaio.MessageType.NOTIFY_URI,
+    )
+
+
+async def tcp_per_recipient(count: int, rounds: int = 5) -> tuple[float, float]:
+    """Best seconds per recipient for `notify` and for `send` per client."""
+    server = netaio.TCPServer(
+        auth_plugin=netaio.HMACAuthPlugin(config={'secret': 'test'})
+    )
+    writers = [NullWriter(10_000 + i) for i in range(count)]
+    for writer in writers:
+        server.clients.add(writer) # type: ignore
+        server.subscribe(b'news', writer) # type: ignore
+    fanout = per_send = float('inf')
+    for _ in range(rounds):
+        start = perf_counter()
+        await server.notify(b'news', message())
+        fanout = min(fanout, (perf_counter() - start) / count)
+
+        start = perf_counter()
+        prepared = server.prepare_message(message())
+        await asyncio.gather(*[
+            server.send(writer, prepared, use_auth=False, use_cipher=False) # type: ignore
+            for writer in writers
+        ])
+        per_send = min(per_send, (perf_counter() - start) / count)
+    return fanout, per_send
+
+
+def udp_per_recipient(count: int, rounds: int = 5) -> tuple[float, float]:
+    """Best seconds per recipient for `notify` and for `send` per address."""
+    node = netaio.UDPNode(
+        auth_plugin=netaio.HMACAuthPlugin(config={'secret': 'test'})
+    )
+    node.transport = NullTransport() # type: ignore
+    addrs = [('127.0.0.1', 10_000 + i) for i in range(count)]
+    for addr in addrs:
+        node.subscribe(b'news', addr)
+    fanout = per_send = float('inf')
+    for _ in range(rounds):
+        start = perf_counter()
+        node.notify(b'news', message())
+        fanout = min(fanout, (perf_counter() - start) / count)
+
+        start = perf_counter()
+        prepared = node.prepare_message(message())
+        for addr in addrs:
+            node.send(prepared, addr, use_auth=False, use_cipher=False) # type: ignore
+        per_send = min(per_send, (perf_counter() - start) / count)
+    return fanout, per_send
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [1_000, 10_000]
+    print(f'{"subscribers":>11} {"transport":>9} {"fan-out":>12} {"send each":>12}')
+    for count in counts:
+        for name, (fanout, per_send) in (
+            ('tcp', asyncio.run(tcp_per_recipient(count))),
+            ('udp', udp_per_recipient(count)),
+        ):
+            print(
+                f'{count:>11} {name:>9} {fanout * 1e6:>9.2f} us '
+                f'{per_send * 1e6:>9.2f} us'
+            )
+
+
+if __name__ == '__main__':
+    main()
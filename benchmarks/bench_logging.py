@@ -0,0 +1,52 @@
+"""Messages per second through `UDPNode.datagram_received` (decoding,
+    routing, the handler, and preparing the response) with the logger at INFO,
+    at DEBUG, and at DEBUG with only one in 100 messages traced. Log
+    records are written to `os.devnull`, so the numbers include
+    formatting but not terminal output.
+"""
+from context import netaio
+from time import perf_counter
+import logging
+import os
+
+
+def run(node: netaio.UDPNode, data: bytes, n: int) -> float:
+    """Messages per second."""
+    addr = ('127.0.0.1', 8888)
+    start = perf_counter()
+    for _ in range(n):
+        node.datagram_received(data, addr)
+    return n / (perf_counter() - start)
+
+
+def main():
+    logger = logging.getLogger('netaio.bench_logging')
+    logger.propagate = False
+    devnull = open(os.devnull, 'w')
+    logger.addHandler(logging.StreamHandler(devnull))
+    node = netaio.UDPNode(logger=logger, ignore_own_ip=False)
+    node.add_handler(
+        (netaio.MessageType.REQUEST_URI, b'echo'), lambda message, _: message
+    )
+    data = node.prepare_message(netaio.Message.prepare(
+        netaio.Body.prepare(b'x' * 256, uri=b'echo'),
+        netaio.MessageType.REQUEST_URI,
+    )).encode() # type: ignore
+
+    n = 50_000
+    cases = [
+        ('INFO', logging.INFO, 1),
+        ('DEBUG', logging.DEBUG, 1),
+        ('DEBUG, 1 in 100', logging.DEBUG, 100),
+    ]
+    print(f"{'logging':>16} {'messages/s':>11}")
+    for name, level, every in cases:
+        logger.setLevel(level)
+        node.trace_sampler = netaio.TraceSampler(every)
+        run(node, data, 1000)
+        print(f"{name:>16} {run(node, data, n):>11,.0f}")
+    devnull.close()
+
+
+if __name__ == '__main__':
+    main()
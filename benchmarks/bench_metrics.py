@@ -0,0 +1,94 @@
+"""Cost of leaving `Metrics` on: requests per second of an HMAC- and
+    cipher-protected echo server with and without a `Metrics` registry,
+    and the time taken by `Metrics.snapshot` and by recording one
+    message's stages.
+"""
+from context import netaio
+from time import perf_counter
+import asyncio
+import logging
+import random
+
+
+SECRET = {"secret": "bench"}
+KEY = {"key": "bench"}
+
+
+async def throughput(metrics: netaio.Metrics | None, n: int) -> float:
+    """Requests per second over 4 connections."""
+    port = random.randint(20000, 60000)
+    server = netaio.TCPServer(
+        port=port, interface='127.0.0.1', metrics=metrics,
+        auth_plugin=netaio.HMACAuthPlugin(config=SECRET),
+        cipher_plugin=netaio.Sha256StreamCipherPlugin(config=KEY),
+    )
+
+    @server.on((netaio.MessageType.REQUEST_URI, b'items/{id}'))
+    def echo(message, _):
+        return message
+
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.1)
+
+    async def one():
+        client = netaio.TCPClient(
+            host='127.0.0.1', port=port,
+            auth_plugin=netaio.HMACAuthPlugin(config=SECRET),
+            cipher_plugin=netaio.Sha256StreamCipherPlugin(config=KEY),
+        )
+        await client.connect()
+        for i in range(n):
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'x' * 256, uri=f'items/{i}'.encode()),
+                netaio.MessageType.REQUEST_URI,
+            ))
+            await client.receive_once()
+        await client.close()
+
+    start = perf_counter()
+    await asyncio.gather(*[one() for _ in range(4)])
+    elapsed = perf_counter() - start
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+    return 4 * n / elapsed
+
+
+def per_call(func, rounds: int) -> float:
+    """Average microseconds per call."""
+    start = perf_counter()
+    for _ in range(rounds):
+        func()
+    return (perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    netaio.default_server_logger.setLevel(logging.WARNING)
+    netaio.default_client_logger.setLevel(logging.WARNING)
+    metrics = netaio.Metrics()
+    off = asyncio.run(throughput(None, 2000))
+    on = asyncio.run(throughput(metrics, 2000))
+    print(f"{'metrics':>8} {'requests/s':>11}")
+    print(f"{'off':>8} {off:>11,.0f}")
+    print(f"{'on':>8} {on:>11,.0f} ({on/off - 1:+.1%})")
+
+    stages = {
+        stage: 0.00001 for stage in (
+            'decode', 'outer_auth', 'outer_cipher', 'routing', 'handler',
+            'encode', 'write',
+        )
+    }
+    key = (netaio.MessageType.REQUEST_URI, b'items/{id}')
+    record = per_call(
+        lambda: metrics.observe(netaio.MessageType.REQUEST_URI, key, stages),
+        100_000
+    )
+    snapshot = per_call(metrics.snapshot, 1_000)
+    print(f'observe (7 stages): {record:.2f} us')
+    print(f'snapshot ({len(metrics.histograms)} histograms): {snapshot:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
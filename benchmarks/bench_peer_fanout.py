@@ -0,0 +1,104 @@
+"""Wall time and longest event loop stall of a `TCPServer.broadcast`
+    encrypted per peer with `X25519CipherPlugin` to 5k clients (or the
+    counts given on the command line), preparing every copy on the
+    event loop versus in a `peer_offloader` thread pool. Writers are
+    in-memory stand-ins that discard data. PyNaCl releases the GIL, so
+    the wall time falls with the number of cores; the stall falls to
+    about one batch of bookkeeping regardless.
+"""
+from context import netaio
+from concurrent.futures import ThreadPoolExecutor
+from nacl.public import PrivateKey
+from netaio.asymmetric import X25519CipherPlugin
+from os import cpu_count, urandom
+from time import perf_counter
+import asyncio
+import packify
+import sys
+
+
+class NullTransport:
+    """Transport stand-in that never buffers."""
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+
+class NullWriter:
+    """`StreamWriter` stand-in that discards writes."""
+    transport = NullTransport()
+
+    def __init__(self, port: int):
+        self.peername = ('127.0.0.1', port)
+
+    def write(self, data: bytes):
+        pass
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+    def get_extra_info(self, name: str, default=None):
+        return self.peername if name == 'peername' else default
+
+
+async def stall_monitor(stalls: list[float], interval: float = 0.001):
+    """Record the longest gap between wakeups of the loop."""
+    last = perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        now = perf_counter()
+        stalls[0] = max(stalls[0], now - last - interval)
+        last = now
+
+
+async def broadcast(count: int, offloader: netaio.Offloader | None):
+    """Seconds taken by one broadcast and the longest loop stall."""
+    server = netaio.TCPServer(
+        cipher_plugin=X25519CipherPlugin({'seed': urandom(32)}),
+        peer_offloader=offloader,
+    )
+    for i in range(count):
+        writer = NullWriter(10_000 + i)
+        server.clients.add(writer) # type: ignore
+        pubkey = bytes(PrivateKey.generate().public_key)
+        server.add_or_update_peer(
+            i.to_bytes(4, 'big'), packify.pack({'pubkey': pubkey}),
+            writer.peername
+        )
+    message = netaio.Message.prepare(
+        netaio.Body.prepare(b'x' * 256, b'news'),
+        netaio.MessageType.NOTIFY_URI,
+    )
+    stalls = [0.0]
+    monitor = asyncio.create_task(stall_monitor(stalls))
+    await asyncio.sleep(0.01)
+    stalls[0] = 0.0
+    start = perf_counter()
+    await server.broadcast(message)
+    elapsed = perf_counter() - start
+    monitor.cancel()
+    return elapsed, stalls[0]
+
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [5_000]
+    threads = max(2, cpu_count() or 1)
+    print(f'{"clients":>8} {"mode":>12} {"wall":>10} {"max stall":>10}')
+    for count in counts:
+        for name, offloader in (
+            ('event loop', None),
+            (f'{threads} threads', netaio.Offloader(ThreadPoolExecutor(threads))),
+        ):
+            elapsed, stall = asyncio.run(broadcast(count, offloader))
+            print(
+                f'{count:>8} {name:>12} {elapsed * 1e3:>7.1f} ms '
+                f'{stall * 1e3:>7.1f} ms'
+            )
+            if offloader is not None:
+                offloader.shutdown()
+
+
+if __name__ == '__main__':
+    main()
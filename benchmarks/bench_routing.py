@@ -0,0 +1,94 @@
+"""Handler lookup time with thousands of registered routes: probing
+    the `handlers` and `ephemeral_handlers` dicts with every key from
+    `keys_extractor` (as `TCPServer` and `UDPNode` did before) versus a
+    single `Router.resolve`. Static URIs, parameterized URIs, and
+    message-type fallbacks are measured separately.
+"""
+from context import netaio
+from time import perf_counter
+
+
+def probe(handlers: dict, ephemeral_handlers: dict, message, host):
+    """The previous lookup: build the key list and probe both dicts."""
+    for key in netaio.keys_extractor(message, host):
+        if key in handlers or key in ephemeral_handlers:
+            return key
+    return None
+
+
+def per_lookup(lookup, messages: list, host, rounds: int) -> float:
+    """Average nanoseconds per lookup."""
+    start = perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            lookup(message, host)
+    return (perf_counter() - start) / (rounds * len(messages)) * 1e9
+
+
+def message(uri: bytes) -> netaio.Message:
+    return netaio.Message.prepare(
+        netaio.Body.prepare(b'', uri=uri), netaio.MessageType.REQUEST_URI
+    )
+
+
+def main():
+    host = ('127.0.0.1', 8888)
+    print(
+        f"{'routes':>7} {'lookup':>14} {'key probing (ns)':>17} "
+        f"{'router (ns)':>12} {'speedup':>8}"
+    )
+    for count in (1_000, 10_000):
+        handlers = {}
+        router = netaio.Router()
+        for i in range(count):
+            for key in (
+                (netaio.MessageType.REQUEST_URI, f'static/{i}'.encode()),
+                (netaio.MessageType.CREATE_URI, f'users/{i}/{{id}}'.encode()),
+            ):
+                handlers[key] = None
+                router.add(key)
+        handlers[netaio.MessageType.PUBLISH_URI] = None
+        router.add(netaio.MessageType.PUBLISH_URI)
+
+        cases = {
+            'static': [message(f'static/{i}'.encode()) for i in range(0, count, 7)],
+            'fallback': [
+                netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=f'topic/{i}'.encode()),
+                    netaio.MessageType.PUBLISH_URI
+                )
+                for i in range(0, count, 7)
+            ],
+        }
+        for name, messages in cases.items():
+            before = per_lookup(
+                lambda m, h: probe(handlers, {}, m, h), messages, host, 20
+            )
+            after = per_lookup(
+                lambda m, h: router.resolve(
+                    m.header.message_type, m.body.uri, h
+                ),
+                messages, host, 20
+            )
+            print(
+                f"{count:>7} {name:>14} {before:>17,.0f} {after:>12,.0f} "
+                f"{before/after:>7.2f}x"
+            )
+
+        # parameterized routes cannot be found by key probing at all
+        messages = [
+            netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=f'users/{i}/42'.encode()),
+                netaio.MessageType.CREATE_URI
+            )
+            for i in range(0, count, 7)
+        ]
+        after = per_lookup(
+            lambda m, h: router.resolve(m.header.message_type, m.body.uri, h),
+            messages, host, 20
+        )
+        print(f"{count:>7} {'parameterized':>14} {'n/a':>17} {after:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
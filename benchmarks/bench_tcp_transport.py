@@ -0,0 +1,132 @@
+"""Echo throughput over localhost TCP for the default `StreamReader`
+    transport versus `use_buffered_protocol=True`. The client writes a
+    window of pipelined requests and then reads the responses, so the
+    server sees several frames per socket read. Message processing
+    (auth field decoding in particular) dominates the echo numbers, so
+    the rate at which each transport alone can read frames is also
+    reported.
+"""
+from context import netaio
+from netaio.transport import read_frame
+from time import perf_counter
+import asyncio
+import logging
+import random
+
+
+async def run(use_buffered_protocol: bool, size: int, n: int, window: int) -> float:
+    """Messages per second for `n` echoed messages of `size` bytes."""
+    port = random.randint(20000, 60000)
+    server = netaio.TCPServer(
+        port=port, interface='127.0.0.1',
+        use_buffered_protocol=use_buffered_protocol
+    )
+    client = netaio.TCPClient(
+        port=port, use_buffered_protocol=use_buffered_protocol
+    )
+
+    @server.on(netaio.MessageType.REQUEST_URI)
+    def echo(message, _):
+        return message
+
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.1)
+    await client.connect()
+    _, writer = client.hosts[client.default_host]
+    frame = netaio.Message.prepare(
+        netaio.Body.prepare(b'x' * size, b'echo'),
+        netaio.MessageType.REQUEST_URI,
+    ).encode()
+
+    start = perf_counter()
+    for _ in range(n // window):
+        writer.writelines([frame] * window)
+        await writer.drain()
+        for _ in range(window):
+            await client.receive_once()
+    elapsed = perf_counter() - start
+
+    await client.close()
+    await asyncio.sleep(0.1)
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+    return n / elapsed
+
+
+async def run_raw(use_buffered_protocol: bool, size: int, n: int) -> float:
+    """Frames per second read by `read_frame` from one connection."""
+    frame = netaio.Message.prepare(
+        netaio.Body.prepare(b'x' * size, b'echo'),
+        netaio.MessageType.REQUEST_URI,
+    ).encode()
+    done = asyncio.get_running_loop().create_future()
+
+    async def consume(reader, writer):
+        for _ in range(n):
+            await read_frame(
+                reader, netaio.Header, netaio.MessageType
+            )
+        done.set_result(perf_counter())
+        writer.close()
+
+    if use_buffered_protocol:
+        server = await asyncio.get_running_loop().create_server(
+            lambda: netaio.FrameProtocol(
+                netaio.Header, netaio.MessageType,
+                client_connected_cb=lambda p: consume(p, p),
+            ),
+            '127.0.0.1', 0
+        )
+    else:
+        server = await asyncio.start_server(consume, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    _, writer = await asyncio.open_connection('127.0.0.1', port)
+
+    start = perf_counter()
+    for _ in range(n // 100):
+        writer.writelines([frame] * 100)
+        await writer.drain()
+    end = await done
+    writer.close()
+    server.close()
+    return n / (end - start)
+
+
+def main():
+    netaio.default_server_logger.setLevel(logging.WARNING)
+    netaio.default_client_logger.setLevel(logging.WARNING)
+    n, window = 20_000, 50
+    print('transport only (frames read)')
+    print(
+        f"{'content size':>12} {'streams (f/s)':>14} "
+        f"{'buffered (f/s)':>15} {'speedup':>8}"
+    )
+    for size in (16, 1024, 16_000):
+        count = 100_000 if size < 16_000 else 20_000
+        before = asyncio.run(run_raw(False, size, count))
+        after = asyncio.run(run_raw(True, size, count))
+        print(
+            f"{size:>12} {before:>14,.0f} {after:>15,.0f} "
+            f"{after/before:>7.2f}x"
+        )
+    print()
+    print('echo (full message processing)')
+    print(
+        f"{'content size':>12} {'streams (m/s)':>14} "
+        f"{'buffered (m/s)':>15} {'speedup':>8}"
+    )
+    for size in (16, 1024, 16_000):
+        count = n if size < 16_000 else n // 10
+        before = asyncio.run(run(False, size, count, window))
+        after = asyncio.run(run(True, size, count, window))
+        print(
+            f"{size:>12} {before:>14,.0f} {after:>15,.0f} "
+            f"{after/before:>7.2f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Echo latency and throughput between a `TCPServer` and a `TCPClient`
+    in the same host over loopback TCP versus a Unix domain socket
+    (`path=...`). Latency is measured one request at a time; throughput
+    with a window of pipelined requests, as in `bench_tcp_transport.py`.
+"""
+from context import netaio
+from time import perf_counter
+import asyncio
+import logging
+import os
+import random
+import tempfile
+
+
+async def run(
+        transport: str, size: int, n: int, window: int
+    ) -> tuple[float, float, float]:
+    """Median and 99th percentile round-trip time in seconds for `n`
+        sequential echoes, then messages per second for `n` pipelined
+        echoes, of `size` bytes of content.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if transport == 'unix':
+            address = {'path': os.path.join(tmpdir, 'bench.sock')}
+            server = netaio.TCPServer(**address)
+        else:
+            address = {'port': random.randint(20000, 60000)}
+            server = netaio.TCPServer(interface='127.0.0.1', **address)
+        client = netaio.TCPClient(**address)
+
+        @server.on(netaio.MessageType.REQUEST_URI)
+        def echo(message, _):
+            return message
+
+        server_task = asyncio.create_task(server.start())
+        await asyncio.sleep(0.1)
+        await client.connect()
+        _, writer = client.hosts[client.default_host]
+        frame = netaio.Message.prepare(
+            netaio.Body.prepare(b'x' * size, b'echo'),
+            netaio.MessageType.REQUEST_URI,
+        ).encode()
+
+        times = []
+        for _ in range(n):
+            start = perf_counter()
+            writer.write(frame)
+            await writer.drain()
+            await client.receive_once()
+            times.append(perf_counter() - start)
+        times.sort()
+
+        start = perf_counter()
+        for _ in range(n // window):
+            writer.writelines([frame] * window)
+            await writer.drain()
+            for _ in range(window):
+                await client.receive_once()
+        rate = n / (perf_counter() - start)
+
+        await client.close()
+        await asyncio.sleep(0.1)
+        server_task.cancel()
+        try:
+            await server_task
+        except asyncio.CancelledError:
+            pass
+    return times[len(times) // 2], times[len(times) * 99 // 100], rate
+
+
+def main():
+    netaio.default_server_logger.setLevel(logging.WARNING)
+    netaio.default_client_logger.setLevel(logging.WARNING)
+    n, window = 10_000, 50
+    print(
+        f"{'content size':>12} {'transport':>9} {'p50 (us)':>9} "
+        f"{'p99 (us)':>9} {'echo (m/s)':>11}"
+    )
+    for size in (64, 1024, 16_000):
+        count = n if size < 16_000 else n // 5
+        for transport in ('tcp', 'unix'):
+            p50, p99, rate = asyncio.run(run(transport, size, count, window))
+            print(
+                f"{size:>12} {transport:>9} {p50 * 1e6:>9.1f} "
+                f"{p99 * 1e6:>9.1f} {rate:>11,.0f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
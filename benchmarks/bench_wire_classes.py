@@ -0,0 +1,73 @@
+"""Memory and construction time per decoded message: `__dict__`-based
+    header and message dataclasses (as they were before) versus the
+    slotted `Message` with `Header`, and `CompactMessage` with
+    `CompactHeader`.
+"""
+from context import netaio
+from dataclasses import dataclass
+from time import perf_counter
+import tracemalloc
+
+
+@dataclass
+class LegacyMessage:
+    """A message dataclass without `__slots__`."""
+    header: netaio.Header
+    auth_data: netaio.AuthFields
+    body: netaio.Body
+
+
+def legacy_decode(data: bytes) -> LegacyMessage:
+    """Decode with the `__dict__`-based classes."""
+    header = netaio.Header.decode(data)
+    body_start = 9 + header.auth_length
+    return LegacyMessage(
+        header=header,
+        auth_data=netaio.AuthFields.decode(data[9:body_start]),
+        body=netaio.Body.decode(data[body_start:]),
+    )
+
+
+def bytes_per_message(decode, frame: bytes, n: int = 20_000) -> float:
+    """Average traced allocation per retained decoded message."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [decode(frame) for _ in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(s.size_diff for s in after.compare_to(before, 'filename'))
+    del kept
+    return total / n
+
+
+def messages_per_second(decode, frame: bytes, rounds: int = 5) -> float:
+    """Best decodes per second over several rounds."""
+    n = 2000
+    best = 0.0
+    for _ in range(rounds):
+        start = perf_counter()
+        for _ in range(n):
+            decode(frame)
+        best = max(best, n / (perf_counter() - start))
+    return best
+
+
+def main():
+    frame = netaio.Message.prepare(
+        netaio.Body.prepare(b'x' * 64, b'some/resource/uri'),
+        netaio.MessageType.PUBLISH_URI,
+    ).encode()
+    candidates = (
+        ('dict-based', legacy_decode),
+        ('Message', netaio.Message.decode),
+        ('CompactMessage', netaio.CompactMessage.decode),
+    )
+    print(f"{'class':>16} {'bytes/msg':>10} {'msgs/s':>12}")
+    for name, decode in candidates:
+        size = bytes_per_message(decode, frame)
+        rate = messages_per_second(decode, frame)
+        print(f"{name:>16} {size:>10,.0f} {rate:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Request throughput of an HMAC- and cipher-protected echo server run
+    by a `WorkerPool` with 1, 2, and 4 workers. Load is generated by as
+    many client processes as there are CPUs, each with several
+    connections, so the clients are not the bottleneck.
+"""
+from context import netaio
+from time import perf_counter
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+
+
+SECRET = {"secret": "bench"}
+KEY = {"key": "bench"}
+
+
+def make_client(port: int) -> netaio.TCPClient:
+    return netaio.TCPClient(
+        host='127.0.0.1', port=port,
+        auth_plugin=netaio.HMACAuthPlugin(config=SECRET),
+        cipher_plugin=netaio.Sha256StreamCipherPlugin(config=KEY),
+    )
+
+
+async def load(port: int, connections: int, n: int):
+    """Send `n` requests on each of `connections` connections."""
+    async def one():
+        client = make_client(port)
+        await client.connect()
+        for _ in range(n):
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'x' * 256, uri=b'echo'),
+                netaio.MessageType.REQUEST_URI,
+            ))
+            await client.receive_once()
+        await client.close()
+    await asyncio.gather(*[one() for _ in range(connections)])
+
+
+def client_process(port: int, connections: int, n: int):
+    netaio.default_client_logger.setLevel(logging.WARNING)
+    asyncio.run(load(port, connections, n))
+
+
+def run(workers: int, clients: int, connections: int, n: int) -> float:
+    """Requests per second served by `workers` worker processes."""
+    port = random.randint(20000, 60000)
+    server = netaio.TCPServer(
+        port=port, interface='127.0.0.1',
+        auth_plugin=netaio.HMACAuthPlugin(config=SECRET),
+        cipher_plugin=netaio.Sha256StreamCipherPlugin(config=KEY),
+    )
+
+    @server.on(netaio.MessageType.REQUEST_URI)
+    def echo(message, _):
+        return message
+
+    pool = netaio.WorkerPool(server, workers)
+    pool.start()
+    try:
+        asyncio.run(asyncio.sleep(0.5))
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=client_process, args=(port, connections, n))
+            for _ in range(clients)
+        ]
+        start = perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = perf_counter() - start
+    finally:
+        pool.stop()
+    return clients * connections * n / elapsed
+
+
+def main():
+    netaio.default_server_logger.setLevel(logging.WARNING)
+    clients = os.cpu_count() or 1
+    print(f'{clients} client processes')
+    print(f"{'workers':>7} {'requests/s':>11} {'scaling':>8}")
+    baseline = None
+    for workers in (1, 2, 4):
+        rate = run(workers, clients, 4, 500)
+        baseline = baseline or rate
+        print(f"{workers:>7} {rate:>11,.0f} {rate/baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
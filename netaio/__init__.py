@@ -1,11 +1,28 @@
 from .client import TCPClient, AutoReconnectTimeoutHandler
 from .server import TCPServer
+from .workers import WorkerPool
+from .bus import WorkerBus
+from .offload import Offloader, OffloadedPlugin
+from .watchdog import Watchdog, CallStats
+from .metrics import Metrics, LatencyHistogram, STATS_URI
+from .tracing import TraceSampler
+from .cache import ResponseCache
+from .coalesce import RequestCoalescer
+from .admission import AdmissionControl, AdmissionPolicy, TokenBucket
+from .keepalive import KeepAlive, KeepAlivePolicy, LinkState, TimerWheel
+from .transport import FrameProtocol
+from .connection import (
+    Connection, OutboundQueue, OverflowAction, SlowConsumerPolicy
+)
+from .routing import UriTrie, Router, get_route_params
 from .node import UDPNode
 from .common import (
     Header,
+    CompactHeader,
     AuthFields,
     Body,
     Message,
+    CompactMessage,
     MessageType,
     HeaderProtocol,
     AuthFieldsProtocol,
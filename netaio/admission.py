@@ -0,0 +1,141 @@
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass
+from time import monotonic
+from typing import Hashable
+
+
+class TokenBucket:
+    """Token bucket rate limiter: holds up to `burst` tokens and
+        refills at `rate` tokens per second. Each admitted message takes
+        one token.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+    rate: float
+    burst: float
+    tokens: float
+    updated: float
+
+    def __init__(self, rate: float, burst: float | None = None):
+        """Initialize a full bucket. `burst` defaults to `rate` (but at
+            least 1). Raises `ValueError` if `rate` is not positive or
+            `burst` is less than 1.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        burst = max(rate, 1.0) if burst is None else burst
+        if burst < 1:
+            raise ValueError('burst must be at least 1')
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+
+    def take(self, now: float | None = None) -> bool:
+        """Take a token if one is available and return whether it was."""
+        now = monotonic() if now is None else now
+        tokens = self.tokens + (now - self.updated) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        self.updated = now
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+
+@dataclass
+class AdmissionPolicy:
+    """Limits enforced by `AdmissionControl`. A limit of `None` is not
+        enforced. `max_connections` caps concurrent connections.
+        `connection_rate` and `peer_rate` are messages per second per
+        connection and per peer ID (for connections with a known peer),
+        with bursts of up to `connection_burst` and `peer_burst`
+        messages. `max_in_flight` caps the messages being handled at
+        once across all connections. If `respond` is `True`, a shed
+        message is answered at once with an error message made without
+        plugins (so it may overtake responses to earlier messages that
+        are still being handled); otherwise it is dropped silently.
+    """
+    max_connections: int | None = None
+    connection_rate: float | None = None
+    connection_burst: float | None = None
+    peer_rate: float | None = None
+    peer_burst: float | None = None
+    max_in_flight: int | None = None
+    respond: bool = False
+
+
+class AdmissionControl:
+    """Decides which connections and messages a `TCPServer` accepts,
+        before any message is decoded or passed to a plugin. Every
+        rejection is counted in `counters` under
+        `'connections_rejected'`, `'connection_rate_limited'`,
+        `'peer_rate_limited'`, or `'in_flight_limited'`.
+    """
+    policy: AdmissionPolicy
+    counters: Counter[str]
+    in_flight: int
+    connection_buckets: dict[Hashable, TokenBucket]
+    peer_buckets: dict[bytes, TokenBucket]
+
+    def __init__(self, policy: AdmissionPolicy):
+        self.policy = policy
+        self.counters = Counter()
+        self.in_flight = 0
+        self.connection_buckets = {}
+        self.peer_buckets = {}
+
+    def connect(self, connection: Hashable, active: int) -> bool:
+        """Return whether a new connection is accepted while `active`
+            connections are open.
+        """
+        policy = self.policy
+        if policy.max_connections is not None and \
+                active >= policy.max_connections:
+            self.counters['connections_rejected'] += 1
+            return False
+        if policy.connection_rate is not None:
+            self.connection_buckets[connection] = TokenBucket(
+                policy.connection_rate, policy.connection_burst
+            )
+        return True
+
+    def disconnect(self, connection: Hashable):
+        """Forget a closed connection."""
+        self.connection_buckets.pop(connection, None)
+
+    def forget_peer(self, peer_id: bytes):
+        """Forget the rate limit state of a removed peer."""
+        self.peer_buckets.pop(peer_id, None)
+
+    def admit(self, connection: Hashable, peer_id: bytes | None) -> bool:
+        """Return whether a received message is handled. If it is, the
+            caller must call `release` once it has been handled.
+        """
+        policy = self.policy
+        if policy.max_in_flight is not None and \
+                self.in_flight >= policy.max_in_flight:
+            self.counters['in_flight_limited'] += 1
+            return False
+        now = monotonic()
+        bucket = self.connection_buckets.get(connection)
+        if bucket is not None and not bucket.take(now):
+            self.counters['connection_rate_limited'] += 1
+            return False
+        if peer_id is not None and policy.peer_rate is not None:
+            bucket = self.peer_buckets.get(peer_id)
+            if bucket is None:
+                bucket = self.peer_buckets[peer_id] = TokenBucket(
+                    policy.peer_rate, policy.peer_burst
+                )
+            if not bucket.take(now):
+                self.counters['peer_rate_limited'] += 1
+                return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        """Mark an admitted message as handled."""
+        self.in_flight -= 1
@@ -0,0 +1,329 @@
+from __future__ import annotations
+from .common import MessageProtocol, default_server_logger
+from .connection import OutboundQueue
+from .routing import UriTrie, is_uri_pattern
+from typing import Any, Hashable
+import asyncio
+import logging
+import os
+import packify
+import struct
+
+
+_frame_length = struct.Struct('!I')
+
+
+class WorkerBus:
+    """Pub/sub fan-out between the worker processes of a sharded
+        `TCPServer` (see `WorkerPool`) over Unix domain sockets, without
+        an external broker. Each worker listens on its own socket in
+        `path` and connects to the socket of every other worker.
+
+        Workers announce the keys they have subscribers for, so a
+        `notify` is only forwarded to the workers that need it, while a
+        `broadcast` is forwarded to all of them. A message prepared
+        without peer-specific plugins is forwarded as the prepared frame
+        and sent by the other workers as-is; otherwise the original
+        message is forwarded and prepared by each worker with its own
+        server plugins. Keys must be serializable by `packify`.
+        Forwarded messages from each worker are sent in order by one
+        task per connection, so a slow fan-out does not hold up the
+        announcements that follow it; at most `max_pending` of them
+        wait to be sent before the bus stops reading from that worker.
+    """
+    path: str
+    index: int
+    size: int
+    reconnect_delay: float
+    max_pending: int
+    server: Any
+    interest: dict[Hashable, set[int]]
+    pattern_interest: UriTrie
+    messages_forwarded: int
+    messages_received: int
+    logger: logging.Logger
+
+    def __init__(
+            self, path: str, index: int, size: int, *,
+            reconnect_delay: float = 0.1, max_pending: int = 1024,
+            logger: logging.Logger = default_server_logger
+        ):
+        """Initialize the bus for worker `index` of `size` workers.
+            `path` is a directory shared by all workers. A lost
+            connection to another worker is retried every
+            `reconnect_delay` seconds. `max_pending` bounds the
+            forwarded messages received from each worker that are
+            waiting to be sent.
+        """
+        if max_pending < 1:
+            raise ValueError('max_pending must be at least 1')
+        self.path = path
+        self.index = index
+        self.size = size
+        self.reconnect_delay = reconnect_delay
+        self.max_pending = max_pending
+        self.server = None
+        self.interest = {}
+        self.pattern_interest = UriTrie()
+        self.messages_forwarded = 0
+        self.messages_received = 0
+        self.logger = logger
+        self._peer_keys: dict[int, set[Hashable]] = {}
+        self._peers: dict[int, OutboundQueue] = {}
+        self._listener: asyncio.AbstractServer | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def socket_path(self, index: int) -> str:
+        """Return the socket path of a worker."""
+        return os.path.join(self.path, f'worker-{index}.sock')
+
+    async def start(self, server: Any):
+        """Attach the bus to the `TCPServer` of this worker, listen for
+            the other workers, and start connecting to them.
+        """
+        self.server = server
+        server.bus = self
+        path = self.socket_path(self.index)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._listener = await asyncio.start_unix_server(
+            self._handle_peer, path
+        )
+        for index in range(self.size):
+            if index != self.index:
+                task = asyncio.create_task(self._connect(index))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        """Detach from the server and close all bus connections."""
+        if self.server is not None and self.server.bus is self:
+            self.server.bus = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def has_subscribers(self, key: Hashable) -> bool:
+        """Check whether another worker has subscribers for the key."""
+        if key in self.interest:
+            return True
+        return bool(self.pattern_interest) and isinstance(key, bytes) \
+            and bool(self.pattern_interest.match(key))
+
+    def subscribed(self, key: Hashable):
+        """Announce that this worker has its first subscriber for a key."""
+        self._send_all(['s', key])
+
+    def unsubscribed(self, key: Hashable):
+        """Announce that this worker has no more subscribers for a key."""
+        self._send_all(['u', key])
+
+    def notify(
+            self, key: Hashable, message: MessageProtocol, *,
+            prepared: bool, use_auth: bool = True, use_cipher: bool = True
+        ):
+        """Forward a notification to the workers with subscribers for
+            the key. If `prepared` is `True`, the message already has
+            all plugins applied; otherwise `use_auth` and `use_cipher`
+            are passed to `notify` on the other workers.
+        """
+        targets = set(self.interest.get(key, ()))
+        if self.pattern_interest and isinstance(key, bytes):
+            for workers in self.pattern_interest.match(key):
+                targets.update(workers)
+        if not targets:
+            return
+        frame = self._pack(
+            ['n', key, message.encode(), prepared, use_auth, use_cipher]
+        )
+        if frame is None:
+            return
+        for index in targets:
+            queue = self._peers.get(index)
+            if queue is not None and queue.put(frame):
+                self.messages_forwarded += 1
+
+    def broadcast(
+            self, message: MessageProtocol, *,
+            prepared: bool, use_auth: bool = True, use_cipher: bool = True
+        ):
+        """Forward a broadcast to every other worker. `prepared`,
+            `use_auth`, and `use_cipher` are used as in `notify`.
+        """
+        self.messages_forwarded += self._send_all(
+            ['b', message.encode(), prepared, use_auth, use_cipher]
+        )
+
+    def _pack(self, item: list) -> bytes | None:
+        """Serialize a bus frame, or log and return `None` if it
+            cannot be serialized.
+        """
+        try:
+            data = packify.pack(item)
+        except packify.UsageError:
+            self.logger.warning(
+                "Cannot forward key=%s to other workers", item[1]
+            )
+            return None
+        return _frame_length.pack(len(data)) + data
+
+    def _send_all(self, item: list) -> int:
+        """Send a bus frame to every connected worker and return the
+            number of workers it was queued for.
+        """
+        if not self._peers:
+            return 0
+        frame = self._pack(item)
+        if frame is None:
+            return 0
+        return sum(queue.put(frame) for queue in self._peers.values())
+
+    async def _connect(self, index: int):
+        """Keep a connection to another worker open, announcing this
+            worker and its subscribed keys after every (re)connect.
+        """
+        path = self.socket_path(index)
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+            except OSError:
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            queue = OutboundQueue(writer, logger=self.logger)
+            self._peers[index] = queue
+            queue.put(self._pack(['h', self.index])) # type: ignore
+            for key in list(self.server.subscriptions):
+                frame = self._pack(['s', key])
+                if frame is not None:
+                    queue.put(frame)
+            try:
+                # the other worker never writes on this connection
+                await reader.read()
+            except OSError:
+                pass
+            finally:
+                if self._peers.get(index) is queue:
+                    del self._peers[index]
+                queue.abort()
+            self.logger.debug("Lost bus connection to worker %d", index)
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _handle_peer(
+            self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ):
+        """Receive announcements and forwarded messages from another
+            worker. Announcements are handled as they arrive; forwarded
+            messages are queued for `_fan_out`, and reading waits while
+            the queue is full.
+        """
+        peer = None
+        # tracked so that `stop` also ends connections from other workers
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        pending: asyncio.Queue = asyncio.Queue(self.max_pending)
+        consumer = asyncio.create_task(self._fan_out(pending))
+        self._tasks.add(consumer)
+        consumer.add_done_callback(self._tasks.discard)
+        try:
+            while True:
+                size, = _frame_length.unpack(
+                    await reader.readexactly(_frame_length.size)
+                )
+                kind, *args = packify.unpack(await reader.readexactly(size))
+                if kind == 'h':
+                    peer = args[0]
+                    self._drop_interest(peer)
+                elif kind == 's':
+                    self._add_interest(args[0], peer) # type: ignore
+                elif kind == 'u':
+                    self._remove_interest(args[0], peer) # type: ignore
+                elif kind in ('n', 'b'):
+                    self.messages_received += 1
+                    await pending.put((kind, args))
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        except Exception:
+            self.logger.error("Error handling bus message:", exc_info=True)
+        finally:
+            if peer is not None:
+                self._drop_interest(peer)
+            writer.close()
+        # send the messages already received, then stop the consumer
+        await pending.put(None)
+
+    async def _fan_out(self, pending: asyncio.Queue):
+        """Send the forwarded messages received from one worker in
+            order, logging any error, until `None` is queued.
+        """
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            kind, args = item
+            try:
+                if kind == 'n':
+                    key, frame, prepared, use_auth, use_cipher = args
+                    await self.server.notify(
+                        key, self._decode(frame),
+                        use_auth=use_auth and not prepared,
+                        use_cipher=use_cipher and not prepared,
+                        forward=False,
+                    )
+                else:
+                    frame, prepared, use_auth, use_cipher = args
+                    await self.server.broadcast(
+                        self._decode(frame),
+                        use_auth=use_auth and not prepared,
+                        use_cipher=use_cipher and not prepared,
+                        forward=False,
+                    )
+            except Exception:
+                self.logger.error("Error sending bus message:", exc_info=True)
+
+    def _decode(self, frame: bytes) -> MessageProtocol:
+        """Decode a forwarded frame with the server's message classes."""
+        server = self.server
+        view = memoryview(frame)
+        header = server.header_class.decode(
+            view, message_type_class=server.message_type_class
+        )
+        body_start = header.header_length() + header.auth_length
+        return server.message_class(
+            header=header,
+            auth_data=server.auth_fields_class.decode(
+                view[header.header_length():body_start]
+            ),
+            body=server.body_class.decode(view[body_start:]),
+        )
+
+    def _add_interest(self, key: Hashable, peer: int):
+        """Record that a worker has subscribers for a key."""
+        workers = self.interest.get(key)
+        if workers is None:
+            workers = self.interest[key] = set()
+            if is_uri_pattern(key):
+                self.pattern_interest[key] = workers # type: ignore
+        workers.add(peer)
+        self._peer_keys.setdefault(peer, set()).add(key)
+
+    def _remove_interest(self, key: Hashable, peer: int):
+        """Record that a worker has no more subscribers for a key."""
+        workers = self.interest.get(key)
+        if workers is not None:
+            workers.discard(peer)
+            if not workers:
+                del self.interest[key]
+                self.pattern_interest.pop(key)
+        keys = self._peer_keys.get(peer)
+        if keys is not None:
+            keys.discard(key)
+
+    def _drop_interest(self, peer: int):
+        """Forget every key a worker announced."""
+        for key in list(self._peer_keys.pop(peer, ())):
+            self._remove_interest(key, peer)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+from .common import MessageProtocol
+from collections import Counter, OrderedDict
+from enum import IntEnum
+from time import monotonic
+from typing import Hashable, Iterable
+
+
+_ERROR_TYPES = frozenset({'ERROR', 'AUTH_ERROR', 'NOT_FOUND', 'NOT_PERMITTED'})
+
+_INVALIDATING_TYPES = frozenset({'CREATE_URI', 'UPDATE_URI', 'DELETE_URI'})
+
+# number of recently invalidated URIs whose generation is tracked exactly
+_MAX_GENERATIONS = 4096
+
+CacheKey = tuple[IntEnum, bytes, bytes, Hashable]
+
+
+class ResponseCache:
+    """LRU response cache for `TCPServer` and `UDPNode`, keyed by
+        message type, URI, and content of the request and the handler
+        key it was routed to. It holds responses with every plugin
+        already applied, so a hit skips the handler and all response
+        plugins, and the cached message's encoded frame is reused.
+
+        Only responses that are not specific to the requester are
+        cached: those made without peer-specific plugins, to messages
+        without a request ID, and from registered handlers that did not
+        return an error. A response is kept until it is older than
+        `ttl` seconds (if set), until a `CREATE_URI`, `UPDATE_URI`, or
+        `DELETE_URI` handler succeeds for its URI, or until it is
+        evicted to keep the total encoded size within `max_bytes` (and
+        the number of entries within `max_entries`, if set). Cache
+        activity is counted in `counters` under `'hits'`, `'misses'`,
+        `'stores'`, `'evictions'`, `'expirations'`, `'invalidations'`,
+        `'too_large'`, and `'stale'`.
+
+        Every invalidation advances the generation of its URI. Take the
+        `generation` of the URI before calling the handler on a miss and
+        pass it to `put`: if the URI was invalidated while the handler
+        ran, the response may predate the change and is not stored.
+    """
+    max_bytes: int
+    max_entries: int | None
+    ttl: float | None
+    message_types: frozenset[str]
+    exclude: set[bytes]
+    entries: OrderedDict[CacheKey, tuple[MessageProtocol, int, float]]
+    size: int
+    counters: Counter[str]
+
+    def __init__(
+            self, max_bytes: int = 2**24, *, max_entries: int | None = None,
+            ttl: float | None = None,
+            message_types: Iterable[str] = ('REQUEST_URI',),
+            exclude: Iterable[bytes] = ()
+        ):
+        """Initialize an empty cache. `message_types` names the request
+            message types whose responses are cached. Responses to URIs
+            in `exclude` are never cached. Raises `ValueError` if
+            `max_bytes`, `max_entries`, or `ttl` is not positive.
+        """
+        if max_bytes < 1:
+            raise ValueError('max_bytes must be at least 1')
+        if max_entries is not None and max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+        if ttl is not None and ttl <= 0:
+            raise ValueError('ttl must be positive')
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.message_types = frozenset(message_types)
+        self.exclude = set(exclude)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.counters = Counter()
+        # cached keys of each URI, so `invalidate` skips other entries
+        self._keys: dict[bytes, set[CacheKey]] = {}
+        # invalidation count, and the count at the last invalidation of
+        # recently invalidated URIs; others are at most `_floor`
+        self._epoch = 0
+        self._floor = 0
+        self._invalidated: OrderedDict[bytes, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def cacheable(self, message: MessageProtocol) -> bool:
+        """Return whether responses to the request may be cached."""
+        return message.header.message_type.name in self.message_types and \
+            message.body.uri not in self.exclude
+
+    def key(
+            self, message: MessageProtocol, route: Hashable = None
+        ) -> CacheKey | None:
+        """Return the key under which the response to the request is
+            cached, or `None` if it is not `cacheable`. `route` is the
+            handler key the request was routed to, so the responses of
+            different handlers for the same request (e.g. one for a
+            specific host) are never served in place of each other.
+        """
+        if not self.cacheable(message):
+            return None
+        return (
+            message.header.message_type, message.body.uri,
+            message.body.content, route
+        )
+
+    def generation(self, uri: bytes) -> int:
+        """Return the current generation of the URI for `put`."""
+        return self._invalidated.get(uri, self._floor)
+
+    def get(self, key: CacheKey) -> MessageProtocol | None:
+        """Return the cached response for the key, or `None` on a miss."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.counters['misses'] += 1
+            return None
+        response, size, expires = entry
+        if expires and monotonic() >= expires:
+            self._remove(key)
+            self.counters['expirations'] += 1
+            self.counters['misses'] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.counters['hits'] += 1
+        return response
+
+    def put(
+            self, key: CacheKey, response: MessageProtocol,
+            generation: int | None = None
+        ) -> bool:
+        """Cache a prepared response unless it is an error, larger than
+            `max_bytes`, or its URI is no longer at the `generation`
+            taken before the handler was called, evicting the least
+            recently used responses as needed. Returns whether it was
+            cached.
+        """
+        if response.header.message_type.name in _ERROR_TYPES:
+            return False
+        uri = key[1]
+        if generation is not None and generation != self.generation(uri):
+            self.counters['stale'] += 1
+            return False
+        size = len(response.encode())
+        if size > self.max_bytes:
+            self.counters['too_large'] += 1
+            return False
+        if key in self.entries:
+            self._remove(key)
+        while self.entries and (
+            self.size + size > self.max_bytes or (
+                self.max_entries is not None and
+                len(self.entries) >= self.max_entries
+            )
+        ):
+            self._remove(next(iter(self.entries)))
+            self.counters['evictions'] += 1
+        expires = monotonic() + self.ttl if self.ttl is not None else 0.0
+        self.entries[key] = (response, size, expires)
+        self._keys.setdefault(uri, set()).add(key)
+        self.size += size
+        self.counters['stores'] += 1
+        return True
+
+    def invalidate(self, uri: bytes) -> int:
+        """Remove the cached responses for the URI, advance its
+            generation, and return how many responses there were.
+        """
+        self._epoch += 1
+        self._invalidated[uri] = self._epoch
+        self._invalidated.move_to_end(uri)
+        if len(self._invalidated) > _MAX_GENERATIONS:
+            _, self._floor = self._invalidated.popitem(last=False)
+        keys = self._keys.get(uri, ())
+        removed = len(keys)
+        for key in list(keys):
+            self._remove(key)
+        self.counters['invalidations'] += removed
+        return removed
+
+    def invalidate_for(
+            self, message: MessageProtocol,
+            response: MessageProtocol | None
+        ):
+        """Invalidate the URI of a handled `CREATE_URI`, `UPDATE_URI`, or
+            `DELETE_URI` message unless its handler returned an error.
+        """
+        if message.header.message_type.name not in _INVALIDATING_TYPES:
+            return
+        if response is None or \
+                response.header.message_type.name not in _ERROR_TYPES:
+            self.invalidate(message.body.uri)
+
+    def clear(self):
+        """Remove every cached response and advance the generation of
+            every URI.
+        """
+        self.entries.clear()
+        self._keys.clear()
+        self.size = 0
+        self._epoch += 1
+        self._floor = self._epoch
+        self._invalidated.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of entries, their total encoded size in
+            bytes, and the counters.
+        """
+        return {'entries': len(self.entries), 'bytes': self.size, **self.counters}
+
+    def _remove(self, key: CacheKey):
+        """Remove an entry and release its size."""
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+        keys = self._keys[key[1]]
+        keys.discard(key)
+        if not keys:
+            del self._keys[key[1]]
@@ -25,7 +25,12 @@ from .common import (
     default_client_logger,
     NetworkNodeProtocol,
 )
+from .keepalive import KeepAlive, KeepAlivePolicy, make_ping_msg, make_pong_msg
+from .transport import FrameProtocol, read_frame
+from .tracing import TraceSampler
+from .watchdog import Watchdog
 from enum import IntEnum
+from itertools import count
 from typing import Any, Awaitable, Callable, Coroutine, Hashable, cast
 import asyncio
 import logging
@@ -39,9 +44,16 @@ class TCPClient:
         connections, `start_receive_loop()` to begin receiving from a
         server, and `close()` to disconnect.
     """
-    hosts: dict[tuple[str, int], tuple[asyncio.StreamReader, asyncio.StreamWriter]]
+    hosts: dict[
+        tuple[str, int],
+        tuple[
+            asyncio.StreamReader | FrameProtocol,
+            asyncio.StreamWriter | FrameProtocol
+        ]
+    ]
     default_host: tuple[str, int]
     port: int
+    unix_paths: set[str]
     local_peer: Peer | None
     peers: dict[bytes, Peer]
     peer_addrs: dict[tuple[str, int], bytes]
@@ -70,6 +82,21 @@ class TCPClient:
     peer_plugin: PeerPluginProtocol | None
     handle_auth_error: AuthErrorHandler
     timeout_error_handler: TimeoutErrorHandler | None
+    use_buffered_protocol: bool
+    request_id_field: str | None
+    watchdog: Watchdog | None
+    trace_sampler: TraceSampler
+    keepalive: KeepAlive | None
+    pending_requests: dict[
+        bytes,
+        tuple[
+            asyncio.Future, AuthPluginProtocol|None, CipherPluginProtocol|None
+        ]
+    ]
+    _tcp_default: tuple[str, int]
+    _request_ids: count
+    _requests_in_flight: dict[tuple[str, int], int]
+    _request_receive_loops: set[tuple[str, int]]
     _receive_loop_tasks: dict[tuple[str, int], asyncio.Task]
     _receive_loop_lock: asyncio.Lock
     _timeout_handler_tasks: set[asyncio.Task]
@@ -95,10 +122,20 @@ class TCPClient:
             peer_plugin: PeerPluginProtocol | None = None,
             auth_error_handler: AuthErrorHandler = auth_error_handler,
             timeout_error_handler: TimeoutErrorHandler | None = None,
+            use_buffered_protocol: bool = False,
+            request_id_field: str | None = None,
+            watchdog: Watchdog | None = None,
+            trace_sample_every: int = 1,
+            keepalive_policy: KeepAlivePolicy | None = None,
+            path: str | None = None,
         ):
         """Initialize the TCPClient.
             `host` is the default host IPv4 address to connect to.
             `port` is the default port to connect to.
+            If `path` is provided, the default server is instead the Unix
+            domain socket at that path, with the address `(path, 0)`;
+            `host` and `port` are then only the defaults for connecting
+            to a TCP server with `connect(host=...)` or `connect(port=...)`.
             `local_peer` is the local peer information for this client.
             `header_class`, `auth_fields_class`, `body_class`, and
             `message_class` will be used for sending messages and
@@ -128,9 +165,41 @@ class TCPClient:
             `error`, `context`) and can perform recovery actions like
             reconnecting or logging. The `TimeoutError` is always raised
             after the handler completes.
+            If `use_buffered_protocol` is `True`, connections use a
+            `FrameProtocol` instead of a `StreamReader` and
+            `StreamWriter` pair; the protocol object is then passed to
+            handlers in place of the writer.
+            If `request_id_field` is set, `request`, `create`, `update`,
+            and `delete` put a unique request ID into that auth field and
+            match the response by the ID echoed back by the server,
+            instead of by ephemeral handlers. This allows any number of
+            concurrent requests, even for the same URI. The server must
+            be configured to echo the same field.
+            If a `Watchdog` is provided, it times the plugins and every
+            handler added afterwards, and samples the event loop lag
+            once the client connects.
+            Debug logging on the hot path is skipped without formatting
+            or logger calls unless `DEBUG` is enabled, and then only runs
+            for one in every `trace_sample_every` messages.
+            If a `keepalive_policy` is provided, a `PING` is sent to
+            each connected server that has sent nothing for its
+            `interval`, the round-trip time is measured from the `PONG`,
+            and connections silent for its `idle_timeout` are aborted;
+            see `KeepAlive`. Every `PING` received is answered with a
+            `PONG`. Heartbeats are only received while a receive loop
+            runs. The message type class must define `PING` and `PONG`.
         """
+        if keepalive_policy is not None and not (
+            hasattr(message_type_class, 'PING') and
+            hasattr(message_type_class, 'PONG')
+        ):
+            raise ValueError(
+                "keepalive_policy requires PING and PONG message types"
+            )
         self.hosts = {}
-        self.default_host = (host, port)
+        self.default_host = (path, 0) if path is not None else (host, port)
+        self.unix_paths = {path} if path is not None else set()
+        self._tcp_default = (host, port)
         self.port = port
         self.local_peer = local_peer
         self.peers = {}
@@ -146,10 +215,23 @@ class TCPClient:
         self.extract_keys = extract_keys
         self.logger = logger
         self.auth_plugin = auth_plugin
+        self.trace_sampler = TraceSampler(trace_sample_every)
         self.cipher_plugin = cipher_plugin
+        self.watchdog = watchdog
+        if watchdog is not None:
+            self.auth_plugin = watchdog.wrap_plugin(auth_plugin, 'auth_plugin')
+            self.cipher_plugin = watchdog.wrap_plugin(
+                cipher_plugin, 'cipher_plugin'
+            )
         self.peer_plugin = peer_plugin or DefaultPeerPlugin()
         self.handle_auth_error = auth_error_handler
         self.handle_timeout_error = timeout_error_handler
+        self.use_buffered_protocol = use_buffered_protocol
+        self.request_id_field = request_id_field
+        self.pending_requests = {}
+        self._request_ids = count(1)
+        self._requests_in_flight = {}
+        self._request_receive_loops = set()
         self._timeout_handler_tasks = set()
         self._timeout_handler_lock = asyncio.Lock()
         self._receive_loop_tasks = {}
@@ -157,6 +239,18 @@ class TCPClient:
         self._enable_automatic_peer_management = False
         self._disconnect_msg = None
         self._advertise_msg = None
+        self.keepalive = None
+        if keepalive_policy is not None:
+            self.keepalive = KeepAlive(
+                keepalive_policy, self._send_ping, self._close_idle,
+                logger=self.logger,
+            )
+            self.add_handler(
+                self.message_type_class.PING, self._ping_handler # type: ignore
+            )
+            self.add_handler(
+                self.message_type_class.PONG, self._pong_handler # type: ignore
+            )
 
     def add_handler(
             self, key: Hashable,
@@ -171,9 +265,15 @@ class TCPClient:
             will be used to check the message in addition to any auth
             plugin that is set on the client. If a cipher plugin is
             provided, it will be used to decrypt the message in addition
-            to any cipher plugin that is set on the client.
+            to any cipher plugin that is set on the client. If the
+            client has a `Watchdog`, the handler and plugins are timed
+            by it.
         """
         self.logger.debug("Adding handler for key=%s", key)
+        if self.watchdog is not None:
+            handler, auth_plugin, cipher_plugin = self.watchdog.wrap(
+                key, handler, auth_plugin, cipher_plugin
+            )
         self.handlers[key] = (handler, auth_plugin, cipher_plugin)
 
     def add_ephemeral_handler(
@@ -187,6 +287,10 @@ class TCPClient:
             Otherwise identical to `add_handler`.
         """
         self.logger.debug("Adding ephemeral handler for key=%s", key)
+        if self.watchdog is not None:
+            handler, auth_plugin, cipher_plugin = self.watchdog.wrap(
+                key, handler, auth_plugin, cipher_plugin
+            )
         self.ephemeral_handlers[key] = (handler, auth_plugin, cipher_plugin)
 
     def on(
@@ -245,17 +349,55 @@ class TCPClient:
         if key in self.ephemeral_handlers:
             del self.ephemeral_handlers[key]
 
-    async def connect(self, host: str | None = None, port: int | None = None):
+    async def connect(
+            self, host: str | None = None, port: int | None = None, *,
+            path: str | None = None
+        ):
         """Connect to a server. The connection is stored in the hosts
             dict. To receive messages from this server, start a receive
             loop via `start_receive_loop()`. Multiple servers can be
-            connected to simultaneously.
+            connected to simultaneously. If `path` is provided, connects
+            to the Unix domain socket at that path instead; its address
+            in `hosts` and `peer_addrs` is `(path, 0)`, and the path is
+            added to `unix_paths`. Without arguments, connects to the
+            default server, which may be a Unix domain socket. A `host`
+            and `port` are only used as a Unix domain socket address if
+            the port is 0 and the host is in `unix_paths` (e.g. when
+            reconnecting); a missing `host` or `port` is taken from the
+            default TCP server.
         """
-        host = host or self.default_host[0]
-        port = port or self.default_host[1]
+        if path is not None:
+            host, port = path, 0
+            self.unix_paths.add(path)
+        elif host is None and port is None:
+            host, port = self.default_host
+        elif not (port == 0 and host in self.unix_paths):
+            default_host, default_port = self.default_host
+            if default_port == 0 and default_host in self.unix_paths:
+                default_host, default_port = self._tcp_default
+            host = host or default_host
+            port = default_port if port is None else port
+        unix = port == 0 and host in self.unix_paths
         self.logger.info("Connecting to %s:%d", host, port)
-        reader, writer = await asyncio.open_connection(host, port)
-        self.hosts[(host, port)] = (reader, writer)
+        loop = asyncio.get_running_loop()
+        if self.use_buffered_protocol:
+            factory = lambda: FrameProtocol(
+                self.header_class, self.message_type_class
+            )
+            if unix:
+                _, protocol = await loop.create_unix_connection(factory, host)
+            else:
+                _, protocol = await loop.create_connection(factory, host, port)
+            self.hosts[(host, port)] = (protocol, protocol)
+        elif unix:
+            self.hosts[(host, port)] = await asyncio.open_unix_connection(host)
+        else:
+            self.hosts[(host, port)] = await asyncio.open_connection(host, port)
+        if self.watchdog is not None:
+            self.watchdog.start_lag_monitor()
+        if self.keepalive is not None:
+            self.keepalive.add((host, port))
+            self.keepalive.start()
         if self._enable_automatic_peer_management and self._advertise_msg:
             await self.send(self._advertise_msg.copy(), server=(host, port))
 
@@ -277,13 +419,15 @@ class TCPClient:
             If `use_cipher` is `False`, the cipher plugin set on the
             client will not be used.
         """
+        trace = self.trace_sampler(self.logger)
         server = server or self.default_host
         peer_id = self.peer_addrs.get(server)
         peer = self.peers.get(peer_id) if peer_id is not None else None
 
         # inner cipher
         if cipher_plugin is not None:
-            self.logger.debug("Calling cipher_plugin.encrypt on message")
+            if trace:
+                self.logger.debug("Calling cipher_plugin.encrypt on message")
             try:
                 message = cipher_plugin.encrypt(
                     message, self, peer, self.peer_plugin
@@ -294,7 +438,8 @@ class TCPClient:
 
         # inner auth
         if auth_plugin is not None:
-            self.logger.debug("Calling auth_plugin.make on auth_data and body")
+            if trace:
+                self.logger.debug("Calling auth_plugin.make on auth_data and body")
             auth_plugin.make(
                 message.auth_data, message.body, self,
                 peer, self.peer_plugin
@@ -302,7 +447,8 @@ class TCPClient:
 
         # outer cipher
         if use_cipher and self.cipher_plugin is not None:
-            self.logger.debug("Calling self.cipher_plugin.encrypt on message")
+            if trace:
+                self.logger.debug("Calling self.cipher_plugin.encrypt on message")
             try:
                 message = self.cipher_plugin.encrypt(
                     message, self, peer, self.peer_plugin
@@ -313,19 +459,22 @@ class TCPClient:
 
         # outer auth
         if use_auth and self.auth_plugin is not None:
-            self.logger.debug("Calling self.auth_plugin.make on auth_data and body")
+            if trace:
+                self.logger.debug("Calling self.auth_plugin.make on auth_data and body")
             self.auth_plugin.make(
                 message.auth_data, message.body, self,
                 peer, self.peer_plugin
             )
 
-        self.logger.debug(
-            "Sending message of type=%s to server...", message.header.message_type
-        )
+        if trace:
+            self.logger.debug(
+                "Sending message of type=%s to server...", message.header.message_type
+            )
         _, writer = self.hosts[server]
         writer.write(message.encode())
         await writer.drain()
-        self.logger.debug("Message sent to server")
+        if trace:
+            self.logger.debug("Message sent to server")
 
     async def request(
             self, uri: bytes, *,
@@ -347,8 +496,23 @@ class TCPClient:
             check `message.header.message_type` to determine success or
             error). When `message_type` is `None` (default), sends
             `REQUEST_URI`. Use `message_type` and content to send
-            `CREATE_URI`, `UPDATE_URI`, or `DELETE_URI` messages.
+            `CREATE_URI`, `UPDATE_URI`, or `DELETE_URI` messages. If
+            `request_id_field` is set, the response is instead matched by
+            request ID (see `request_by_id`).
         """
+        if self.request_id_field is not None:
+            return await self.request_by_id(
+                uri,
+                server=server,
+                timeout=timeout,
+                use_auth=use_auth,
+                use_cipher=use_cipher,
+                auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin,
+                message_type=message_type,
+                content=content,
+            )
+
         result = []
         event = asyncio.Event()
         server_addr = server or self.default_host
@@ -461,6 +625,96 @@ class TCPClient:
 
         return result[0]
 
+    async def request_by_id(
+            self, uri: bytes, *,
+            server: tuple[str, int] | None = None,
+            timeout: float = 10.0,
+            use_auth: bool = True, use_cipher: bool = True,
+            auth_plugin: AuthPluginProtocol|None = None,
+            cipher_plugin: CipherPluginProtocol|None = None,
+            message_type: int|None = None,
+            content: bytes = b'',
+        ) -> MessageProtocol:
+        """Send a request message carrying a unique request ID in the
+            `request_id_field` auth field and wait for the response that
+            echoes it. The pending request is a single entry in
+            `pending_requests`, resolved by `receive_once`, so many
+            requests can be in flight on one connection without
+            colliding. The receive loop for the server is started if
+            needed and stopped once no more requests are in flight. If
+            it times out, raises a `TimeoutError`. Raises `ValueError`
+            if `request_id_field` is not set, or if the response fails
+            auth or cannot be decrypted. Otherwise identical to
+            `request`.
+        """
+        if self.request_id_field is None:
+            raise ValueError("request_id_field is not set")
+        server_addr = server or self.default_host
+        if message_type is None:
+            message_type = \
+                self.message_type_class.REQUEST_URI # type: ignore
+
+        request_id = next(self._request_ids).to_bytes(8, 'big')
+        future = asyncio.get_running_loop().create_future()
+        self.pending_requests[request_id] = (
+            future, auth_plugin, cipher_plugin
+        )
+        self._requests_in_flight[server_addr] = \
+            self._requests_in_flight.get(server_addr, 0) + 1
+
+        try:
+            request_message = self.message_class.prepare(
+                self.body_class.prepare(content=content, uri=uri),
+                message_type,
+                self.auth_fields_class({self.request_id_field: request_id}),
+            )
+            await self.send(
+                request_message,
+                server=server_addr,
+                use_auth=use_auth,
+                use_cipher=use_cipher,
+                auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin
+            )
+            _, was_running = await self.start_receive_loop(
+                server=server_addr,
+                use_auth=use_auth,
+                use_cipher=use_cipher,
+            )
+            if not was_running:
+                self._request_receive_loops.add(server_addr)
+
+            try:
+                return await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                error = TimeoutError(
+                    f"Request for URI {uri.decode('utf-8', errors='replace')} " +
+                    f"timed out after {timeout}s"
+                )
+                context: TimeoutContext = {
+                    'uri': uri,
+                    'timeout': timeout,
+                    'server': server_addr,
+                    'keys': [request_id],
+                }
+                await self._invoke_timeout_handler(
+                    'request_timeout',
+                    server_addr,
+                    error,
+                    context
+                )
+                raise error
+        finally:
+            self.pending_requests.pop(request_id, None)
+            remaining = self._requests_in_flight[server_addr] - 1
+            if remaining:
+                self._requests_in_flight[server_addr] = remaining
+            else:
+                del self._requests_in_flight[server_addr]
+                if server_addr in self._request_receive_loops:
+                    self._request_receive_loops.discard(server_addr)
+                    await self.stop_receive_loop(server_addr)
+
     async def create(
             self, uri: bytes, data: bytes, *,
             server: tuple[str, int] | None = None,
@@ -576,25 +830,24 @@ class TCPClient:
             provided, it will be used to decrypt the message in addition
             to any cipher plugin that is set on the client.
         """
-        self.logger.debug("Receiving message from server...")
+        trace = self.trace_sampler(self.logger)
+        if trace:
+            self.logger.debug("Receiving message from server...")
         server = server or self.default_host
         peer_id = self.peer_addrs.get(server)
         peer = self.peers.get(peer_id) if peer_id is not None else None
         reader, writer = self.hosts[server]
-        data = await reader.readexactly(self.header_class.header_length())
-        header = self.header_class.decode(
-            data,
-            message_type_class=self.message_type_class
-        )
-        self.logger.debug(
-            "Received message of type=%s from server", header.message_type
+        header, payload = await read_frame(
+            reader, self.header_class, self.message_type_class
         )
-
-        auth_bytes = await reader.readexactly(header.auth_length)
-        auth = self.auth_fields_class.decode(auth_bytes)
-
-        body_bytes = await reader.readexactly(header.body_length)
-        body = self.body_class.decode(body_bytes)
+        if self.keepalive is not None:
+            self.keepalive.received(server)
+        if trace:
+            self.logger.debug(
+                "Received message of type=%s from server", header.message_type
+            )
+        auth = self.auth_fields_class.decode(payload[:header.auth_length])
+        body = self.body_class.decode(payload[header.auth_length:])
 
         msg = self.message_class(
             header=header,
@@ -608,58 +861,106 @@ class TCPClient:
 
         # outer auth
         if use_auth and self.auth_plugin is not None:
-            self.logger.debug("Calling self.auth_plugin.check on auth and body")
+            if trace:
+                self.logger.debug("Calling self.auth_plugin.check on auth and body")
             check = self.auth_plugin.check(
                 msg.auth_data, msg.body, self,
                 peer, self.peer_plugin
             )
             if not check:
                 self.logger.warning("Message auth failed")
+                self._fail_pending_request(msg, 'failed auth')
                 return self.handle_auth_error(
                     self, self.auth_plugin, msg
                 )
 
         # outer cipher
         if use_cipher and self.cipher_plugin is not None:
-            self.logger.debug("Calling cipher_plugin.decrypt on message")
+            if trace:
+                self.logger.debug("Calling cipher_plugin.decrypt on message")
             try:
                 msg = self.cipher_plugin.decrypt(
                     msg, self, peer, self.peer_plugin
                 )
             except Exception as e:
                 self.logger.error("Error decrypting message; dropping", exc_info=True)
+                self._fail_pending_request(msg, 'could not be decrypted')
                 return None
 
         # inner auth
         if auth_plugin is not None:
-            self.logger.debug("Calling auth_plugin.check on auth and body")
+            if trace:
+                self.logger.debug("Calling auth_plugin.check on auth and body")
             check = auth_plugin.check(
                 msg.auth_data, msg.body, self,
                 peer, self.peer_plugin
             )
             if not check:
                 self.logger.warning("Message auth failed")
+                self._fail_pending_request(msg, 'failed auth')
                 return self.handle_auth_error(
                     self, auth_plugin, msg
                 )
 
         # inner cipher
         if cipher_plugin is not None:
-            self.logger.debug("Calling cipher_plugin.decrypt on message")
+            if trace:
+                self.logger.debug("Calling cipher_plugin.decrypt on message")
             try:
                 msg = cipher_plugin.decrypt(
                     msg, self, peer, self.peer_plugin
                 )
             except Exception as e:
                 self.logger.error("Error decrypting message; dropping", exc_info=True)
+                self._fail_pending_request(msg, 'could not be decrypted')
                 return None
 
+        # resolve a pending request by its echoed request ID
+        if self.pending_requests and self.request_id_field is not None:
+            request_id = msg.auth_data.fields.get(self.request_id_field)
+            if request_id in self.pending_requests:
+                (
+                    future, auth_plugin, cipher_plugin
+                ) = self.pending_requests.pop(request_id)
+
+                # inner auth
+                if auth_plugin is not None:
+                    if trace:
+                        self.logger.debug("Calling auth_plugin.check on auth and body")
+                    check = auth_plugin.check(
+                        msg.auth_data, msg.body, self, peer, self.peer_plugin
+                    )
+                    if not check:
+                        self.logger.warning("Message auth failed")
+                        self._fail_future(future, request_id, 'failed auth')
+                        return self.handle_auth_error(self, auth_plugin, msg)
+
+                # inner cipher
+                if cipher_plugin is not None:
+                    if trace:
+                        self.logger.debug("Calling cipher_plugin.decrypt on message")
+                    try:
+                        msg = cipher_plugin.decrypt(msg, self, peer, self.peer_plugin)
+                    except Exception as e:
+                        self.logger.error(
+                            "Error decrypting message; dropping", exc_info=True
+                        )
+                        self._fail_future(
+                            future, request_id, 'could not be decrypted'
+                        )
+                        return None
+
+                if not future.done():
+                    future.set_result(msg)
+                return msg
+
         keys = self.extract_keys(msg, server)
         handler_result: (
             MessageProtocol | Coroutine[Any, Any, MessageProtocol | None] | None
         ) = None
 
-        self.logger.debug("Message received from server")
+        if trace:
+            self.logger.debug("Message received from server")
         for key in keys:
             if key in self.handlers or key in self.ephemeral_handlers:
                 if key in self.ephemeral_handlers:
@@ -671,7 +972,8 @@ class TCPClient:
 
                 # inner auth
                 if auth_plugin is not None:
-                    self.logger.debug("Calling auth_plugin.check on auth and body")
+                    if trace:
+                        self.logger.debug("Calling auth_plugin.check on auth and body")
                     check = auth_plugin.check(
                         msg.auth_data, msg.body, self, peer, self.peer_plugin
                     )
@@ -681,7 +983,8 @@ class TCPClient:
 
                 # inner cipher
                 if cipher_plugin is not None:
-                    self.logger.debug("Calling cipher_plugin.decrypt on message")
+                    if trace:
+                        self.logger.debug("Calling cipher_plugin.decrypt on message")
                     try:
                         msg = cipher_plugin.decrypt(msg, self, peer, self.peer_plugin)
                     except Exception as e:
@@ -690,7 +993,8 @@ class TCPClient:
                         )
                         return None
 
-                self.logger.debug("Calling handler for key=%s", key)
+                if trace:
+                    self.logger.debug("Calling handler for key=%s", key)
                 tcp_handler = cast(Handler, handler)
                 handler_result = tcp_handler(msg, writer)
                 if isinstance(handler_result, Coroutine):
@@ -702,6 +1006,27 @@ class TCPClient:
 
         return msg
 
+    def _fail_pending_request(self, msg: MessageProtocol, reason: str):
+        """Fail the pending request whose ID the dropped message echoes,
+            if any, so that `request_by_id` does not wait for its
+            timeout.
+        """
+        if not self.pending_requests or self.request_id_field is None:
+            return
+        request_id = msg.auth_data.fields.get(self.request_id_field)
+        if request_id in self.pending_requests:
+            future, _, _ = self.pending_requests.pop(request_id)
+            self._fail_future(future, request_id, reason)
+
+    def _fail_future(
+            self, future: asyncio.Future, request_id: bytes, reason: str
+        ):
+        """Raise a `ValueError` from the future of a pending request."""
+        if not future.done():
+            future.set_exception(ValueError(
+                f"Response to request {request_id.hex()} {reason}"
+            ))
+
     async def receive_loop(
             self, server: tuple[str, int] | None = None, *,
             use_auth: bool = True, use_cipher: bool = True,
@@ -868,8 +1193,64 @@ class TCPClient:
             await self.send(self._disconnect_msg.copy(), server=server)
         self.logger.debug("Closing writer")
         writer.close()
+        if self.keepalive is not None:
+            self.keepalive.remove(server)
+            if not self.keepalive.links:
+                self.keepalive.stop()
         self.logger.info("Connection to server closed")
 
+    def _address_of(self, writer: Any) -> tuple[str, int] | None:
+        """Return the address of the server connected through the
+            writer: its `peername`, or `(path, 0)` for a Unix domain
+            socket.
+        """
+        addr = writer.get_extra_info("peername")
+        if isinstance(addr, str):
+            return self._server_of(writer)
+        return addr
+
+    def _server_of(self, writer: Any) -> tuple[str, int] | None:
+        """Return the address of the server connected through the
+            writer, if any.
+        """
+        for server, (_, host_writer) in self.hosts.items():
+            if host_writer is writer:
+                return server
+        return None
+
+    def _send_ping(
+            self, server: tuple[str, int]
+        ) -> Coroutine[Any, Any, None]:
+        """Send a keepalive `PING` to a silent server."""
+        return self.send(make_ping_msg(
+            message_class=self.message_class,
+            message_type_class=self.message_type_class,
+            body_class=self.body_class,
+        ), server=server)
+
+    def _close_idle(self, server: tuple[str, int]):
+        """Abort the connection to a server that timed out."""
+        self.logger.warning("Connection to %s timed out", server)
+        _, writer = self.hosts[server]
+        if writer.transport is not None:
+            writer.transport.abort()
+
+    async def _ping_handler(self, message: MessageProtocol, writer: Any):
+        """Answer a keepalive `PING` with a `PONG`."""
+        server = self._server_of(writer)
+        if server is not None:
+            await self.send(make_pong_msg(
+                message, message_class=self.message_class,
+                message_type_class=self.message_type_class,
+                body_class=self.body_class,
+            ), server=server)
+
+    def _pong_handler(self, message: MessageProtocol, writer: Any):
+        """Record the round-trip time from a keepalive `PONG`."""
+        server = self._server_of(writer)
+        if server is not None:
+            self.keepalive.pong(server, message.body.content) # type: ignore
+
     def add_or_update_peer(
             self, peer_id: bytes, peer_data: bytes, addr: tuple[str, int]
         ) -> bool:
@@ -878,21 +1259,26 @@ class TCPClient:
             `True` if a `PEER_DISCOVERED` message should be sent (`False`
             if it is the local peer).
         """
+        # not a per-message path, so no sample tick is spent on it
+        trace = self.logger.isEnabledFor(logging.DEBUG)
         if self.local_peer is not None and peer_id == self.local_peer.id:
-            self.logger.debug("Ignoring local peer.")
+            if trace:
+                self.logger.debug("Ignoring local peer.")
             return False
         if peer_id in self.peers:
-            self.logger.debug(
-                "Updating peer 0x%s at %s with data %s",
-                peer_id.hex(), addr, peer_data.hex()
-            )
+            if trace:
+                self.logger.debug(
+                    "Updating peer 0x%s at %s with data %s",
+                    peer_id.hex(), addr, peer_data.hex()
+                )
             self.peers[peer_id].update(peer_data)
             self.peers[peer_id].addrs.add(addr)
         else:
-            self.logger.debug(
-                "Adding peer 0x%s at %s with data %s",
-                peer_id.hex(), addr, peer_data.hex()
-            )
+            if trace:
+                self.logger.debug(
+                    "Adding peer 0x%s at %s with data %s",
+                    peer_id.hex(), addr, peer_data.hex()
+                )
             self.peers[peer_id] = Peer({addr}, peer_id, peer_data)
         self.peer_addrs[addr] = peer_id
         return True
@@ -1011,7 +1397,7 @@ class TCPClient:
         def handle_advertise_peer(
                 message: MessageProtocol, writer: asyncio.StreamWriter
             ):
-            addr = writer.get_extra_info("peername")
+            addr = self._address_of(writer)
             self.logger.debug("Received ADVERTISE_PEER message from %s", addr)
 
             if app_id != message.body.uri:
@@ -1061,7 +1447,7 @@ class TCPClient:
         def handle_peer_discovered(
                 message: MessageProtocol, writer: asyncio.StreamWriter
             ):
-            addr = writer.get_extra_info("peername")
+            addr = self._address_of(writer)
             self.logger.debug("Received PEER_DISCOVERED message from %s", addr)
 
             if app_id != message.body.uri:
@@ -1095,7 +1481,7 @@ class TCPClient:
             auth_plugin=auth_plugin, cipher_plugin=cipher_plugin
         )
         def handle_disconnect(message: MessageProtocol, writer: asyncio.StreamWriter):
-            addr = writer.get_extra_info("peername")
+            addr = self._address_of(writer)
             self.logger.debug("Received DISCONNECT message from %s", addr)
 
             if app_id != message.body.uri:
@@ -0,0 +1,94 @@
+from __future__ import annotations
+from .common import MessageProtocol
+from collections import Counter
+from typing import Any, Callable, Hashable, Iterable
+import asyncio
+
+
+class RequestCoalescer:
+    """Coalesces concurrent identical requests onto one handler call
+        ("singleflight"). While an async handler is running for a
+        message, every other message with the same type, URI, and
+        content that was routed to the same handler key waits for that
+        call and receives its result instead of calling the handler
+        again. Only the first message's writer is passed to the handler,
+        so coalesce only handlers whose response does not depend on the
+        connection; host-specific routes include the host in their key,
+        so they are only coalesced with requests from that host. The
+        shared call runs in its own task, so it is not cancelled when
+        the connection that started it closes. Calls are counted in
+        `counters` under `'calls'` (handler calls made) and
+        `'coalesced'` (handler calls saved).
+
+        Pass it to `TCPServer` with `request_coalescer=...`; the server
+        still applies the response plugins separately for each
+        requester, so responses are prepared per peer.
+    """
+    message_types: frozenset[str]
+    in_flight: dict[Hashable, asyncio.Task]
+    counters: Counter[str]
+
+    def __init__(self, message_types: Iterable[str] = ('REQUEST_URI',)):
+        """Initialize the coalescer. `message_types` names the message
+            types whose requests are coalesced.
+        """
+        self.message_types = frozenset(message_types)
+        self.in_flight = {}
+        self.counters = Counter()
+        # number of requests waiting on each in-flight call
+        self._waiters: Counter[asyncio.Task] = Counter()
+
+    def __len__(self) -> int:
+        return len(self.in_flight)
+
+    def key(
+            self, message: MessageProtocol, route: Hashable = None
+        ) -> Hashable | None:
+        """Return the key under which the message is coalesced, or
+            `None` if its message type is not coalesced. `route` is the
+            handler key the message was routed to, so requests for
+            different handlers (e.g. one for a specific host) never
+            share a call.
+        """
+        message_type = message.header.message_type
+        if message_type.name not in self.message_types:
+            return None
+        return (message_type, message.body.uri, message.body.content, route)
+
+    async def call(
+            self, key: Hashable, call: Callable[[], Any]
+        ) -> tuple[Any, bool]:
+        """Return the result of the call in flight for the key, or else
+            make the call and, if it returns a coroutine, share it with
+            the requests for the same key that arrive while it runs.
+            Also returns whether the result is shared with other
+            requests: a shared response must be copied before it is
+            modified. Exceptions are raised to every request.
+        """
+        task = self.in_flight.get(key)
+        if task is not None:
+            self._waiters[task] += 1
+            self.counters['coalesced'] += 1
+            return await asyncio.shield(task), True
+
+        self.counters['calls'] += 1
+        result = call()
+        if not asyncio.iscoroutine(result):
+            return result, False
+        task = asyncio.ensure_future(result)
+        self.in_flight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            shared = self._waiters.pop(task, 0) > 0
+        return result, shared
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        """Stop sharing a finished call; mark its exception retrieved in
+            case every request for it was cancelled.
+        """
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if not task.cancelled():
+            task.exception()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from enum import IntEnum
+from functools import lru_cache
 from time import time
 from typing import (
     cast,
@@ -68,10 +69,12 @@ class HeaderProtocol(Protocol):
 
     @classmethod
     def decode(
-            cls, data: bytes,
+            cls, data: bytes | memoryview,
             message_type_class: type[IntEnum] | None = None
         ) -> HeaderProtocol:
-        """Decode the header from the `data`."""
+        """Decode the header from the `data`, which may be a `bytes`
+            or a `memoryview` over a received frame.
+        """
         ...
 
     def encode(self) -> bytes:
@@ -92,8 +95,10 @@ class AuthFieldsProtocol(Protocol):
         ...
 
     @classmethod
-    def decode(cls, data: bytes) -> AuthFieldsProtocol:
-        """Decode the auth fields from the `data`."""
+    def decode(cls, data: bytes | memoryview) -> AuthFieldsProtocol:
+        """Decode the auth fields from the `data`, which may be a
+            `bytes` or a `memoryview` over a received frame.
+        """
         ...
 
     def encode(self) -> bytes:
@@ -126,8 +131,10 @@ class BodyProtocol(Protocol):
         ...
 
     @classmethod
-    def decode(cls, data: bytes) -> BodyProtocol:
-        """Decode the body from the `data`."""
+    def decode(cls, data: bytes | memoryview) -> BodyProtocol:
+        """Decode the body from the `data`, which may be a `bytes` or
+            a `memoryview` over a received frame.
+        """
         ...
 
     def encode(self) -> bytes:
@@ -415,8 +422,8 @@ class MessageType(IntEnum):
         `CREATE_URI`, `UPDATE_URI`, `DELETE_URI`, `SUBSCRIBE_URI`,
         `UNSUBSCRIBE_URI`, `PUBLISH_URI`, `NOTIFY_URI`, `ADVERTISE_PEER`,
         `OK`, `CONFIRM_SUBSCRIBE`, `CONFIRM_UNSUBSCRIBE`,
-        `PEER_DISCOVERED`, `ERROR`, `AUTH_ERROR`, `NOT_FOUND`,
-        `NOT_PERMITTED`, `DISCONNECT`.
+        `PEER_DISCOVERED`, `PING`, `PONG`, `ERROR`, `AUTH_ERROR`,
+        `NOT_FOUND`, `NOT_PERMITTED`, `DISCONNECT`.
 
         Values 0-30 are reserved for base protocol upgrades. Custom
         message types must use values >= 31.
@@ -424,7 +431,9 @@ class MessageType(IntEnum):
         To create a custom `IntEnum` for custom network protocols, use
         the `make_message_type_class` function to create the type, or
         use `validate_message_type_class` function to validate one made
-        with declarative syntax.
+        with declarative syntax. `PING` and `PONG` (the keepalive
+        heartbeat) may be left out of declared classes, which then
+        cannot use keepalive heartbeats.
     """
     REQUEST_URI = 0
     RESPOND_URI = 1
@@ -440,12 +449,17 @@ class MessageType(IntEnum):
     CONFIRM_SUBSCRIBE = 11
     CONFIRM_UNSUBSCRIBE = 12
     PEER_DISCOVERED = 13
+    PING = 14
+    PONG = 15
     ERROR = 20
     AUTH_ERROR = 23
     NOT_FOUND = 24
     NOT_PERMITTED = 25
     DISCONNECT = 30
 
+# added after custom classes could be declared, so not required in them
+_OPTIONAL_MESSAGE_TYPES = frozenset({'PING', 'PONG'})
+
 def make_message_type_class(
         name: str, new_message_types: dict[str, int]
     ) -> type[IntEnum]:
@@ -492,6 +506,8 @@ def validate_message_type_class(
     mtypes = {m.name: m.value for m in message_type_class}
     for m in MessageType:
         if m.name not in mtypes:
+            if m.name in _OPTIONAL_MESSAGE_TYPES:
+                continue
             if suppress_errors: return False
             raise ValueError(f'{mtcname} is missing required {m.name}')
         if mtypes[m.name] != m.value:
@@ -517,6 +533,46 @@ def validate_message_type_class(
     return True
 
 
+@lru_cache(maxsize=None)
+def compiled_struct(fstring: str) -> struct.Struct:
+    """Return a compiled `struct.Struct` for the format string. The
+        result is cached, so hot paths can call this freely instead of
+        building and parsing format strings for every frame.
+    """
+    return struct.Struct(fstring)
+
+_uri_length_struct = compiled_struct('!H')
+
+@lru_cache(maxsize=None)
+def message_type_table(
+        message_type_class: type[IntEnum]
+    ) -> tuple[IntEnum | None, ...]:
+    """Return a 256-entry tuple mapping every possible message type
+        byte to its member of `message_type_class`, or to `None` if the
+        value is not defined. The table is built once per class, so
+        resolving a message type while decoding is a single index
+        rather than an enum lookup.
+    """
+    table: list[IntEnum | None] = [None] * 256
+    for member in message_type_class:
+        if 0 <= member.value < 256:
+            table[member.value] = member
+    return tuple(table)
+
+def _resolve_message_type(
+        message_type_class: type[IntEnum], value: int
+    ) -> IntEnum:
+    """Resolve a decoded message type byte through the table for the
+        `message_type_class`. Raises `ValueError` for undefined values.
+    """
+    message_type = message_type_table(message_type_class)[value]
+    if message_type is None:
+        raise ValueError(
+            f'{value} is not a valid {message_type_class.__name__}'
+        )
+    return message_type
+
+
 @dataclass
 class Header:
     """Default header class."""
@@ -538,32 +594,22 @@ class Header:
 
     @classmethod
     def decode(
-            cls, data: bytes,
+            cls, data: bytes | memoryview,
             message_type_class: type[IntEnum] | None = None
         ) -> Header:
-        """Decode the header from the `data`."""
-        excess = False
-        fstr = cls.struct_fstring()
-        if len(data) > cls.header_length():
-            fstr += f'{len(data)-cls.header_length()}s'
-            excess = True
-
-        if excess:
-            message_type, auth_length, body_length, checksum, _ = struct.unpack(
-                fstr,
-                data
-            )
-        else:
-            message_type, auth_length, body_length, checksum = struct.unpack(
-                fstr,
-                data
-            )
+        """Decode the header from the `data`. Any bytes after the header
+            are ignored, so `data` can be an entire frame or a
+            `memoryview` over one.
+        """
+        message_type, auth_length, body_length, checksum = compiled_struct(
+            cls.struct_fstring()
+        ).unpack_from(data)
 
         if message_type_class is None:
             message_type_class = cls.message_type_class
 
         return cls(
-            message_type=message_type_class(message_type),
+            message_type=_resolve_message_type(message_type_class, message_type),
             auth_length=auth_length,
             body_length=body_length,
             checksum=checksum
@@ -571,8 +617,7 @@ class Header:
 
     def encode(self) -> bytes:
         """Encode the header into bytes."""
-        return struct.pack(
-            self.struct_fstring(),
+        return compiled_struct(self.struct_fstring()).pack(
             self.message_type.value,
             self.auth_length,
             self.body_length,
@@ -580,53 +625,207 @@ class Header:
         )
 
 
-@dataclass
+@dataclass(slots=True)
+class CompactHeader:
+    """Slotted header class with the same wire format as `Header`.
+        Instances have no `__dict__`, so they are smaller and faster to
+        construct. The `message_type_class` is a class attribute rather
+        than a field; replace it on the class to change the default.
+    """
+    message_type: IntEnum
+    auth_length: int
+    body_length: int
+    checksum: int
+    message_type_class: ClassVar[type[IntEnum]] = MessageType
+
+    @staticmethod
+    def header_length() -> int:
+        """Return the byte length of the header."""
+        return 9
+
+    @staticmethod
+    def struct_fstring() -> str:
+        """Return the struct format string for decoding the header."""
+        return '!BHHI'
+
+    @classmethod
+    def decode(
+            cls, data: bytes | memoryview,
+            message_type_class: type[IntEnum] | None = None
+        ) -> CompactHeader:
+        """Decode the header from the `data`. Any bytes after the header
+            are ignored, so `data` can be an entire frame or a
+            `memoryview` over one.
+        """
+        message_type, auth_length, body_length, checksum = compiled_struct(
+            cls.struct_fstring()
+        ).unpack_from(data)
+
+        if message_type_class is None:
+            message_type_class = cls.message_type_class
+
+        return cls(
+            _resolve_message_type(message_type_class, message_type),
+            auth_length,
+            body_length,
+            checksum,
+        )
+
+    def encode(self) -> bytes:
+        """Encode the header into bytes."""
+        return compiled_struct(self.struct_fstring()).pack(
+            self.message_type.value,
+            self.auth_length,
+            self.body_length,
+            self.checksum
+        )
+
+
+@dataclass(slots=True)
 class AuthFields:
-    """Default auth fields class."""
+    """Default auth fields class. The encoded form is cached along with
+        a snapshot of `fields`, so it is only recomputed after `fields`
+        is mutated or replaced (e.g. by an auth plugin's `make` method).
+    """
     fields: dict[str, bytes] = field(default_factory=dict)
+    _encoded: tuple[tuple, bytes] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     @classmethod
-    def decode(cls, data: bytes) -> AuthFields:
-        """Decode the auth fields from bytes."""
-        return cls(fields=packify.unpack(data))
+    def decode(cls, data: bytes | memoryview) -> AuthFields:
+        """Decode the auth fields from bytes or a `memoryview`."""
+        auth_fields = cls(fields=packify.unpack(data))
+        auth_fields._encoded = (tuple(auth_fields.fields.items()), bytes(data))
+        return auth_fields
 
     def encode(self) -> bytes:
         """Encode the auth fields into bytes."""
-        return packify.pack(self.fields)
+        snapshot = tuple(self.fields.items())
+        if self._encoded is not None and self._encoded[0] == snapshot:
+            return self._encoded[1]
+        encoded = packify.pack(self.fields)
+        self._encoded = (snapshot, encoded)
+        return encoded
 
 
-@dataclass
 class Body:
-    """Default body class."""
-    uri_length: int
-    uri: bytes
-    content: bytes
+    """Default body class. A body decoded from a buffer keeps a
+        `memoryview` of it and only copies the `uri` and `content` out
+        into `bytes` when they are first accessed. The encoded form is
+        cached until one of the fields is set.
+    """
+    __slots__ = ('_uri_length', '_uri', '_content', '_view', '_encoded')
+    _uri_length: int
+    _uri: bytes | None
+    _content: bytes | None
+    _view: memoryview | None
+    _encoded: bytes | None
+
+    def __init__(self, uri_length: int, uri: bytes, content: bytes):
+        self._uri_length = uri_length
+        self._uri = uri
+        self._content = content
+        self._view = None
+        self._encoded = None
 
-    @classmethod
-    def decode(cls, data: bytes) -> Body:
-        """Decode the body from bytes."""
-        uri_length, data = struct.unpack(
-            f'!H{len(data)-2}s',
-            data
-        )
-        uri, content = struct.unpack(
-            f'!{uri_length}s{len(data)-uri_length}s',
-            data
-        )
-        return cls(
-            uri_length=uri_length,
-            uri=uri,
-            content=content
+    @property
+    def uri_length(self) -> int:
+        """The byte length of the `uri`."""
+        return self._uri_length
+
+    @uri_length.setter
+    def uri_length(self, value: int):
+        self._detach()
+        self._uri_length = value
+
+    @property
+    def uri(self) -> bytes:
+        """The body URI. Materialized from the decoded buffer on first
+            access.
+        """
+        if self._uri is None:
+            self._uri = bytes(self._view[2:2+self._uri_length]) # type: ignore
+        return self._uri
+
+    @uri.setter
+    def uri(self, value: bytes):
+        self._detach()
+        self._uri = value
+
+    @property
+    def content(self) -> bytes:
+        """The body content. Materialized from the decoded buffer on
+            first access.
+        """
+        if self._content is None:
+            self._content = bytes(self._view[2+self._uri_length:]) # type: ignore
+        return self._content
+
+    @content.setter
+    def content(self, value: bytes):
+        self._detach()
+        self._content = value
+
+    def _detach(self):
+        """Materialize both fields, release the decoded buffer, and
+            drop the cached encoding so that the body can be modified.
+        """
+        if self._view is not None:
+            self._uri = self.uri
+            self._content = self.content
+            self._view = None
+        self._encoded = None
+
+    def __repr__(self) -> str:
+        return (
+            f'{self.__class__.__name__}(uri_length={self.uri_length!r}, '
+            f'uri={self.uri!r}, content={self.content!r})'
         )
 
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.uri_length, self.uri, self.content) == \
+            (other.uri_length, other.uri, other.content) # type: ignore
+
+    __hash__ = None # type: ignore
+
+    def __reduce__(self):
+        """Pickle/copy by value rather than by buffer reference."""
+        return (self.__class__, (self.uri_length, self.uri, self.content))
+
+    @classmethod
+    def decode(cls, data: bytes | memoryview) -> Body:
+        """Decode the body from bytes or a `memoryview`. No copies of
+            the `uri` or `content` are made until they are accessed.
+        """
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        uri_length, = _uri_length_struct.unpack_from(view)
+        if uri_length > len(view) - 2:
+            raise ValueError("uri_length exceeds the length of the body")
+        body = cls.__new__(cls)
+        body._uri_length = uri_length
+        body._uri = None
+        body._content = None
+        body._view = view
+        body._encoded = None
+        return body
+
     def encode(self) -> bytes:
-        """Encode the body into bytes."""
-        return struct.pack(
-            f'!H{len(self.uri)}s{len(self.content)}s',
-            self.uri_length,
-            self.uri,
-            self.content,
-        )
+        """Encode the body into bytes. The result is cached until one
+            of the fields is set.
+        """
+        if self._encoded is None:
+            if self._view is not None:
+                self._encoded = bytes(self._view)
+            else:
+                self._encoded = b''.join((
+                    _uri_length_struct.pack(self._uri_length),
+                    self.uri,
+                    self.content,
+                ))
+        return self._encoded
 
     @classmethod
     def prepare(cls, content: bytes, uri: bytes = b'', overhead: int = 0) -> Body:
@@ -647,52 +846,90 @@ class Body:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
-    """Default message class."""
-    header: Header
+    """Default message class. The checksum and the encoded frame are
+        cached, and the cache is checked against the encoded auth data
+        and body on every use, so sending the same message to many
+        recipients serializes it only once. Mutating the header, auth
+        data, or body invalidates the cache. The `header_class`,
+        `auth_fields_class`, and `body_class` class attributes select
+        the part classes used by `decode` and `prepare`.
+    """
+    header: HeaderProtocol
     auth_data: AuthFieldsProtocol
     body: BodyProtocol
+    header_class: ClassVar[type[HeaderProtocol]] = Header
+    auth_fields_class: ClassVar[type[AuthFieldsProtocol]] = AuthFields
+    body_class: ClassVar[type[BodyProtocol]] = Body
+    _checksum: tuple[bytes, int] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _encoded: tuple[bytes, bytes, bytes, bytes] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def _body_checksum(self, body: bytes) -> int:
+        """Return the crc32 of the encoded body, reusing the last result
+            if the body has not been re-encoded since.
+        """
+        if self._checksum is None or self._checksum[0] is not body:
+            self._checksum = (body, crc32(body))
+        return self._checksum[1]
 
     def check(self) -> bool:
         """Check if the message is valid."""
-        return self.header.checksum == crc32(self.body.encode())
+        return self.header.checksum == self._body_checksum(self.body.encode())
 
     @classmethod
     def decode(
-            cls, data: bytes,
+            cls, data: bytes | memoryview,
             message_type_class: type[IntEnum] | None = None
         ) -> Message:
         """Decode the message from the `data`. Raises `ValueError` if the
-            checksum does not match.
+            checksum does not match. The parts are decoded from a single
+            `memoryview` of `data`, so no intermediate slices are copied.
         """
-        header_data = data[:Header.header_length()]
-        data = data[Header.header_length():]
-        header = Header.decode(header_data, message_type_class)
-        auth_data = AuthFields.decode(data[:header.auth_length])
-        body = Body.decode(data[header.auth_length:])
-
-        if header.checksum != crc32(body.encode()):
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        header_class = cls.header_class
+        auth_start = header_class.header_length()
+        header = header_class.decode(view, message_type_class)
+        body_start = auth_start + header.auth_length
+        auth_data = cls.auth_fields_class.decode(view[auth_start:body_start])
+        body_view = view[body_start:]
+
+        if header.checksum != crc32(body_view):
             raise ValueError("Checksum mismatch")
 
         return cls(
             header=header,
             auth_data=auth_data,
-            body=body
+            body=cls.body_class.decode(body_view)
         )
 
     def encode(self) -> bytes:
-        """Encode the message into bytes."""
+        """Encode the message into bytes. Returns the cached frame if
+            none of the parts have changed since the last call.
+        """
         auth_data = self.auth_data.encode()
         body = self.body.encode()
         self.header.auth_length = len(auth_data)
         self.header.body_length = len(body)
-        self.header.checksum = crc32(body)
-        return self.header.encode() + auth_data + body
+        self.header.checksum = self._body_checksum(body)
+        header = self.header.encode()
+        cached = self._encoded
+        if cached is not None and cached[1] is auth_data and \
+                cached[2] is body and cached[0] == header:
+            return cached[3]
+        frame = b''.join((header, auth_data, body))
+        self._encoded = (header, auth_data, body, frame)
+        return frame
 
     def copy(self) -> Message:
         """Returns a copy of the message."""
-        return self.decode(self.encode(), self.header.message_type_class)
+        return self.decode(
+            self.encode(), self.header.message_type_class # type: ignore
+        )
 
     @classmethod
     def prepare(
@@ -700,20 +937,35 @@ class Message:
             auth_data: AuthFieldsProtocol | None = None
         ) -> Message:
         """Prepare a message from a body and optional arguments."""
-        auth_data = AuthFields() if auth_data is None else auth_data
-        return cls(
-            header=Header(
-                message_type=Header.message_type_class(message_type),
-                auth_length=len(auth_data.encode()),
-                body_length=len(body.encode()),
-                checksum=crc32(body.encode())
+        auth_data = cls.auth_fields_class() if auth_data is None else auth_data
+        auth_bytes = auth_data.encode()
+        body_bytes = body.encode()
+        checksum = crc32(body_bytes)
+        header_class = cls.header_class
+        message = cls(
+            header=header_class(
+                message_type=header_class.message_type_class(message_type), # type: ignore
+                auth_length=len(auth_bytes),
+                body_length=len(body_bytes),
+                checksum=checksum
             ),
             auth_data=auth_data,
             body=body
         )
+        message._checksum = (body_bytes, checksum)
+        return message
 
 
-@dataclass
+@dataclass(slots=True)
+class CompactMessage(Message):
+    """Message class that uses `CompactHeader`. Together with the
+        slotted `AuthFields` and `Body`, no part of a message has a
+        `__dict__`.
+    """
+    header_class: ClassVar[type[HeaderProtocol]] = CompactHeader
+
+
+@dataclass(slots=True)
 class Peer:
     """Class for storing peer information."""
     addrs: set[tuple[str, int]]
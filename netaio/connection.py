@@ -0,0 +1,356 @@
+from __future__ import annotations
+from .transport import FrameProtocol
+from collections import Counter, deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Hashable
+import asyncio
+import logging
+
+
+class OverflowAction(Enum):
+    """What an `OutboundQueue` does with a new frame when its
+        `SlowConsumerPolicy` limit is reached: `DROP_OLDEST` discards
+        queued frames from the front until the new one fits,
+        `DROP_NEWEST` discards the new frame, `CONFLATE` replaces the
+        queued frame with the same conflation key (falling back to
+        `DROP_OLDEST` if there is none), and `DISCONNECT` closes the
+        connection.
+    """
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    CONFLATE = 'conflate'
+    DISCONNECT = 'disconnect'
+
+
+@dataclass
+class SlowConsumerPolicy:
+    """Limits for one connection's `OutboundQueue`. A limit of `None`
+        is not enforced. If a write does not drain within
+        `send_timeout` seconds, the connection is aborted.
+    """
+    max_buffered_bytes: int | None = None
+    max_buffered_messages: int | None = None
+    send_timeout: float | None = None
+    action: OverflowAction = OverflowAction.DROP_OLDEST
+
+
+class OutboundQueue:
+    """Outbound frame queue for one connection. Frames are queued
+        without awaiting, and a writer task writes everything queued
+        since its last pass with a single `writelines` call. It only
+        awaits `drain` once the transport's write buffer is above its
+        high-water mark. If a `policy` is set, it bounds the queue and
+        the time spent in `drain`; every time it takes effect, the
+        action name (or `'send_timeout'`) is counted in `counters` and
+        in the optional `shared_counters`.
+    """
+    writer: asyncio.StreamWriter | FrameProtocol
+    frames: deque[list]
+    buffered_bytes: int
+    messages_sent: int
+    writes: int
+    policy: SlowConsumerPolicy | None
+    counters: Counter[str]
+    shared_counters: Counter[str] | None
+    logger: logging.Logger | None
+    _conflation: dict[Hashable, list]
+    _wakeup: asyncio.Event
+    _idle: asyncio.Event
+    _closing: bool
+    _task: asyncio.Task
+
+    def __init__(
+            self, writer: asyncio.StreamWriter | FrameProtocol, *,
+            policy: SlowConsumerPolicy | None = None,
+            shared_counters: Counter[str] | None = None,
+            logger: logging.Logger | None = None
+        ):
+        """Initialize the queue and start its writer task. Must be
+            called from a running event loop.
+        """
+        self.writer = writer
+        self.frames = deque()
+        self.buffered_bytes = 0
+        self.messages_sent = 0
+        self.writes = 0
+        self.policy = policy
+        self.counters = Counter()
+        self.shared_counters = shared_counters
+        self.logger = logger
+        self._conflation = {}
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def closed(self) -> bool:
+        """`True` once the queue has been closed or its writer failed."""
+        return self._closing
+
+    def put(self, frame: bytes, key: Hashable | None = None) -> bool:
+        """Queue an encoded frame for sending. `key` is the conflation
+            key used by `OverflowAction.CONFLATE`. Returns `False` if
+            the frame was not queued because the queue is closed or the
+            policy discarded it.
+        """
+        if self._closing:
+            return False
+        policy = self.policy
+        if policy is not None and self._over_limit(policy, len(frame)):
+            action = policy.action
+            if action is OverflowAction.DISCONNECT:
+                self._count(action.value)
+                self.abort()
+                return False
+            if action is OverflowAction.DROP_NEWEST:
+                self._count(action.value)
+                return False
+            if action is OverflowAction.CONFLATE and key is not None \
+                    and key in self._conflation:
+                self._count(action.value)
+                entry = self._conflation[key]
+                self.buffered_bytes += len(frame) - len(entry[0])
+                entry[0] = frame
+                return True
+            while self.frames and self._over_limit(policy, len(frame)):
+                self._count(OverflowAction.DROP_OLDEST.value)
+                self._discard(self.frames.popleft())
+
+        entry = [frame, key]
+        self.frames.append(entry)
+        if key is not None:
+            self._conflation[key] = entry
+        self.buffered_bytes += len(frame)
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    async def flush(self):
+        """Wait until every queued frame has been handed to the
+            transport.
+        """
+        if not self._task.done():
+            await self._idle.wait()
+
+    async def close(self):
+        """Write any queued frames, then stop the writer task."""
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def abort(self):
+        """Discard queued frames, stop the writer task, and abort the
+            connection without waiting for the transport's write buffer
+            to flush, which a stalled consumer would never let happen.
+        """
+        self._closing = True
+        self.frames.clear()
+        self._conflation.clear()
+        self.buffered_bytes = 0
+        if asyncio.current_task() is not self._task:
+            self._task.cancel()
+        self._abort_transport()
+
+    def _abort_transport(self):
+        """Abort the writer's transport, discarding its write buffer."""
+        transport = self.writer.transport
+        if transport is not None:
+            transport.abort()
+        else:
+            self.writer.close()
+
+    def _over_limit(self, policy: SlowConsumerPolicy, size: int) -> bool:
+        """Check whether queueing `size` more bytes would exceed a
+            limit of the `policy`.
+        """
+        if policy.max_buffered_messages is not None and \
+                len(self.frames) >= policy.max_buffered_messages:
+            return True
+        if policy.max_buffered_bytes is not None and \
+                self.buffered_bytes + size > policy.max_buffered_bytes:
+            return True
+        return False
+
+    def _discard(self, entry: list):
+        """Forget a queued entry that was removed from `frames`."""
+        self.buffered_bytes -= len(entry[0])
+        if entry[1] is not None and self._conflation.get(entry[1]) is entry:
+            del self._conflation[entry[1]]
+
+    def _count(self, name: str):
+        """Count a policy action on this queue and the shared counters."""
+        self.counters[name] += 1
+        if self.shared_counters is not None:
+            self.shared_counters[name] += 1
+
+    def _write_buffer_full(self) -> bool:
+        """Check whether the transport's write buffer is above its
+            high-water mark.
+        """
+        transport = self.writer.transport
+        if transport is None:
+            return False
+        return transport.get_write_buffer_size() > \
+            transport.get_write_buffer_limits()[1] # type: ignore
+
+    async def _run(self):
+        """Writer task: coalesce queued frames into one `writelines`
+            call per pass until the queue is closed.
+        """
+        try:
+            while True:
+                if not self.frames:
+                    self._idle.set()
+                    if self._closing:
+                        return
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                batch = [entry[0] for entry in self.frames]
+                self.frames.clear()
+                self._conflation.clear()
+                self.buffered_bytes = 0
+                self.writer.writelines(batch)
+                self.messages_sent += len(batch)
+                self.writes += 1
+                if self._write_buffer_full():
+                    timeout = self.policy.send_timeout \
+                        if self.policy is not None else None
+                    try:
+                        await asyncio.wait_for(self.writer.drain(), timeout)
+                    except asyncio.TimeoutError:
+                        if self.logger is not None:
+                            self.logger.warning(
+                                "Send timed out; disconnecting slow client"
+                            )
+                        self._count('send_timeout')
+                        self.abort()
+                        return
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.error("Error writing to client:", exc_info=True)
+            self._closing = True
+            self.frames.clear()
+            self._conflation.clear()
+            self.buffered_bytes = 0
+            self._abort_transport()
+        finally:
+            self._idle.set()
+
+
+class Connection(FrameProtocol):
+    """Compact `FrameProtocol` serving one client of a `TCPServer`
+        created with `compact_connections=True`, for servers that hold
+        many mostly idle connections. No task is kept per connection:
+        once frames are queued, a task is started that handles them one
+        at a time and exits when none are left. The peer address is
+        read once on connect and returned by
+        `get_extra_info('peername')`, and the `Peer` resolved for it is
+        cached in `peer` until the server's peer list changes. The
+        receive buffer starts at `buffer_size` bytes, grows to fit
+        larger frames, and shrinks back once the connection is idle.
+    """
+    __slots__ = (
+        'server', 'use_auth', 'use_cipher', 'buffer_size', 'peername',
+        'peer', 'peers_version', 'accepted',
+    )
+    server: Any
+    use_auth: bool
+    use_cipher: bool
+    buffer_size: int
+    peername: Any
+    peer: Any
+    peers_version: int
+    accepted: bool
+
+    def __init__(
+            self, server: Any, *, use_auth: bool = True,
+            use_cipher: bool = True, buffer_size: int = 256,
+            max_queued_frames: int = 64
+        ):
+        """Initialize the connection state for the server. `use_auth`
+            and `use_cipher` are passed to `TCPServer.receive`.
+        """
+        super().__init__(
+            server.header_class, server.message_type_class,
+            buffer_size=buffer_size, max_queued_frames=max_queued_frames
+        )
+        self.server = server
+        self.use_auth = use_auth
+        self.use_cipher = use_cipher
+        self.buffer_size = buffer_size
+        self.peername = None
+        self.peer = None
+        self.peers_version = -1
+        self.accepted = False
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        """Cache the peer address and register with the server, which
+            may reject the connection.
+        """
+        self.transport = transport # type: ignore
+        self.peername = transport.get_extra_info('peername')
+        self.accepted = self.server._open_connection(self)
+        if not self.accepted:
+            transport.close()
+
+    def buffer_updated(self, nbytes: int):
+        """Parse the received frames and start handling them unless
+            they are already being handled.
+        """
+        super().buffer_updated(nbytes)
+        if self.frames and self._task is None:
+            self._task = self._loop.create_task(self._serve())
+
+    def eof_received(self) -> bool:
+        """Keep the transport open only while received frames are still
+            being handled, so their responses can be sent.
+        """
+        super().eof_received()
+        return self._task is not None
+
+    def connection_lost(self, exc: Exception | None):
+        """Remove the connection from the server."""
+        super().connection_lost(exc)
+        if self.accepted:
+            self.accepted = False
+            queue = self.server._forget_connection(self)
+            if queue is not None:
+                queue.abort()
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        """Return transport information, with `peername` cached."""
+        if name == 'peername':
+            return self.peername
+        return super().get_extra_info(name, default)
+
+    async def _serve(self):
+        """Handle the queued frames one at a time, then close the
+            connection if the client has finished sending or shrink the
+            receive buffer back to `buffer_size`.
+        """
+        server = self.server
+        try:
+            while self.frames and not self.is_closing():
+                await server.receive(
+                    self, self, use_auth=self.use_auth,
+                    use_cipher=self.use_cipher
+                )
+        except Exception as e:
+            server.logger.error("Error handling client:", exc_info=True)
+            self.close()
+        finally:
+            self._task = None
+        if self._eof and not self.frames:
+            self.close()
+        elif not self._end and len(self._buffer) > self.buffer_size:
+            self._buffer = bytearray(self.buffer_size)
@@ -0,0 +1,308 @@
+from __future__ import annotations
+from .common import BodyProtocol, MessageProtocol, compiled_struct
+from collections import Counter
+from dataclasses import dataclass
+from enum import IntEnum
+from math import ceil
+from time import monotonic
+from typing import Any, Callable, Coroutine, Hashable
+import asyncio
+import logging
+
+
+_ping_struct = compiled_struct('!d')
+
+
+class TimerWheel:
+    """Hashed timer wheel: a ring of `slots` buckets, each covering
+        `resolution` seconds. Scheduling, rescheduling, and cancelling
+        a key are constant-time dict operations, and `advance` returns
+        every key that has come due, so one periodic task can track the
+        deadlines of any number of keys. Deadlines more than a full turn
+        of the wheel ahead stay in their bucket for extra turns.
+    """
+    __slots__ = ('resolution', 'buckets', 'position', 'time', '_where')
+    resolution: float
+    buckets: list[dict[Hashable, int]]
+    position: int
+    time: float
+
+    def __init__(
+            self, resolution: float = 1.0, slots: int = 64,
+            now: float | None = None
+        ):
+        """Initialize an empty wheel starting at `now` (default
+            `time.monotonic()`). Raises `ValueError` if `resolution` is
+            not positive or `slots` is less than 1.
+        """
+        if resolution <= 0:
+            raise ValueError('resolution must be positive')
+        if slots < 1:
+            raise ValueError('slots must be at least 1')
+        self.resolution = resolution
+        # key -> remaining full turns before the key is due
+        self.buckets = [{} for _ in range(slots)]
+        self.position = 0
+        self.time = monotonic() if now is None else now
+        self._where: dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def schedule(self, key: Hashable, deadline: float):
+        """Schedule the key to come due at `deadline`, replacing any
+            previous deadline for it. It is returned by the first
+            `advance` that reaches the end of the tick holding the
+            deadline, so at most `resolution` seconds late.
+        """
+        self.cancel(key)
+        slots = len(self.buckets)
+        ticks = max(1, ceil((deadline - self.time) / self.resolution))
+        index = (self.position + ticks) % slots
+        self.buckets[index][key] = (ticks - 1) // slots
+        self._where[key] = index
+
+    def cancel(self, key: Hashable):
+        """Unschedule the key if it is scheduled."""
+        index = self._where.pop(key, None)
+        if index is not None:
+            del self.buckets[index][key]
+
+    def advance(self, now: float | None = None) -> list[Hashable]:
+        """Move the wheel forward to `now` (default `time.monotonic()`)
+            and return the keys that came due, unscheduling them.
+        """
+        now = monotonic() if now is None else now
+        due = []
+        slots = len(self.buckets)
+        while self.time + self.resolution <= now:
+            self.time += self.resolution
+            self.position = (self.position + 1) % slots
+            bucket = self.buckets[self.position]
+            for key, turns in list(bucket.items()):
+                if turns:
+                    bucket[key] = turns - 1
+                    continue
+                del bucket[key]
+                del self._where[key]
+                due.append(key)
+        return due
+
+
+@dataclass
+class KeepAlivePolicy:
+    """Settings for `KeepAlive`. A `PING` is sent on a connection once
+        nothing has been received on it for `interval` seconds (and
+        again every `interval` seconds while it stays silent), and the
+        connection is closed once nothing has been received for
+        `idle_timeout` seconds. Either can be `None` to disable it.
+        Deadlines are checked every `resolution` seconds.
+    """
+    interval: float | None = 15.0
+    idle_timeout: float | None = 45.0
+    resolution: float = 1.0
+
+
+@dataclass(slots=True)
+class LinkState:
+    """Keepalive state of one connection. Times are from
+        `time.monotonic()`; `rtt` is the last measured round-trip time
+        in seconds, or `None` until a `PONG` has been received.
+    """
+    last_rx: float
+    last_ping: float | None = None
+    rtt: float | None = None
+
+
+class KeepAlive:
+    """Tracks when each connection last received anything, sends
+        heartbeats on silent connections, measures the round-trip time
+        from their replies, and closes connections that have been
+        silent for too long. All connections share one `TimerWheel` and
+        one task, so there is no timer per connection, and receiving a
+        frame only updates a timestamp. Heartbeats sent, replies
+        received, and connections closed are counted in `counters` under
+        `'pings_sent'`, `'pongs_received'`, and `'reaped'`.
+
+        Pass a `KeepAlivePolicy` to `TCPServer` or `TCPClient` with
+        `keepalive_policy=...` to enable this.
+    """
+    policy: KeepAlivePolicy
+    links: dict[Hashable, LinkState]
+    wheel: TimerWheel
+    counters: Counter[str]
+    send_ping: Callable[[Hashable], Coroutine[Any, Any, Any] | None]
+    close: Callable[[Hashable], Any]
+    logger: logging.Logger | None
+
+    def __init__(
+            self, policy: KeepAlivePolicy,
+            send_ping: Callable[[Hashable], Coroutine[Any, Any, Any] | None],
+            close: Callable[[Hashable], Any], *,
+            logger: logging.Logger | None = None
+        ):
+        """Initialize the keepalive. `send_ping` is called with the key
+            of a connection to send a `PING` on it; if it returns a
+            coroutine, it is run as a task. `close` is called with the
+            key of a connection that timed out. Raises `ValueError` if a
+            limit of the policy is not positive.
+        """
+        for name in ('interval', 'idle_timeout', 'resolution'):
+            value = getattr(policy, name)
+            if value is not None and value <= 0:
+                raise ValueError(f'{name} must be positive')
+        self.policy = policy
+        self.links = {}
+        self.wheel = TimerWheel(policy.resolution)
+        self.counters = Counter()
+        self.send_ping = send_ping
+        self.close = close
+        self.logger = logger
+        self._task: asyncio.Task | None = None
+        self._sending: set[asyncio.Task] = set()
+
+    def add(self, key: Hashable):
+        """Start tracking a new connection."""
+        now = monotonic()
+        link = self.links[key] = LinkState(now)
+        self._schedule(key, link, now)
+
+    def remove(self, key: Hashable):
+        """Stop tracking a connection."""
+        self.links.pop(key, None)
+        self.wheel.cancel(key)
+
+    def received(self, key: Hashable):
+        """Note that something was received on the connection."""
+        link = self.links.get(key)
+        if link is not None:
+            link.last_rx = monotonic()
+
+    def pong(self, key: Hashable, content: bytes) -> float | None:
+        """Record the round-trip time of the `PING` whose content a
+            `PONG` echoed, and return it (or `None` if the content is
+            not a heartbeat timestamp).
+        """
+        if len(content) != _ping_struct.size:
+            return None
+        rtt = monotonic() - _ping_struct.unpack(content)[0]
+        self.counters['pongs_received'] += 1
+        link = self.links.get(key)
+        if link is not None:
+            link.rtt = rtt
+        return rtt
+
+    def rtt(self, key: Hashable) -> float | None:
+        """Return the last round-trip time measured on the connection."""
+        link = self.links.get(key)
+        return link.rtt if link is not None else None
+
+    def tick(self, now: float | None = None):
+        """Check every connection whose deadline has passed: close it if
+            it timed out, send a `PING` if it has been silent for the
+            heartbeat interval, and schedule its next check. Pings are
+            sent in tasks so that a connection that does not drain
+            cannot hold up the others.
+        """
+        now = monotonic() if now is None else now
+        policy = self.policy
+        for key in self.wheel.advance(now):
+            link = self.links.get(key)
+            if link is None:
+                continue
+            idle = now - link.last_rx
+            if policy.idle_timeout is not None and idle >= policy.idle_timeout:
+                self.links.pop(key)
+                self.counters['reaped'] += 1
+                if self.logger is not None:
+                    self.logger.info(
+                        "Closing connection %s: idle for %.1f s", key, idle
+                    )
+                self.close(key)
+                continue
+            if policy.interval is not None and idle >= policy.interval and (
+                link.last_ping is None or now - link.last_ping >= policy.interval
+            ):
+                link.last_ping = now
+                self.counters['pings_sent'] += 1
+                result = self.send_ping(key)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.create_task(result)
+                    self._sending.add(task)
+                    task.add_done_callback(self._ping_sent)
+            self._schedule(key, link, now)
+
+    def start(self):
+        """Start checking deadlines on the running loop, unless already
+            started.
+        """
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Stop checking deadlines."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        """Call `tick` every `resolution` seconds."""
+        while True:
+            await asyncio.sleep(self.policy.resolution)
+            try:
+                self.tick()
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.error("Error in keepalive tick", exc_info=True)
+
+    def _ping_sent(self, task: asyncio.Task):
+        """Forget a finished ping task, logging its error if it failed."""
+        self._sending.discard(task)
+        if not task.cancelled() and task.exception() is not None and \
+                self.logger is not None:
+            self.logger.warning("Error sending ping: %s", task.exception())
+
+    def _schedule(self, key: Hashable, link: LinkState, now: float):
+        """Schedule the next check of a connection: its next heartbeat
+            or its idle timeout, whichever comes first.
+        """
+        policy = self.policy
+        deadlines = []
+        if policy.idle_timeout is not None:
+            deadlines.append(link.last_rx + policy.idle_timeout)
+        if policy.interval is not None:
+            last = link.last_rx if link.last_ping is None else \
+                max(link.last_rx, link.last_ping)
+            deadlines.append(last + policy.interval)
+        if deadlines:
+            self.wheel.schedule(key, max(min(deadlines), now))
+
+
+def make_ping_msg(
+        *, message_class: type[MessageProtocol],
+        message_type_class: type[IntEnum],
+        body_class: type[BodyProtocol]
+    ) -> MessageProtocol:
+    """Create a `PING` message carrying the current monotonic time, to
+        be echoed back in a `PONG` for measuring the round-trip time.
+    """
+    return message_class.prepare(
+        body_class.prepare(_ping_struct.pack(monotonic())),
+        message_type_class.PING # type: ignore
+    )
+
+
+def make_pong_msg(
+        ping: MessageProtocol, *, message_class: type[MessageProtocol],
+        message_type_class: type[IntEnum],
+        body_class: type[BodyProtocol]
+    ) -> MessageProtocol:
+    """Create the `PONG` reply to a `PING`, echoing its content."""
+    return message_class.prepare(
+        body_class.prepare(ping.body.content),
+        message_type_class.PONG # type: ignore
+    )
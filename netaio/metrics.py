@@ -0,0 +1,244 @@
+from __future__ import annotations
+from collections import Counter
+from time import perf_counter
+from typing import Any, Callable, Hashable
+
+
+STATS_URI = b'_netaio/stats'
+
+_SUB_BITS = 4
+_SUB_COUNT = 1 << _SUB_BITS
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram in whole microseconds. Every power
+        of two is split into 16 linear buckets, so recorded values are
+        kept to within about 6% at any magnitude, with constant-time
+        recording and a few hundred buckets at most.
+    """
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+    counts: list[int]
+    count: int
+    total: int
+    min: int
+    max: int
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, seconds: float):
+        """Record one duration in seconds."""
+        value = int(seconds * 1_000_000 + 0.5)
+        if value < 0:
+            value = 0
+        if value < _SUB_COUNT:
+            index = value
+        else:
+            exponent = value.bit_length() - _SUB_BITS
+            index = exponent * _SUB_COUNT + \
+                (value >> (exponent - 1)) - _SUB_COUNT
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, p: float) -> int:
+        """Return the highest value, in microseconds, that can be in the
+            bucket holding the `p`th percentile (0-100), capped by the
+            largest recorded value.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * p / 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_high(index), self.max)
+        return self.max
+
+    def snapshot(self) -> dict[str, int | float]:
+        """Return the count and the min, mean, p50, p90, p99, p99.9,
+            and max latencies in microseconds.
+        """
+        return {
+            'count': self.count,
+            'min_us': self.min,
+            'mean_us': self.total / self.count if self.count else 0.0,
+            'p50_us': self.percentile(50),
+            'p90_us': self.percentile(90),
+            'p99_us': self.percentile(99),
+            'p999_us': self.percentile(99.9),
+            'max_us': self.max,
+        }
+
+
+def _bucket_high(index: int) -> int:
+    """Return the highest value that falls in a histogram bucket."""
+    exponent, offset = divmod(index, _SUB_COUNT)
+    if exponent == 0:
+        return offset
+    return ((_SUB_COUNT + offset + 1) << (exponent - 1)) - 1
+
+
+class StageTimer:
+    """Times the stages of handling one received message. Each `mark`
+        adds the time since the previous mark (or since the timer was
+        created) to the named stage; `finish` records the stages in
+        the `Metrics` under the message type and the handler key the
+        message was routed to (`route`).
+    """
+    __slots__ = ('metrics', 'message_type', 'route', 'stages', 'last')
+    metrics: Metrics | None
+    message_type: Any
+    route: Hashable | None
+    stages: dict[str, float]
+    last: float
+
+    def __init__(self, metrics: Metrics | None, message_type: Any):
+        self.metrics = metrics
+        self.message_type = message_type
+        self.route = None
+        self.stages = {}
+        self.last = perf_counter()
+
+    def mark(self, stage: str):
+        """Add the time since the last mark to the stage."""
+        now = perf_counter()
+        stages = self.stages
+        stages[stage] = stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def skip(self):
+        """Leave the time since the last mark out of every stage."""
+        self.last = perf_counter()
+
+    def finish(self):
+        """Record the stages in the metrics."""
+        if self.metrics is not None:
+            self.metrics.observe(self.message_type, self.route, self.stages)
+
+
+class _NullTimer:
+    """Stand-in for `StageTimer` when metrics are disabled."""
+    __slots__ = ()
+    route = None
+
+    def __setattr__(self, name: str, value: Any):
+        pass
+
+    def mark(self, stage: str):
+        pass
+
+    def skip(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Registry of counters, gauges, and per-stage latency histograms.
+        Histograms are kept per stage, message type, and route (the
+        handler key a message matched, or `None` for the default
+        handler), so their number is bounded by the registered handlers
+        rather than by the URIs clients send. Gauges are callables that
+        are only evaluated by `snapshot`, so they cost nothing between
+        snapshots.
+
+        Pass an instance to `TCPServer` with `metrics=...` to record
+        every message it receives and sends.
+    """
+    counters: Counter[str]
+    gauges: dict[str, Callable[[], int | float]]
+    histograms: dict[tuple[str, Any, Hashable | None], LatencyHistogram]
+
+    def __init__(self):
+        self.counters = Counter()
+        self.gauges = {}
+        self.histograms = {}
+
+    def timer(self, message_type: Any) -> StageTimer:
+        """Return a `StageTimer` for a received message."""
+        return StageTimer(self, message_type)
+
+    def observe(
+            self, message_type: Any, route: Hashable | None,
+            stages: dict[str, float]
+        ):
+        """Record the time spent in each stage for one message."""
+        histograms = self.histograms
+        for stage, seconds in stages.items():
+            key = (stage, message_type, route)
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def received(self, size: int):
+        """Count a received message of `size` bytes."""
+        self.counters['messages_in'] += 1
+        self.counters['bytes_in'] += size
+
+    def sent(self, size: int, count: int = 1):
+        """Count `count` sent messages of `size` bytes in total."""
+        self.counters['messages_out'] += count
+        self.counters['bytes_out'] += size
+
+    def add_gauge(self, name: str, read: Callable[[], int | float]):
+        """Add a gauge whose value is read by calling `read`."""
+        self.gauges[name] = read
+
+    def snapshot(self) -> dict[str, dict]:
+        """Return the current counters, gauge values, and histogram
+            summaries (see `LatencyHistogram.snapshot`), with the
+            histograms grouped by stage and then by route label, e.g.
+            `'REQUEST_URI items/{id}'`. The result only contains `str`
+            keys and numbers, so it can be serialized with `packify`.
+        """
+        stages: dict[str, dict[str, dict]] = {}
+        for (stage, message_type, route), histogram in self.histograms.items():
+            stages.setdefault(stage, {})[
+                route_label(message_type, route)
+            ] = histogram.snapshot()
+        return {
+            'counters': dict(self.counters),
+            'gauges': {name: read() for name, read in self.gauges.items()},
+            'stages': stages,
+        }
+
+    def reset(self):
+        """Clear the counters and histograms. Gauges are kept."""
+        self.counters.clear()
+        self.histograms.clear()
+
+
+def route_label(message_type: Any, route: Hashable | None) -> str:
+    """Return a readable label for a message type and route."""
+    name = getattr(message_type, 'name', str(message_type))
+    if route is None:
+        return f'{name} (default)'
+    if route == message_type:
+        return name
+    if isinstance(route, tuple):
+        parts = route[1:] if route and route[0] == message_type else route
+        return ' '.join(
+            [name] + [
+                p.decode(errors='replace') if isinstance(p, bytes) else str(p)
+                for p in parts
+            ]
+        )
+    return f'{name} {route}'
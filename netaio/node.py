@@ -26,9 +26,13 @@ from .common import (
     default_node_logger,
     UDPHandler,
 )
+from .cache import CacheKey, ResponseCache
+from .routing import Router, UriTrie, is_uri_pattern, route_params
+from .tracing import TraceSampler
+from .watchdog import Watchdog
 from enum import IntEnum
 from time import time
-from typing import Any, Callable, Coroutine, Hashable, cast
+from typing import Any, Callable, Coroutine, Hashable, Iterable, cast
 import asyncio
 import socket
 import logging
@@ -59,10 +63,13 @@ class UDPNode:
         Hashable,
         tuple[AnyHandler, AuthPluginProtocol|None, CipherPluginProtocol|None]
     ]
+    router: Router
     default_handler: AnyHandler
     extract_keys: Callable[[MessageProtocol, tuple[str, int] | None], list[Hashable]]
     make_error: Callable[[str], MessageProtocol]
     subscriptions: dict[Hashable, set[tuple[str, int]]]
+    subscribed_keys: dict[tuple[str, int], set[Hashable]]
+    pattern_subscriptions: UriTrie
     logger: logging.Logger
     transport: asyncio.DatagramTransport | None
     auth_plugin: AuthPluginProtocol | None
@@ -70,6 +77,9 @@ class UDPNode:
     peer_plugin: PeerPluginProtocol | None
     handle_auth_error: AuthErrorHandler
     handle_timeout_error: TimeoutErrorHandler | None
+    watchdog: Watchdog | None
+    trace_sampler: TraceSampler
+    response_cache: ResponseCache | None
     _timeout_handler_tasks: set[asyncio.Task]
     _timeout_handler_lock: asyncio.Lock
 
@@ -99,6 +109,9 @@ class UDPNode:
             auth_error_handler: AuthErrorHandler = auth_error_handler,
             timeout_error_handler: TimeoutErrorHandler | None = None,
             ignore_own_ip: bool = True,
+            watchdog: Watchdog | None = None,
+            trace_sample_every: int = 1,
+            response_cache: ResponseCache | None = None,
         ):
         """Initialize the UDPNode.
             `port` is the port to listen on.
@@ -138,6 +151,20 @@ class UDPNode:
             logging. The `TimeoutError` is always raised after the
             handler completes. If `ignore_own_ip` is `True`, messages
             from the local IP address will be ignored.
+            If a `Watchdog` is provided, it times the plugins, the
+            default handler, and every handler added afterwards, and
+            samples the event loop lag while the node runs. Handlers of
+            a node are never moved to an executor by the watchdog, since
+            the node does not await handler results.
+            Debug logging on the hot path is skipped without formatting
+            or logger calls unless `DEBUG` is enabled, and then only runs
+            for one in every `trace_sample_every` messages.
+            If a `ResponseCache` is provided, prepared responses to
+            `REQUEST_URI` messages (by default) prepared without
+            peer-specific plugins are cached and sent again without
+            calling the handler or response plugins, until a
+            `CREATE_URI`, `UPDATE_URI`, or `DELETE_URI` handler succeeds
+            for the URI.
         """
         self.peers = {}
         self.peer_addrs = {}
@@ -153,6 +180,7 @@ class UDPNode:
         self.message_class = message_class
         self.handlers = {}
         self.ephemeral_handlers = {}
+        self.router = Router()
         self.default_handler = default_handler
         self.extract_keys = extract_keys
         self.make_error = make_error_msg
@@ -161,9 +189,22 @@ class UDPNode:
         self.peer_plugin = peer_plugin or DefaultPeerPlugin()
         self.handle_auth_error = auth_error_handler
         self.handle_timeout_error = timeout_error_handler
+        self.watchdog = watchdog
+        if watchdog is not None:
+            self.default_handler = watchdog.wrap_handler(
+                'default_handler', default_handler, migratable=False
+            )
+            self.auth_plugin = watchdog.wrap_plugin(auth_plugin, 'auth_plugin')
+            self.cipher_plugin = watchdog.wrap_plugin(
+                cipher_plugin, 'cipher_plugin'
+            )
         self.logger = logger
         self.transport = None
+        self.trace_sampler = TraceSampler(trace_sample_every)
+        self.response_cache = response_cache
         self.subscriptions = {}
+        self.subscribed_keys = {}
+        self.pattern_subscriptions = UriTrie()
         self._advertise_peer_tasks: dict[bytes, asyncio.Task] = {}
         self._timeout_handler_tasks = set()
         self._timeout_handler_lock = asyncio.Lock()
@@ -190,48 +231,59 @@ class UDPNode:
             will parse the message and call the appropriate handler,
             calling plugins as necessary.
         """
+        trace = self.trace_sampler(self.logger)
         if addr[0] == self._local_ip:
-            self.logger.debug("Received datagram from self, ignoring")
+            if trace:
+                self.logger.debug("Received datagram from self, ignoring")
             return
-        self.logger.debug(f"Received datagram from {addr}")
+        if trace:
+            self.logger.debug("Received datagram from %s", addr)
         cipher_plugin, auth_plugin = None, None
+        cache_key: CacheKey | None = None
+        generation = 0
         peer_id = self.peer_addrs.get(addr)
         peer = self.peers.get(peer_id) if peer_id is not None else None
 
-        header_bytes = data[:self.header_class.header_length()]
-        data = data[self.header_class.header_length():]
+        # decode every part from slices of one view; slicing is zero-copy
+        view = memoryview(data)
+        auth_start = self.header_class.header_length()
         header: HeaderProtocol = self.header_class.decode(
-            header_bytes,
+            view[:auth_start],
             message_type_class=self.message_type_class
         )
 
-        auth_bytes = data[:header.auth_length]
-        data = data[header.auth_length:]
-        auth: AuthFieldsProtocol = self.auth_fields_class.decode(auth_bytes)
+        body_start = auth_start + header.auth_length
+        auth: AuthFieldsProtocol = self.auth_fields_class.decode(
+            view[auth_start:body_start]
+        )
 
-        body_bytes = data[:header.body_length]
-        body: BodyProtocol = self.body_class.decode(body_bytes)
+        body: BodyProtocol = self.body_class.decode(
+            view[body_start:body_start + header.body_length]
+        )
 
         message: MessageProtocol = self.message_class(
             header=header,
             auth_data=auth,
             body=body
         )
-        self.logger.debug(
-            "Received message with checksum=%s from %s",
-            message.header.checksum, addr
-        )
+        if trace:
+            self.logger.debug(
+                "Received message with checksum=%s from %s",
+                message.header.checksum, addr
+            )
 
         if not message.check():
-            self.logger.debug("Invalid message received from %s", addr)
+            if trace:
+                self.logger.debug("Invalid message received from %s", addr)
             response: MessageProtocol | None = self.make_error("invalid message")
             if response is not None:
-                self.send(response, addr, use_auth=False, use_cipher=False)
+                self.send(response, addr, use_auth=False, use_cipher=False, trace=trace)
             return
 
         # outer auth
         if self.auth_plugin is not None:
-            self.logger.debug("Calling self.auth_plugin.check on auth and body")
+            if trace:
+                self.logger.debug("Calling self.auth_plugin.check on auth and body")
             check = self.auth_plugin.check(
                 message.auth_data, message.body, self, peer, self.peer_plugin
             )
@@ -241,13 +293,18 @@ class UDPNode:
                     self, self.auth_plugin, message
                 )
                 if response is not None:
-                    self.send(response, addr, use_auth=False, use_cipher=False)
+                    self.send(
+                        response, addr, use_auth=False, use_cipher=False,
+                        trace=trace
+                    )
                 return
-            self.logger.debug("Valid auth_fields received from %s", addr)
+            if trace:
+                self.logger.debug("Valid auth_fields received from %s", addr)
 
         # outer cipher
         if self.cipher_plugin is not None:
-            self.logger.debug("Calling self.cipher_plugin.decrypt on message")
+            if trace:
+                self.logger.debug("Calling self.cipher_plugin.decrypt on message")
             try:
                 message = self.cipher_plugin.decrypt(
                     message, self, peer, self.peer_plugin
@@ -256,21 +313,26 @@ class UDPNode:
                 self.logger.warning("Error decrypting message: %s; dropping", e)
                 return
 
-        keys = self.extract_keys(message, addr)
-        self.logger.debug("Message received from %s with keys=%s", addr, keys)
+        keys = self._handler_keys(message, addr)
+        if trace:
+            self.logger.debug("Message received from %s with keys=%s", addr, keys)
 
         for key in keys:
             if key in self.handlers or key in self.ephemeral_handlers:
-                if key in self.ephemeral_handlers:
+                ephemeral = key in self.ephemeral_handlers
+                if ephemeral:
                     (
                         handler, auth_plugin, cipher_plugin
                     ) = self.ephemeral_handlers.pop(key)
+                    if key not in self.handlers:
+                        self.router.remove(key)
                 else:
                     handler, auth_plugin, cipher_plugin = self.handlers[key]
 
                 # inner auth
                 if auth_plugin is not None:
-                    self.logger.debug("Calling auth_plugin.check on auth and body")
+                    if trace:
+                        self.logger.debug("Calling auth_plugin.check on auth and body")
                     check = auth_plugin.check(
                         message.auth_data, message.body, self, peer, self.peer_plugin
                     )
@@ -280,13 +342,18 @@ class UDPNode:
                             self, auth_plugin, message
                         )
                         if response is not None:
-                            self.send(response, addr, use_auth=False, use_cipher=False)
+                            self.send(
+                                response, addr, use_auth=False, use_cipher=False,
+                                trace=trace
+                            )
                         return
-                    self.logger.debug("Valid inner auth_fields received from %s", addr)
+                    if trace:
+                        self.logger.debug("Valid inner auth_fields received from %s", addr)
 
                 # inner cipher
                 if cipher_plugin is not None:
-                    self.logger.debug("Calling cipher_plugin.decrypt on message")
+                    if trace:
+                        self.logger.debug("Calling cipher_plugin.decrypt on message")
                     try:
                         message = cipher_plugin.decrypt(
                             message, self, peer, self.peer_plugin
@@ -297,13 +364,32 @@ class UDPNode:
                         )
                         return
 
-                self.logger.debug(
-                    "Calling handler with message and addr for key=%s", key
-                )
+                cache = self.response_cache
+                if cache is not None and not ephemeral and \
+                        not self._peer_specific(auth_plugin, cipher_plugin):
+                    cache_key = cache.key(message, key)
+                if cache_key is not None:
+                    cached = cache.get(cache_key) # type: ignore
+                    if cached is not None:
+                        self.send(
+                            cached, addr, use_auth=False, use_cipher=False,
+                            trace=trace
+                        )
+                        return
+                    generation = cache.generation( # type: ignore
+                        message.body.uri
+                    )
+
+                if trace:
+                    self.logger.debug(
+                        "Calling handler with message and addr for key=%s", key
+                    )
                 udp_handler = cast(UDPHandler, handler)
                 response_or_coro = udp_handler(message, addr)
                 response = response_or_coro if \
                     isinstance(response_or_coro, MessageProtocol) else None
+                if cache is not None:
+                    cache.invalidate_for(message, response)
                 break
         else:
             self.logger.warning(
@@ -324,9 +410,10 @@ class UDPNode:
 
             # inner cipher
             if cipher_plugin is not None:
-                self.logger.debug(
-                    "Calling cipher_plugin.encrypt on response (handler)"
-                )
+                if trace:
+                    self.logger.debug(
+                        "Calling cipher_plugin.encrypt on response (handler)"
+                    )
                 try:
                     response = cipher_plugin.encrypt(
                         response, self, peer, self.peer_plugin
@@ -337,16 +424,18 @@ class UDPNode:
 
             # inner auth
             if auth_plugin is not None:
-                self.logger.debug(
-                    "Calling auth_plugin.make on response.body (handler)"
-                )
+                if trace:
+                    self.logger.debug(
+                        "Calling auth_plugin.make on response.body (handler)"
+                    )
                 auth_plugin.make(
                     response.auth_data, response.body, self, peer, self.peer_plugin
                 )
 
             # outer cipher
             if self.cipher_plugin is not None:
-                self.logger.debug("Calling self.cipher_plugin.encrypt on response")
+                if trace:
+                    self.logger.debug("Calling self.cipher_plugin.encrypt on response")
                 try:
                     response = self.cipher_plugin.encrypt(
                         response, self, peer, self.peer_plugin
@@ -357,12 +446,32 @@ class UDPNode:
 
             # outer auth
             if self.auth_plugin is not None:
-                self.logger.debug("Calling self.auth_plugin.make on response.body")
+                if trace:
+                    self.logger.debug("Calling self.auth_plugin.make on response.body")
                 self.auth_plugin.make(
                     response.auth_data, response.body, self, peer, self.peer_plugin
                 )
 
-            self.send(response, addr, use_auth=False, use_cipher=False)
+            if cache_key is not None:
+                self.response_cache.put( # type: ignore
+                    cache_key, response, generation
+                )
+            self.send(response, addr, use_auth=False, use_cipher=False, trace=trace)
+
+    def _peer_specific(
+            self, auth_plugin: AuthPluginProtocol | None,
+            cipher_plugin: CipherPluginProtocol | None
+        ) -> bool:
+        """Return whether the node's plugins or the given handler
+            plugins make a response specific to its peer.
+        """
+        return any(
+            plugin is not None and plugin.is_peer_specific()
+            for plugin in (
+                self.auth_plugin, self.cipher_plugin,
+                auth_plugin, cipher_plugin,
+            )
+        )
 
     def error_received(self, exc: Exception):
         """Called when a send or receive operation raises an `OSError`.
@@ -390,10 +499,19 @@ class UDPNode:
             provided, it will be used to decrypt the message in addition
             to any cipher plugin that is set on the node. These
             plugins will also be used for preparing any response
-            message sent by the handler.
+            message sent by the handler. A `{name}` segment in the URI
+            of a `(message_type, uri)` key matches any one segment; the
+            handler can read the captured values with
+            `get_route_params`. If the node has a `Watchdog`, the
+            handler and plugins are timed by it.
         """
         self.logger.debug("Adding handler for key=%s", key)
+        if self.watchdog is not None:
+            handler, auth_plugin, cipher_plugin = self.watchdog.wrap(
+                key, handler, auth_plugin, cipher_plugin, migratable=False
+            )
         self.handlers[key] = (handler, auth_plugin, cipher_plugin)
+        self.router.add(key)
 
     def add_ephemeral_handler(
             self, key: Hashable, handler: AnyHandler, *,
@@ -405,7 +523,12 @@ class UDPNode:
             Otherwise identical to `add_handler`.
         """
         self.logger.debug("Adding ephemeral handler for key=%s", key)
+        if self.watchdog is not None:
+            handler, auth_plugin, cipher_plugin = self.watchdog.wrap(
+                key, handler, auth_plugin, cipher_plugin, migratable=False
+            )
         self.ephemeral_handlers[key] = (handler, auth_plugin, cipher_plugin)
+        self.router.add(key)
 
     def on(
             self, key: Hashable, *,
@@ -451,26 +574,60 @@ class UDPNode:
             return func
         return decorator
 
+    def _handler_keys(
+            self, message: MessageProtocol, addr: tuple[str, int] | None
+        ) -> tuple[Hashable, ...] | list[Hashable]:
+        """Return the keys to look up the handler for a message by. With
+            the default `keys_extractor`, this is the single key found by
+            the `router` (or none), and any URI parameters it captured
+            are made available through `get_route_params`. Otherwise it
+            is the list returned by `extract_keys`.
+        """
+        # clear the previous message's params for this task
+        route_params.set({})
+        if self.extract_keys is not keys_extractor:
+            return self.extract_keys(message, addr)
+        found = self.router.resolve(
+            message.header.message_type, message.body.uri, addr
+        )
+        if found is None:
+            return ()
+        key, params = found
+        route_params.set(params)
+        return (key,)
+
     def remove_handler(self, key: Hashable):
         """Remove a handler for a specific key."""
         self.logger.debug("Removing handler for key=%s", key)
         if key in self.handlers:
             del self.handlers[key]
+            if key not in self.ephemeral_handlers:
+                self.router.remove(key)
 
     def remove_ephemeral_handler(self, key: Hashable):
         """Remove an ephemeral handler for a specific key."""
         self.logger.debug("Removing ephemeral handler for key=%s", key)
         if key in self.ephemeral_handlers:
             del self.ephemeral_handlers[key]
+            if key not in self.handlers:
+                self.router.remove(key)
 
     def subscribe(self, key: Hashable, addr: tuple[str, int]):
         """Subscribe a peer to a specific key. The key must be a
-            Hashable object.
+            Hashable object. A `bytes` key with a `*` or `**` segment,
+            e.g. `b'sensors/*'` or `b'sensors/**'`, is a URI pattern:
+            `notify` also reaches its subscribers for every URI it
+            matches (see `UriTrie`).
         """
         self.logger.debug("Subscribing peer to key=%s", key)
         if key not in self.subscriptions:
             self.subscriptions[key] = set()
+            if is_uri_pattern(key):
+                self.pattern_subscriptions[key] = self.subscriptions[key] # type: ignore
         self.subscriptions[key].add(addr)
+        if addr not in self.subscribed_keys:
+            self.subscribed_keys[addr] = set()
+        self.subscribed_keys[addr].add(key)
 
     def unsubscribe(self, key: Hashable, addr: tuple[str, int]):
         """Unsubscribe a peer from a specific key. If no subscribers
@@ -482,19 +639,72 @@ class UDPNode:
             self.subscriptions[key].remove(addr)
             if not self.subscriptions[key]:
                 del self.subscriptions[key]
+                self.pattern_subscriptions.pop(key)
+            keys = self.subscribed_keys.get(addr)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.subscribed_keys[addr]
+
+    def unsubscribe_all(self, addr: tuple[str, int]):
+        """Unsubscribe a peer from every key it is subscribed to.
+            Uses the `subscribed_keys` index, so the cost depends only
+            on the number of keys the peer held.
+        """
+        for key in self.subscribed_keys.pop(addr, ()):
+            subscribers = self.subscriptions.get(key)
+            if subscribers is None:
+                continue
+            subscribers.discard(addr)
+            if not subscribers:
+                del self.subscriptions[key]
+                self.pattern_subscriptions.pop(key)
+
+    def get_subscribers(self, key: Hashable) -> set[tuple[str, int]]:
+        """Return the peers subscribed to the key, including those
+            subscribed to a `*`/`**` URI pattern that matches it. The
+            returned set must not be modified.
+        """
+        subscribers = self.subscriptions.get(key)
+        if not self.pattern_subscriptions or not isinstance(key, bytes):
+            return subscribers or set()
+        matches = self.pattern_subscriptions.match(key)
+        if not matches:
+            return subscribers or set()
+        result = set(subscribers) if subscribers else set()
+        for pattern_subscribers in matches:
+            result.update(pattern_subscribers)
+        return result
+
+    def _remove_subscription_key(self, key: Hashable):
+        """Remove a key and all of its subscribers from the
+            subscriptions.
+        """
+        self.pattern_subscriptions.pop(key)
+        for addr in self.subscriptions.pop(key, ()):
+            keys = self.subscribed_keys.get(addr)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.subscribed_keys[addr]
 
     def prepare_message(
         self, message: MessageProtocol, *,
         use_auth: bool = True, use_cipher: bool = True,
         auth_plugin: AuthPluginProtocol|None = None,
         cipher_plugin: CipherPluginProtocol|None = None, peer: Peer|None = None,
+        trace: bool|None = None,
     ) -> MessageProtocol|None:
         """Prepares a message for transmission by invoking all necessary
-            plugins.
+            plugins. `trace` is the caller's `TraceSampler` decision for
+            the message; if it is `None`, the message is sampled here.
         """
+        if trace is None:
+            trace = self.trace_sampler(self.logger)
         # inner cipher
         if cipher_plugin is not None:
-            self.logger.debug("Calling cipher_plugin.encrypt on message")
+            if trace:
+                self.logger.debug("Calling cipher_plugin.encrypt on message")
             try:
                 message = cipher_plugin.encrypt(
                     message, self, peer, self.peer_plugin
@@ -507,7 +717,8 @@ class UDPNode:
 
         # inner auth
         if auth_plugin is not None:
-            self.logger.debug("Calling auth_plugin.make on auth_data and body")
+            if trace:
+                self.logger.debug("Calling auth_plugin.make on auth_data and body")
             try:
                 auth_plugin.make(
                     message.auth_data, message.body, self, peer,
@@ -521,7 +732,8 @@ class UDPNode:
 
         # outer cipher
         if use_cipher and self.cipher_plugin is not None:
-            self.logger.debug("Calling self.cipher_plugin.encrypt on message")
+            if trace:
+                self.logger.debug("Calling self.cipher_plugin.encrypt on message")
             try:
                 message = self.cipher_plugin.encrypt(
                     message, self, peer, self.peer_plugin
@@ -534,9 +746,10 @@ class UDPNode:
 
         # outer auth
         if use_auth and self.auth_plugin is not None:
-            self.logger.debug(
-                "Calling self.auth_plugin.make on auth_data and body"
-            )
+            if trace:
+                self.logger.debug(
+                    "Calling self.auth_plugin.make on auth_data and body"
+                )
             try:
                 self.auth_plugin.make(
                     message.auth_data, message.body, self, peer,
@@ -561,12 +774,15 @@ class UDPNode:
             family=socket.AF_INET
         )
         self.logger.info(f"UDPNode started on port {self.port}")
+        if self.watchdog is not None:
+            self.watchdog.start_lag_monitor()
 
     def send(
             self, message: MessageProtocol, addr: tuple[str, int], *,
             use_auth: bool = True, use_cipher: bool = True,
             auth_plugin: AuthPluginProtocol|None = None,
-            cipher_plugin: CipherPluginProtocol|None = None
+            cipher_plugin: CipherPluginProtocol|None = None,
+            trace: bool|None = None
         ):
         """Send a message to a given address (unicast or multicast).
             If an auth plugin is provided, it will be used to authorize
@@ -575,14 +791,18 @@ class UDPNode:
             encrypt the message in addition to any cipher plugin that is
             set on the node. If `use_auth` is `False`, the auth plugin
             set on the node will not be used. If `use_cipher` is `False`,
-            the cipher plugin set on the node will not be used.
+            the cipher plugin set on the node will not be used. `trace`
+            is the caller's `TraceSampler` decision for the message; if
+            it is `None`, the message is sampled here.
         """
+        if trace is None:
+            trace = self.trace_sampler(self.logger)
         peer_id = self.peer_addrs.get(addr, None)
         peer = self.peers.get(peer_id) if peer_id is not None else None
         prepared_msg: MessageProtocol | None = self.prepare_message(
             message, use_auth=use_auth, use_cipher=use_cipher,
             auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
-            peer=peer,
+            peer=peer, trace=trace,
         )
         if prepared_msg is None:
             return
@@ -590,9 +810,23 @@ class UDPNode:
         if self.transport is None:
             return
         self.transport.sendto(data, addr)
-        self.logger.debug(
-            f"Sent message with checksum={message.header.checksum} to {addr}"
-        )
+        if trace:
+            self.logger.debug(
+                "Sent message with checksum=%s to %s",
+                message.header.checksum, addr
+            )
+
+    def send_frame(self, data: bytes, addrs: Iterable[tuple[str, int]]):
+        """Send an encoded frame to every address, passing the same
+            `bytes` object to each `sendto` call. No per-address message
+            work is done, so the frame must already be prepared with any
+            plugins.
+        """
+        if self.transport is None:
+            return
+        sendto = self.transport.sendto
+        for addr in addrs:
+            sendto(data, addr)
 
     async def request(
             self, uri: bytes,
@@ -829,22 +1063,26 @@ class UDPNode:
             auth_plugin: AuthPluginProtocol|None = None,
             cipher_plugin: CipherPluginProtocol|None = None
         ):
-        """Send the message to all known peers. If an auth plugin is
-            provided, it will be used to authorize the message in
-            addition to any auth plugin that is set on the node. If a
-            cipher plugin is provided, it will be used to encrypt the
-            message in addition to any cipher plugin that is set on the
-            node. If `use_auth` is `False`, the auth plugin set on the
-            node will not be used. If `use_cipher` is `False`, the cipher
-            plugin set on the node will not be used.
+        """Send the message to all known peers. Unless a plugin is
+            peer-specific, the message is prepared and encoded once and
+            the frame is sent to every peer with `send_frame`. If an
+            auth plugin is provided, it will be used to authorize the
+            message in addition to any auth plugin that is set on the
+            node. If a cipher plugin is provided, it will be used to
+            encrypt the message in addition to any cipher plugin that is
+            set on the node. If `use_auth` is `False`, the auth plugin
+            set on the node will not be used. If `use_cipher` is
+            `False`, the cipher plugin set on the node will not be used.
         """
+        trace = self.trace_sampler(self.logger)
         if len(self.peers) == 0:
-            self.logger.debug("Skipping broadcast -- no peers")
+            if trace:
+                self.logger.debug("Skipping broadcast -- no peers")
             return
-        self.logger.debug("Broadcasting message to all peers")
-        messages = []
+        if trace:
+            self.logger.debug("Broadcasting message to all peers")
+        addrs = []
         peer_ids = set()
-        prepared_msg: MessageProtocol | None = None
 
         # check if any plugin is peer-specific
         peer_specific = False
@@ -857,33 +1095,37 @@ class UDPNode:
         if cipher_plugin and cipher_plugin.is_peer_specific():
             peer_specific = True
 
+        for addr, peer_id in self.peer_addrs.items():
+            # only send to each peer once, regardless of how many addrs it has
+            if peer_id in peer_ids:
+                continue
+            peer_ids.add(peer_id)
+            addrs.append(addr)
+
         if not peer_specific:
+            # prepare and encode once, then send the same frame to every peer
             prepared_msg = self.prepare_message(
                 message, use_auth=use_auth, use_cipher=use_cipher,
                 auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                trace=trace,
             )
-            if not prepared_msg:
-                return
+            if prepared_msg:
+                self.send_frame(prepared_msg.encode(), addrs)
+            return
 
-        for addr, peer_id in self.peer_addrs.items():
-            # only send to each peer once, regardless of how many addrs it has
-            if peer_id in peer_ids:
-                continue
-            peer_ids.add(peer_id)
-            peer = self.peers.get(peer_id) if peer_id is not None else None
-            if peer_specific:
-                msg = self.prepare_message(
-                    message.copy(), use_auth=use_auth, use_cipher=use_cipher,
-                    auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
-                    peer=peer,
-                )
-            else:
-                msg = prepared_msg
+        messages = []
+        for addr in addrs:
+            peer = self.peers.get(self.peer_addrs[addr])
+            msg = self.prepare_message(
+                message.copy(), use_auth=use_auth, use_cipher=use_cipher,
+                auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                peer=peer, trace=trace,
+            )
             if msg:
                 messages.append((addr, msg))
 
         for addr, msg in messages:
-            self.send(msg, addr, use_auth=False, use_cipher=False)
+            self.send(msg, addr, use_auth=False, use_cipher=False, trace=trace)
 
     def multicast(
             self, message: MessageProtocol, port: int|None = None, *,
@@ -900,15 +1142,18 @@ class UDPNode:
             node will not be used. If `use_cipher` is `False`, the cipher
             plugin set on the node will not be used.
         """
-        self.logger.debug("Multicasting message to the multicast group")
+        trace = self.trace_sampler(self.logger)
+        if trace:
+            self.logger.debug("Multicasting message to the multicast group")
         prepared_msg: MessageProtocol | None = self.prepare_message(
             message, use_auth=use_auth, use_cipher=use_cipher,
             auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+            trace=trace,
         )
         if not prepared_msg:
             return
         addr = (self.multicast_group, port or self.port)
-        self.send(prepared_msg, addr, use_auth=False, use_cipher=False)
+        self.send(prepared_msg, addr, use_auth=False, use_cipher=False, trace=trace)
 
     def notify(
             self, key: Hashable, message: MessageProtocol, *,
@@ -916,31 +1161,29 @@ class UDPNode:
             auth_plugin: AuthPluginProtocol|None = None,
             cipher_plugin: CipherPluginProtocol|None = None
         ):
-        """Send the message to all subscribed peers for the given key
-            concurrently using `asyncio.gather`. If an auth plugin is
-            provided, it will be used to authorize the message in
-            addition to any auth plugin that is set on the node. If a
-            cipher plugin is provided, it will be used to encrypt the
-            message in addition to any cipher plugin that is set on
-            the node. If `use_auth` is `False`, the auth plugin set on
-            the node will not be used. If `use_cipher` is `False`, the
-            cipher plugin set on the node will not be used.
+        """Send the message to all subscribed peers for the given key.
+            Unless a plugin is peer-specific, the message is prepared
+            and encoded once and the frame is sent to every subscriber
+            with `send_frame`. If an auth plugin is provided, it will be
+            used to authorize the message in addition to any auth plugin
+            that is set on the node. If a cipher plugin is provided, it
+            will be used to encrypt the message in addition to any
+            cipher plugin that is set on the node. If `use_auth` is
+            `False`, the auth plugin set on the node will not be used.
+            If `use_cipher` is `False`, the cipher plugin set on the
+            node will not be used.
         """
-        if key not in self.subscriptions:
-            self.logger.debug(
-                "No subscribers found for key=%s, skipping notification", key
-            )
-            return
-
-        subscribers = self.subscriptions.get(key, set())
+        trace = self.trace_sampler(self.logger)
+        subscribers = self.get_subscribers(key)
         if not subscribers:
-            self.logger.debug(
-                "No subscribers found for key=%s, removing from subscriptions", key
-            )
-            del self.subscriptions[key]
+            if trace:
+                self.logger.debug(
+                    "No subscribers found for key=%s, skipping notification", key
+                )
             return
 
-        self.logger.debug("Notifying %d peers for key=%s", len(subscribers), key)
+        if trace:
+            self.logger.debug("Notifying %d peers for key=%s", len(subscribers), key)
 
         # check if any plugin is peer-specific
         peer_specific = False
@@ -953,31 +1196,30 @@ class UDPNode:
         if cipher_plugin and cipher_plugin.is_peer_specific():
             peer_specific = True
 
-        prepared_msg: MessageProtocol | None = None
         if not peer_specific:
+            # prepare and encode once, then send the same frame to everyone
             prepared_msg = self.prepare_message(
                 message, use_auth=use_auth, use_cipher=use_cipher,
-                auth_plugin=auth_plugin, cipher_plugin=cipher_plugin
+                auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                trace=trace,
             )
             if not prepared_msg:
                 return
-
-        for addr in subscribers:
-            peer_id = self.peer_addrs.get(addr, None)
-            peer = self.peers.get(peer_id) if peer_id is not None else None
-            if peer_specific:
+            self.send_frame(prepared_msg.encode(), subscribers)
+        else:
+            for addr in subscribers:
+                peer_id = self.peer_addrs.get(addr, None)
+                peer = self.peers.get(peer_id) if peer_id is not None else None
                 msg = self.prepare_message(
                     message.copy(), use_auth=use_auth, use_cipher=use_cipher,
                     auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
-                    peer=peer
+                    peer=peer, trace=trace
                 )
-            else:
-                msg = prepared_msg
+                if msg:
+                    self.send(msg, addr, use_auth=False, use_cipher=False, trace=trace)
 
-            if msg:
-                self.send(msg, addr, use_auth=False, use_cipher=False)
-
-        self.logger.debug("Notified %d peers for key=%s", len(subscribers), key)
+        if trace:
+            self.logger.debug("Notified %d peers for key=%s", len(subscribers), key)
 
     def add_or_update_peer(
             self, peer_id: bytes, peer_data: bytes, addr: tuple[str, int]
@@ -987,21 +1229,26 @@ class UDPNode:
             `True` if a `PEER_DISCOVERED` message should be sent (`False`
             if it is the local peer).
         """
+        # not a per-message path, so no sample tick is spent on it
+        trace = self.logger.isEnabledFor(logging.DEBUG)
         if self.local_peer is not None and peer_id == self.local_peer.id:
-            self.logger.debug("Ignoring local peer.")
+            if trace:
+                self.logger.debug("Ignoring local peer.")
             return False
         if peer_id in self.peers:
-            self.logger.debug(
-                "Updating peer 0x%s at %s with data %s",
-                peer_id.hex(), addr, peer_data.hex()
-            )
+            if trace:
+                self.logger.debug(
+                    "Updating peer 0x%s at %s with data %s",
+                    peer_id.hex(), addr, peer_data.hex()
+                )
             self.peers[peer_id].update(peer_data)
             self.peers[peer_id].addrs.add(addr)
         else:
-            self.logger.debug(
-                "Adding peer 0x%s at %s with data %s",
-                peer_id.hex(), addr, peer_data.hex()
-            )
+            if trace:
+                self.logger.debug(
+                    "Adding peer 0x%s at %s with data %s",
+                    peer_id.hex(), addr, peer_data.hex()
+                )
             self.peers[peer_id] = Peer({addr}, peer_id, peer_data)
         self.peer_addrs[addr] = peer_id
         return True
@@ -1030,14 +1277,11 @@ class UDPNode:
         if peer_id in self.peers:
             peer = self.peers[peer_id]
             del self.peers[peer_id]
-            for addr in peer.addrs:
-                if addr in self.subscriptions:
-                    del self.subscriptions[addr]
+            for peer_addr in peer.addrs:
+                self._remove_subscription_key(peer_addr)
         if addr in self.peer_addrs:
             del self.peer_addrs[addr]
-        for key in self.subscriptions:
-            if addr in self.subscriptions[key]:
-                self.subscriptions[key].remove(addr)
+        self.unsubscribe_all(addr)
 
     def remove_timed_out_peers(self, timeout: int):
         """Remove timed out peers from the peer list."""
@@ -1303,6 +1547,8 @@ class UDPNode:
         for app_id in list(self._advertise_peer_tasks.keys()):
             await self.stop_peer_management(app_id)
         await self.cancel_timeout_handler_tasks()
+        if self.watchdog is not None:
+            self.watchdog.stop_lag_monitor()
         self.transport.close()
 
     def set_logger(self, logger: logging.Logger):
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from .common import MessageProtocol
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import IntEnum
+from functools import partial, wraps
+from typing import Any, Callable, Coroutine
+import asyncio
+
+
+class Offloader:
+    """Runs blocking calls in an `Executor` so that CPU-heavy handlers
+        and plugins do not block the event loop. At most `max_pending`
+        calls are submitted at once; further calls wait for a free slot
+        instead of growing the executor's queue without bound.
+    """
+    executor: Executor
+    max_pending: int
+    pending: int
+    _semaphore: asyncio.Semaphore
+
+    def __init__(
+            self, executor: Executor | None = None, *,
+            max_pending: int = 64
+        ):
+        """Initialize the offloader. `executor` defaults to a new
+            `ThreadPoolExecutor`. Raises `ValueError` if `max_pending`
+            is less than 1.
+        """
+        if max_pending < 1:
+            raise ValueError('max_pending must be at least 1')
+        self.executor = executor or ThreadPoolExecutor()
+        self.max_pending = max_pending
+        self.pending = 0
+        self._semaphore = asyncio.Semaphore(max_pending)
+
+    @property
+    def uses_processes(self) -> bool:
+        """`True` if calls run in other processes, so arguments and
+            results must be picklable.
+        """
+        return isinstance(self.executor, ProcessPoolExecutor)
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Call `func(*args)` in the executor and return its result,
+            waiting first if `max_pending` calls are already running.
+        """
+        async with self._semaphore:
+            self.pending += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.executor, partial(func, *args)
+                )
+            finally:
+                self.pending -= 1
+
+    def wrap_handler(
+            self, handler: Callable
+        ) -> Callable[..., Coroutine[Any, Any, MessageProtocol | None]]:
+        """Wrap a sync handler so that it runs in the executor and
+            returns a coroutine. With a `ProcessPoolExecutor`, the
+            handler must be picklable (e.g. a module-level function):
+            the message is sent to it encoded, the handler receives
+            `None` in place of the writer or address, and the response
+            is sent back encoded. Raises `TypeError` for coroutine
+            functions.
+        """
+        if asyncio.iscoroutinefunction(handler):
+            raise TypeError('coroutine handlers cannot be offloaded')
+
+        if not self.uses_processes:
+            @wraps(handler)
+            async def offloaded(message: MessageProtocol, writer: Any):
+                return await self.run(handler, message, writer)
+            return offloaded
+
+        @wraps(handler)
+        async def offloaded_to_process(message: MessageProtocol, _: Any):
+            message_class = type(message)
+            message_type_class = type(message.header.message_type)
+            data = await self.run(
+                _call_handler, handler, message_class,
+                message_type_class, message.encode()
+            )
+            if data is None:
+                return None
+            return message_class.decode(data, message_type_class)
+        return offloaded_to_process
+
+    def shutdown(self, wait: bool = True):
+        """Shut down the executor."""
+        self.executor.shutdown(wait=wait)
+
+
+def _call_handler(
+        handler: Callable, message_class: type[MessageProtocol],
+        message_type_class: type[IntEnum], data: bytes
+    ) -> bytes | None:
+    """Decode a message, call a handler with it in a worker process,
+        and return the encoded response.
+    """
+    response = handler(message_class.decode(data, message_type_class), None)
+    return response.encode() if isinstance(response, MessageProtocol) else None
+
+
+class OffloadedPlugin:
+    """Wraps an auth or cipher plugin so that the `check`, `make`,
+        `encrypt`, and `decrypt` calls made by `TCPServer.handle_frame`
+        run in an `Offloader` and are awaited. The messages prepared by
+        the server's `send`, `broadcast`, and `notify` are prepared in
+        the `Offloader` as well. Every other use of the plugin, e.g. by
+        `send_nowait`, `TCPClient`, or `UDPNode`, calls it directly, as
+        if it were not wrapped. Only thread executors are supported,
+        since plugin methods receive the server and mutate messages in
+        place.
+    """
+    plugin: Any
+    offloader: Offloader
+
+    def __init__(self, plugin: Any, offloader: Offloader):
+        """Wrap the plugin. Raises `TypeError` if the offloader uses a
+            `ProcessPoolExecutor`.
+        """
+        if offloader.uses_processes:
+            raise TypeError('plugins can only be offloaded to threads')
+        self.plugin = plugin
+        self.offloader = offloader
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.plugin, name)
+
+
+def plugin_offloader(*plugins: Any) -> Offloader | None:
+    """Return the `Offloader` of the first `OffloadedPlugin` among the
+        plugins, or `None` if none of them is offloaded.
+    """
+    for plugin in plugins:
+        if isinstance(plugin, OffloadedPlugin):
+            return plugin.offloader
+    return None
+
+
+async def call_plugin(plugin: Any, method: str, *args) -> Any:
+    """Call a plugin method, running it in the plugin's `Offloader` if
+        the plugin is an `OffloadedPlugin`.
+    """
+    if isinstance(plugin, OffloadedPlugin):
+        return await plugin.offloader.run(
+            getattr(plugin.plugin, method), *args
+        )
+    return getattr(plugin, method)(*args)
@@ -0,0 +1,404 @@
+from __future__ import annotations
+from contextvars import ContextVar
+from typing import Any, Hashable, Iterator
+
+
+_MISSING = object()
+
+
+def is_uri_pattern(key: Hashable, separator: bytes = b'/') -> bool:
+    """Check whether a key is a `bytes` URI pattern, i.e. whether any
+        of its segments is a `*` or `**` wildcard.
+    """
+    if not isinstance(key, bytes) or b'*' not in key:
+        return False
+    return any(
+        segment in (b'*', b'**') for segment in key.split(separator)
+    )
+
+
+class _TrieNode:
+    """One segment of a `UriTrie`."""
+    __slots__ = ('children', 'value')
+    children: dict[bytes, _TrieNode]
+    value: Any
+
+    def __init__(self):
+        self.children = {}
+        self.value = _MISSING
+
+
+class UriTrie:
+    """Maps `bytes` URI patterns to values in a trie of URI segments.
+        In a pattern, a `*` segment matches exactly one segment and a
+        `**` segment matches zero or more segments, so `b'sensors/*'`
+        matches `b'sensors/temp'` and `b'sensors/**'` also matches
+        `b'sensors'` and `b'sensors/temp/1'`. `match` finds the values
+        of all patterns that match a URI in time proportional to the
+        URI depth rather than the number of patterns.
+    """
+    separator: bytes
+    _root: _TrieNode
+    _size: int
+
+    def __init__(self, separator: bytes = b'/'):
+        """Initialize an empty trie. `separator` splits URIs into
+            segments.
+        """
+        self.separator = separator
+        self._root = _TrieNode()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, pattern: Hashable) -> bool:
+        return self.get(pattern, _MISSING) is not _MISSING
+
+    def __setitem__(self, pattern: bytes, value: Any):
+        """Set the value for a pattern."""
+        node = self._root
+        for segment in pattern.split(self.separator):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _TrieNode()
+            node = child
+        if node.value is _MISSING:
+            self._size += 1
+        node.value = value
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Iterate over the stored patterns."""
+        stack: list[tuple[_TrieNode, list[bytes]]] = [(self._root, [])]
+        while stack:
+            node, path = stack.pop()
+            if node.value is not _MISSING:
+                yield self.separator.join(path)
+            for segment, child in node.children.items():
+                stack.append((child, path + [segment]))
+
+    def get(self, pattern: Hashable, default: Any = None) -> Any:
+        """Return the value stored for exactly this pattern, or the
+            default.
+        """
+        if not isinstance(pattern, bytes):
+            return default
+        node = self._root
+        for segment in pattern.split(self.separator):
+            node = node.children.get(segment)
+            if node is None:
+                return default
+        return default if node.value is _MISSING else node.value
+
+    def pop(self, pattern: Hashable, default: Any = None) -> Any:
+        """Remove a pattern and return its value, or the default if the
+            pattern is not stored. Prunes nodes left without children.
+        """
+        if not isinstance(pattern, bytes):
+            return default
+        path = [self._root]
+        segments = pattern.split(self.separator)
+        for segment in segments:
+            node = path[-1].children.get(segment)
+            if node is None:
+                return default
+            path.append(node)
+        node = path[-1]
+        if node.value is _MISSING:
+            return default
+        value = node.value
+        node.value = _MISSING
+        self._size -= 1
+        for i in range(len(segments), 0, -1):
+            node = path[i]
+            if node.children or node.value is not _MISSING:
+                break
+            del path[i-1].children[segments[i-1]]
+        return value
+
+    def match(self, uri: bytes) -> list[Any]:
+        """Return the values of all patterns that match the URI. Each
+            value is returned once, even if its pattern matches in more
+            than one way.
+        """
+        segments = uri.split(self.separator)
+        count = len(segments)
+        results = []
+        matched: set[int] = set()
+        visited: set[tuple[int, int]] = set()
+        stack = [(self._root, 0)]
+        while stack:
+            node, i = stack.pop()
+            state = (id(node), i)
+            if state in visited:
+                continue
+            visited.add(state)
+            children = node.children
+            multi = children.get(b'**')
+            if multi is not None:
+                # `**` consumes zero or more of the remaining segments
+                for j in range(i, count + 1):
+                    stack.append((multi, j))
+            if i == count:
+                if node.value is not _MISSING and id(node) not in matched:
+                    matched.add(id(node))
+                    results.append(node.value)
+                continue
+            child = children.get(segments[i])
+            if child is not None:
+                stack.append((child, i + 1))
+            single = children.get(b'*')
+            if single is not None:
+                stack.append((single, i + 1))
+        return results
+
+
+route_params: ContextVar[dict[str, bytes]] = ContextVar('route_params')
+_NO_PARAMS: dict[str, bytes] = {}
+_ANY_HOST = object()
+
+
+def get_route_params() -> dict[str, bytes]:
+    """Return the URI parameters captured by the route of the message
+        currently being handled, e.g. `{'id': b'42'}` for a handler
+        registered for `(MessageType.REQUEST_URI, b'users/{id}')` that
+        received `b'users/42'`. The returned dict must not be modified.
+    """
+    return route_params.get(_NO_PARAMS)
+
+
+def _param_name(segment: bytes) -> str | None:
+    """Return the parameter name of a `{name}` route segment, or `None`
+        if the segment is static.
+    """
+    if len(segment) > 2 and segment[:1] == b'{' and segment[-1:] == b'}':
+        return segment[1:-1].decode()
+    return None
+
+
+class _RouteNode:
+    """One segment of a parameterized route tree."""
+    __slots__ = ('children', 'param', 'routes')
+    children: dict[bytes, _RouteNode]
+    param: _RouteNode | None
+    routes: dict[Any, tuple[Hashable, tuple[str, ...]]]
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.routes = {}
+
+
+class _TypeRoutes:
+    """All routes registered for one message type."""
+    __slots__ = ('key', 'static', 'host_static', 'tree', 'host_params')
+    key: Any
+    static: dict[Hashable, Hashable]
+    host_static: dict[Hashable, dict[Any, Hashable]]
+    tree: _RouteNode | None
+    host_params: int
+
+    def __init__(self):
+        self.key = _MISSING
+        self.static = {}
+        self.host_static = {}
+        self.tree = None
+        self.host_params = 0
+
+
+class Router:
+    """Compiled index of handler keys in the forms produced by
+        `keys_extractor`: `message_type`, `(message_type, uri)`, and
+        `(message_type, uri, host)`. Keys are indexed by message type
+        and then by URI, so `resolve` finds the most specific registered
+        key for a message with one lookup per level instead of probing
+        each extracted key. A URI segment of the form `{name}` is a
+        parameter that matches any one segment, e.g. `b'users/{id}'`;
+        static segments take precedence over parameters. Keys in any
+        other form are ignored.
+    """
+    separator: bytes
+    _routes: dict[Hashable, _TypeRoutes]
+    _keys: set[Hashable]
+
+    def __init__(self, separator: bytes = b'/'):
+        """Initialize an empty router. `separator` splits URIs into
+            segments for parameterized routes.
+        """
+        self.separator = separator
+        self._routes = {}
+        self._keys = set()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def add(self, key: Hashable):
+        """Index a handler key. Adding a key twice has no effect."""
+        if key in self._keys:
+            return
+        if isinstance(key, tuple):
+            if len(key) not in (2, 3):
+                return
+            message_type, uri = key[0], key[1]
+            host = key[2] if len(key) == 3 else _ANY_HOST
+        else:
+            message_type, uri, host = key, None, None
+        table = self._routes.get(message_type)
+        if table is None:
+            table = self._routes[message_type] = _TypeRoutes()
+        self._keys.add(key)
+
+        if uri is None:
+            table.key = key
+            return
+        names = self._param_names(uri)
+        if names is None:
+            if host is _ANY_HOST:
+                table.static[uri] = key
+            else:
+                table.host_static.setdefault(uri, {})[host] = key
+            return
+
+        node = table.tree
+        if node is None:
+            node = table.tree = _RouteNode()
+        for segment in uri.split(self.separator):
+            if _param_name(segment) is not None:
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            else:
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = _RouteNode()
+                node = child
+        node.routes[host] = (key, names)
+        if host is not _ANY_HOST:
+            table.host_params += 1
+
+    def remove(self, key: Hashable):
+        """Remove a handler key from the index, if present."""
+        if key not in self._keys:
+            return
+        self._keys.discard(key)
+        if isinstance(key, tuple):
+            message_type, uri = key[0], key[1]
+            host = key[2] if len(key) == 3 else _ANY_HOST
+        else:
+            message_type, uri, host = key, None, None
+        table = self._routes[message_type]
+
+        if uri is None:
+            table.key = _MISSING
+        elif self._param_names(uri) is None:
+            if host is _ANY_HOST:
+                table.static.pop(uri, None)
+            else:
+                hosts = table.host_static.get(uri, {})
+                hosts.pop(host, None)
+                if not hosts:
+                    table.host_static.pop(uri, None)
+        else:
+            node = table.tree
+            for segment in uri.split(self.separator):
+                if _param_name(segment) is not None:
+                    node = node.param # type: ignore
+                else:
+                    node = node.children[segment] # type: ignore
+            node.routes.pop(host, None) # type: ignore
+            if host is not _ANY_HOST:
+                table.host_params -= 1
+
+        if table.key is _MISSING and not table.static and \
+                not table.host_static and not self._has_routes(table.tree):
+            del self._routes[message_type]
+
+    def resolve(
+            self, message_type: Hashable, uri: Hashable, host: Any = None
+        ) -> tuple[Hashable, dict[str, bytes]] | None:
+        """Return the most specific key registered for the message type,
+            URI, and host together with the captured URI parameters, or
+            `None` if no key matches. The order of precedence follows
+            `keys_extractor`: host-specific URI routes, then URI routes,
+            then the bare message type.
+        """
+        table = self._routes.get(message_type)
+        if table is None:
+            return None
+        if table.host_static:
+            hosts = table.host_static.get(uri)
+            if hosts is not None and host in hosts:
+                return hosts[host], _NO_PARAMS
+        tree = table.tree
+        segments = None
+        if tree is not None and table.host_params and isinstance(uri, bytes):
+            segments = uri.split(self.separator)
+            found = self._match(tree, segments, 0, host, [])
+            if found is not None:
+                return found
+        key = table.static.get(uri)
+        if key is not None:
+            return key, _NO_PARAMS
+        if tree is not None and isinstance(uri, bytes):
+            if segments is None:
+                segments = uri.split(self.separator)
+            found = self._match(tree, segments, 0, _ANY_HOST, [])
+            if found is not None:
+                return found
+        if table.key is not _MISSING:
+            return table.key, _NO_PARAMS
+        return None
+
+    def _param_names(self, uri: Hashable) -> tuple[str, ...] | None:
+        """Return the parameter names of a route URI, or `None` if it
+            has no parameters.
+        """
+        if not isinstance(uri, bytes) or b'{' not in uri:
+            return None
+        names = tuple(
+            name for name in map(_param_name, uri.split(self.separator))
+            if name is not None
+        )
+        return names or None
+
+    def _match(
+            self, node: _RouteNode, segments: list[bytes], i: int,
+            host: Any, values: list[bytes]
+        ) -> tuple[Hashable, dict[str, bytes]] | None:
+        """Depth-first match of the URI segments from index `i`,
+            preferring static segments over parameters.
+        """
+        if i == len(segments):
+            route = node.routes.get(host)
+            if route is None:
+                return None
+            key, names = route
+            return key, dict(zip(names, values))
+        child = node.children.get(segments[i])
+        if child is not None:
+            found = self._match(child, segments, i + 1, host, values)
+            if found is not None:
+                return found
+        if node.param is not None:
+            values.append(segments[i])
+            found = self._match(node.param, segments, i + 1, host, values)
+            if found is not None:
+                return found
+            values.pop()
+        return None
+
+    @staticmethod
+    def _has_routes(node: _RouteNode | None) -> bool:
+        """Check whether any route remains in a route tree."""
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            if node.routes:
+                return True
+            stack.extend(node.children.values())
+            if node.param is not None:
+                stack.append(node.param)
+        return False
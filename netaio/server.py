@@ -16,6 +16,7 @@ from .common import (
     keys_extractor,
     make_error_msg,
     make_not_found_msg,
+    make_respond_uri_msg,
     auth_error_handler,
     AnyHandler,
     AuthErrorHandler,
@@ -23,10 +24,27 @@ from .common import (
     default_server_logger,
     Handler,
 )
+from .admission import AdmissionControl, AdmissionPolicy
+from .bus import WorkerBus
+from .cache import CacheKey, ResponseCache
+from .coalesce import RequestCoalescer
+from .keepalive import KeepAlive, KeepAlivePolicy, make_ping_msg, make_pong_msg
+from .metrics import Metrics, NULL_TIMER, STATS_URI, StageTimer
+from .offload import Offloader, call_plugin, plugin_offloader
+from .routing import Router, UriTrie, is_uri_pattern, route_params
+from .transport import FrameProtocol, read_frame
+from .tracing import TraceSampler
+from .watchdog import Watchdog
+from .connection import Connection, OutboundQueue, SlowConsumerPolicy
+from collections import Counter
 from enum import IntEnum
-from typing import Callable, Coroutine, Hashable, Any, cast
+from functools import partial
+from typing import Callable, Coroutine, Hashable, Any, Iterable, cast
+from itertools import count
 import asyncio
 import logging
+import os
+import packify
 
 
 def not_found_handler(*_) -> MessageProtocol | None:
@@ -37,6 +55,7 @@ class TCPServer:
     """TCP server class."""
     port: int
     interface: str
+    path: str | None
     local_peer: Peer | None
     peers: dict[bytes, Peer]
     peer_addrs: dict[tuple[str, int], bytes]
@@ -48,6 +67,7 @@ class TCPServer:
         Hashable,
         tuple[AnyHandler, AuthPluginProtocol|None, CipherPluginProtocol|None]
     ]
+    router: Router
     default_handler: AnyHandler
     header_class: type[HeaderProtocol]
     message_type_class: type[IntEnum]
@@ -59,12 +79,34 @@ class TCPServer:
     ]
     make_error: Callable[[str], MessageProtocol]
     subscriptions: dict[Hashable, set[asyncio.StreamWriter]]
+    subscribed_keys: dict[asyncio.StreamWriter, set[Hashable]]
+    pattern_subscriptions: UriTrie
+    bus: WorkerBus | None
     clients: set[asyncio.StreamWriter]
     logger: logging.Logger
     auth_plugin: AuthPluginProtocol | None
     cipher_plugin: CipherPluginProtocol | None
     peer_plugin: PeerPluginProtocol | None
     handle_auth_error: AuthErrorHandler
+    use_buffered_protocol: bool
+    compact_connections: bool
+    connection_buffer_size: int
+    max_in_flight: int
+    ordered_responses: bool
+    request_id_field: str | None
+    use_outbound_queues: bool
+    outbound: dict[asyncio.StreamWriter | FrameProtocol, OutboundQueue]
+    slow_consumer_policy: SlowConsumerPolicy | None
+    slow_consumer_counters: Counter[str]
+    watchdog: Watchdog | None
+    metrics: Metrics | None
+    trace_sampler: TraceSampler
+    admission: AdmissionControl | None
+    keepalive: KeepAlive | None
+    response_cache: ResponseCache | None
+    request_coalescer: RequestCoalescer | None
+    peer_offloader: Offloader | None
+    peer_batch_size: int
 
     def __init__(
             self, port: int = 8888, interface: str = "0.0.0.0", *,
@@ -87,10 +129,35 @@ class TCPServer:
             cipher_plugin: CipherPluginProtocol | None = None,
             peer_plugin: PeerPluginProtocol | None = None,
             auth_error_handler: AuthErrorHandler = auth_error_handler,
+            use_buffered_protocol: bool = False,
+            max_in_flight: int = 1,
+            ordered_responses: bool = True,
+            request_id_field: str | None = None,
+            use_outbound_queues: bool = False,
+            slow_consumer_policy: SlowConsumerPolicy | None = None,
+            watchdog: Watchdog | None = None,
+            metrics: Metrics | None = None,
+            stats_uri: bytes | None = STATS_URI,
+            trace_sample_every: int = 1,
+            admission_policy: AdmissionPolicy | None = None,
+            compact_connections: bool = False,
+            connection_buffer_size: int = 256,
+            keepalive_policy: KeepAlivePolicy | None = None,
+            response_cache: ResponseCache | None = None,
+            request_coalescer: RequestCoalescer | None = None,
+            peer_offloader: Offloader | None = None,
+            peer_batch_size: int = 64,
+            path: str | None = None,
         ):
         """Initialize the TCPServer.
             `interface` is the interface to listen on.
             `port` is the port to listen on.
+            If `path` is provided, the server instead listens on a Unix
+            domain socket at that path, which is replaced if it exists
+            and removed when the server stops. Each connection to it is
+            identified by the address `(path, n)` with a connection
+            number `n`, in place of its empty `peername`; see
+            `address_of`.
             `local_peer` is the local peer information for this server.
             `header_class`, `auth_fields_class`, `body_class`, and
             `message_class` will be used for sending messages and
@@ -119,15 +186,115 @@ class TCPServer:
             send error messages for failed auth checks (e.g. if the
             auth plugin is an anti-spam plugin and messages that fail
             the auth check should just be dropped).
+            If `use_buffered_protocol` is `True`, connections are served
+            by a `FrameProtocol` instead of a `StreamReader` and
+            `StreamWriter` pair; the protocol object is then passed to
+            handlers in place of the writer.
+            `max_in_flight` is the number of messages per connection
+            that may be handled concurrently; the default of 1 handles
+            them one at a time. If it is greater than 1, responses are
+            sent in request order if `ordered_responses` is `True` and
+            in completion order otherwise.
+            `request_id_field` is the auth field holding the request ID
+            set by clients (see `TCPClient.request_id_field`); if it is
+            set, it is copied from every received message into the
+            response to it. It is `None` by default, which leaves the
+            auth data of responses as the handlers made it.
+            If `use_outbound_queues` is `True`, each connection gets an
+            `OutboundQueue`: `send`, `broadcast`, and `notify` queue the
+            encoded frame without awaiting, and the queue's writer task
+            coalesces queued frames into one `writelines` call.
+            `slow_consumer_policy` is the default `SlowConsumerPolicy`
+            for each connection's outbound queue; setting it implies
+            `use_outbound_queues`. How often each policy action fired is
+            counted in `slow_consumer_counters`.
+            If a `Watchdog` is provided, it times the plugins, the
+            default handler, and every handler added afterwards, and
+            samples the event loop lag while the server runs.
+            If a `Metrics` registry is provided, the server records the
+            latency of each stage of handling a received message, the
+            messages and bytes received and sent, and gauges for the
+            connections, subscriptions, and outbound queues. Unless
+            `stats_uri` is `None`, a `REQUEST_URI` message for it is
+            answered with the `packify`-serialized `Metrics.snapshot`.
+            Debug logging on the hot path is skipped without formatting
+            or logger calls unless `DEBUG` is enabled, and then only runs
+            for one in every `trace_sample_every` messages.
+            If an `admission_policy` is provided, connections over its
+            limit are closed on accept, and received messages over its
+            rate or in-flight limits are shed before they are decoded
+            or passed to any plugin; see `AdmissionControl` for the
+            counters in `admission.counters`.
+            If `compact_connections` is `True`, each connection is
+            served by a slotted `Connection` protocol that keeps no task
+            while idle, caches the peer address and `Peer`, and starts
+            with a receive buffer of `connection_buffer_size` bytes that
+            grows on demand; use it to hold many mostly idle clients.
+            Messages on a compact connection are handled one at a time,
+            so it cannot be combined with a `max_in_flight` above 1.
+            If a `keepalive_policy` is provided, clients that have sent
+            nothing for its `interval` are sent a `PING` (clients answer
+            with a `PONG`, from which the round-trip time is measured),
+            and clients silent for its `idle_timeout` are disconnected;
+            see `KeepAlive`. Every `PING` received is answered with a
+            `PONG`. The message type class must define `PING` and
+            `PONG`.
+            If a `ResponseCache` is provided, prepared responses to
+            `REQUEST_URI` messages (by default) are cached and reused
+            without calling the handler or response plugins, and are
+            invalidated when a `CREATE_URI`, `UPDATE_URI`, or
+            `DELETE_URI` handler succeeds for the same URI; see
+            `ResponseCache` for which responses are cached. Responses
+            prepared with a peer-specific plugin are never cached.
+            If a `RequestCoalescer` is provided, concurrent `REQUEST_URI`
+            messages (by default) with the same URI and content that are
+            routed to an async handler share one handler call; each
+            requester gets its own copy of the response, which is then
+            prepared with the plugins for its peer.
+            If a `peer_offloader` is provided, `broadcast` and `notify`
+            with a peer-specific plugin prepare the copy of the message
+            for each client in its threads, in batches of
+            `peer_batch_size` clients, and send each batch as soon as it
+            is ready instead of preparing every copy on the event loop.
+            Its executor must be a `ThreadPoolExecutor`, since the
+            plugins receive the server; this pays off with plugins that
+            release the GIL (e.g. PyNaCl).
         """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if compact_connections and max_in_flight > 1:
+            raise ValueError(
+                "compact_connections cannot be used with max_in_flight > 1"
+            )
+        if connection_buffer_size < 1:
+            raise ValueError("connection_buffer_size must be at least 1")
+        if peer_batch_size < 1:
+            raise ValueError("peer_batch_size must be at least 1")
+        if peer_offloader is not None and peer_offloader.uses_processes:
+            raise TypeError("peer_offloader must use threads")
+        if keepalive_policy is not None and not (
+            hasattr(message_type_class, 'PING') and
+            hasattr(message_type_class, 'PONG')
+        ):
+            raise ValueError(
+                "keepalive_policy requires PING and PONG message types"
+            )
         self.interface = interface
         self.port = port
+        self.path = path
+        # addresses of Unix socket connections, which have no peername
+        self._unix_addrs: dict[asyncio.StreamWriter | FrameProtocol, tuple[str, int]] = {}
+        self._connection_numbers = count(1)
         self.local_peer = local_peer
         self.peers = {}
         self.peer_addrs = {}
         self.handlers = {}
         self.ephemeral_handlers = {}
+        self.router = Router()
         self.subscriptions = {}
+        self.subscribed_keys = {}
+        self.pattern_subscriptions = UriTrie()
+        self.bus = None
         self.clients = set()
         self.header_class = header_class or Header
         validate_message_type_class(message_type_class)
@@ -140,14 +307,77 @@ class TCPServer:
         self.default_handler = default_handler
         self.logger = logger
         self.auth_plugin = auth_plugin
+        self.trace_sampler = TraceSampler(trace_sample_every)
         self.cipher_plugin = cipher_plugin
         self.peer_plugin = peer_plugin or DefaultPeerPlugin()
         self.handle_auth_error = auth_error_handler
+        self.use_buffered_protocol = use_buffered_protocol
+        self.compact_connections = compact_connections
+        self.connection_buffer_size = connection_buffer_size
+        self._peers_version = 0
+        self.max_in_flight = max_in_flight
+        self.ordered_responses = ordered_responses
+        self.request_id_field = request_id_field
+        self.use_outbound_queues = use_outbound_queues or \
+            slow_consumer_policy is not None
+        self.outbound = {}
+        self.slow_consumer_policy = slow_consumer_policy
+        self.slow_consumer_counters = Counter()
+        self.admission = AdmissionControl(admission_policy) \
+            if admission_policy is not None else None
+        self.watchdog = watchdog
+        if watchdog is not None:
+            self.default_handler = watchdog.wrap_handler(
+                'default_handler', default_handler
+            )
+            self.auth_plugin = watchdog.wrap_plugin(auth_plugin, 'auth_plugin')
+            self.cipher_plugin = watchdog.wrap_plugin(
+                cipher_plugin, 'cipher_plugin'
+            )
+        self.response_cache = response_cache
+        self.request_coalescer = request_coalescer
+        self.peer_offloader = peer_offloader
+        self.peer_batch_size = peer_batch_size
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.add_gauge('connections', lambda: len(self.clients))
+            metrics.add_gauge(
+                'subscription_keys', lambda: len(self.subscriptions)
+            )
+            metrics.add_gauge('subscriptions', lambda: sum(
+                len(keys) for keys in self.subscribed_keys.values()
+            ))
+            metrics.add_gauge('queued_messages', lambda: sum(
+                len(queue) for queue in self.outbound.values()
+            ))
+            metrics.add_gauge('queued_bytes', lambda: sum(
+                queue.buffered_bytes for queue in self.outbound.values()
+            ))
+            if stats_uri is not None:
+                if response_cache is not None:
+                    response_cache.exclude.add(stats_uri)
+                self.add_handler(
+                    (self.message_type_class.REQUEST_URI, stats_uri), # type: ignore
+                    self._stats_handler
+                )
+        self.keepalive = None
+        if keepalive_policy is not None:
+            self.keepalive = KeepAlive(
+                keepalive_policy, self._send_ping, self._close_idle,
+                logger=self.logger,
+            )
+            self.add_handler(
+                self.message_type_class.PING, self._ping_handler # type: ignore
+            )
+            self.add_handler(
+                self.message_type_class.PONG, self._pong_handler # type: ignore
+            )
 
     def add_handler(
             self, key: Hashable, handler: AnyHandler, *,
             auth_plugin: AuthPluginProtocol | None = None,
-            cipher_plugin: CipherPluginProtocol | None = None
+            cipher_plugin: CipherPluginProtocol | None = None,
+            offloader: Offloader | None = None
         ):
         """Register a handler for a specific key. The handler must
             accept a `MessageProtocol` object as an argument and return a
@@ -158,27 +388,49 @@ class TCPServer:
             provided, it will be used to decrypt the message in addition
             to any cipher plugin that is set on the server. These
             plugins will also be used for preparing any response
-            message sent by the handler.
+            message sent by the handler. A `{name}` segment in the URI
+            of a `(message_type, uri)` key matches any one segment; the
+            handler can read the captured values with
+            `get_route_params`. If an `Offloader` is provided, a sync
+            handler runs in its executor instead of on the event loop.
+            If the server has a `Watchdog`, the handler and plugins are
+            timed by it.
         """
         self.logger.debug("Adding handler for key=%s", key)
+        if offloader is not None:
+            handler = offloader.wrap_handler(handler)
+        if self.watchdog is not None:
+            handler, auth_plugin, cipher_plugin = self.watchdog.wrap(
+                key, handler, auth_plugin, cipher_plugin
+            )
         self.handlers[key] = (handler, auth_plugin, cipher_plugin)
+        self.router.add(key)
 
     def add_ephemeral_handler(
             self, key: Hashable, handler: AnyHandler, *,
             auth_plugin: AuthPluginProtocol | None = None,
-            cipher_plugin: CipherPluginProtocol | None = None
+            cipher_plugin: CipherPluginProtocol | None = None,
+            offloader: Offloader | None = None
         ):
         """Register an ephemeral handler for a specific key. The handler
             will be removed either after it is called the first time.
             Otherwise identical to `add_handler`.
         """
         self.logger.debug("Adding ephemeral handler for key=%s", key)
+        if offloader is not None:
+            handler = offloader.wrap_handler(handler)
+        if self.watchdog is not None:
+            handler, auth_plugin, cipher_plugin = self.watchdog.wrap(
+                key, handler, auth_plugin, cipher_plugin
+            )
         self.ephemeral_handlers[key] = (handler, auth_plugin, cipher_plugin)
+        self.router.add(key)
 
     def on(
             self, key: Hashable, *,
             auth_plugin: AuthPluginProtocol | None = None,
-            cipher_plugin: CipherPluginProtocol | None = None
+            cipher_plugin: CipherPluginProtocol | None = None,
+            offloader: Offloader | None = None
         ):
         """Decorator to register a handler for a specific key. The
             handler must accept a `MessageProtocol` object as an argument
@@ -189,11 +441,14 @@ class TCPServer:
             plugin is provided, it will be used to decrypt the message in
             addition to any cipher plugin that is set on the server.
             These plugins will also be used for preparing any response
-            message sent by the handler.
+            message sent by the handler. If an `Offloader` is provided,
+            a sync handler runs in its executor instead of on the event
+            loop.
         """
         def decorator(func: AnyHandler):
             self.add_handler(
-                key, func, auth_plugin=auth_plugin, cipher_plugin=cipher_plugin
+                key, func, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, offloader=offloader
             )
             return func
         return decorator
@@ -201,7 +456,8 @@ class TCPServer:
     def once(
             self, key: Hashable, *,
             auth_plugin: AuthPluginProtocol | None = None,
-            cipher_plugin: CipherPluginProtocol | None = None
+            cipher_plugin: CipherPluginProtocol | None = None,
+            offloader: Offloader | None = None
         ):
         """Decorator to register a one-time handler for a specific key.
             The handler must accept a `MessageProtocol` object as an
@@ -212,37 +468,76 @@ class TCPServer:
             server. If a cipher plugin is provided, it will be used to
             decrypt the message in addition to any cipher plugin that is
             set on the server. These plugins will also be used for
-            preparing any response message sent by the handler.
+            preparing any response message sent by the handler. If an
+            `Offloader` is provided, a sync handler runs in its executor
+            instead of on the event loop.
         """
         def decorator(func: AnyHandler):
             self.add_ephemeral_handler(
                 key, func,
                 auth_plugin=auth_plugin,
-                cipher_plugin=cipher_plugin
+                cipher_plugin=cipher_plugin,
+                offloader=offloader,
             )
             return func
         return decorator
 
+    def _handler_keys(
+            self, message: MessageProtocol, addr: tuple[str, int] | None
+        ) -> tuple[Hashable, ...] | list[Hashable]:
+        """Return the keys to look up the handler for a message by. With
+            the default `keys_extractor`, this is the single key found by
+            the `router` (or none), and any URI parameters it captured
+            are made available through `get_route_params`. Otherwise it
+            is the list returned by `extract_keys`.
+        """
+        # clear the previous message's params for this task
+        route_params.set({})
+        if self.extract_keys is not keys_extractor:
+            return self.extract_keys(message, addr)
+        found = self.router.resolve(
+            message.header.message_type, message.body.uri, addr
+        )
+        if found is None:
+            return ()
+        key, params = found
+        route_params.set(params)
+        return (key,)
+
     def remove_handler(self, key: Hashable):
         """Remove a handler for a specific key."""
         self.logger.debug("Removing handler for key=%s", key)
         if key in self.handlers:
             del self.handlers[key]
+            if key not in self.ephemeral_handlers:
+                self.router.remove(key)
 
     def remove_ephemeral_handler(self, key: Hashable):
         """Remove an ephemeral handler for a specific key."""
         self.logger.debug("Removing ephemeral handler for key=%s", key)
         if key in self.ephemeral_handlers:
             del self.ephemeral_handlers[key]
+            if key not in self.handlers:
+                self.router.remove(key)
 
     def subscribe(self, key: Hashable, writer: asyncio.StreamWriter):
         """Subscribe a client to a specific key. The key must be a
-            Hashable object.
+            Hashable object. A `bytes` key with a `*` or `**` segment,
+            e.g. `b'sensors/*'` or `b'sensors/**'`, is a URI pattern:
+            `notify` also reaches its subscribers for every URI it
+            matches (see `UriTrie`).
         """
         self.logger.debug("Subscribing client to key=%s", key)
         if key not in self.subscriptions:
             self.subscriptions[key] = set()
+            if is_uri_pattern(key):
+                self.pattern_subscriptions[key] = self.subscriptions[key] # type: ignore
+            if self.bus is not None:
+                self.bus.subscribed(key)
         self.subscriptions[key].add(writer)
+        if writer not in self.subscribed_keys:
+            self.subscribed_keys[writer] = set()
+        self.subscribed_keys[writer].add(key)
 
     def unsubscribe(self, key: Hashable, writer: asyncio.StreamWriter):
         """Unsubscribe a client from a specific key. If no subscribers
@@ -254,29 +549,94 @@ class TCPServer:
             self.subscriptions[key].remove(writer)
             if not self.subscriptions[key]:
                 del self.subscriptions[key]
+                self.pattern_subscriptions.pop(key)
+                if self.bus is not None:
+                    self.bus.unsubscribed(key)
+            keys = self.subscribed_keys.get(writer)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.subscribed_keys[writer]
+
+    def unsubscribe_all(self, writer: asyncio.StreamWriter):
+        """Unsubscribe a client from every key it is subscribed to.
+            Uses the `subscribed_keys` index, so the cost depends only
+            on the number of keys the client held.
+        """
+        for key in self.subscribed_keys.pop(writer, ()):
+            subscribers = self.subscriptions.get(key)
+            if subscribers is None:
+                continue
+            subscribers.discard(writer)
+            if not subscribers:
+                del self.subscriptions[key]
+                self.pattern_subscriptions.pop(key)
+                if self.bus is not None:
+                    self.bus.unsubscribed(key)
+
+    def get_subscribers(self, key: Hashable) -> set[asyncio.StreamWriter]:
+        """Return the clients subscribed to the key, including those
+            subscribed to a `*`/`**` URI pattern that matches it. The
+            returned set must not be modified.
+        """
+        subscribers = self.subscriptions.get(key)
+        if not self.pattern_subscriptions or not isinstance(key, bytes):
+            return subscribers or set()
+        matches = self.pattern_subscriptions.match(key)
+        if not matches:
+            return subscribers or set()
+        result = set(subscribers) if subscribers else set()
+        for pattern_subscribers in matches:
+            result.update(pattern_subscribers)
+        return result
+
+    def _remove_subscription_key(self, key: Hashable):
+        """Remove a key and all of its subscribers from the
+            subscriptions.
+        """
+        self.pattern_subscriptions.pop(key)
+        if key in self.subscriptions and self.bus is not None:
+            self.bus.unsubscribed(key)
+        for writer in self.subscriptions.pop(key, ()):
+            keys = self.subscribed_keys.get(writer)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.subscribed_keys[writer]
 
     async def handle_client(
-            self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, *,
+            self, reader: asyncio.StreamReader | FrameProtocol,
+            writer: asyncio.StreamWriter | FrameProtocol, *,
             use_auth: bool = True, use_cipher: bool = True
         ):
         """Handle a client connection. When a client connects, it is
             added to the clients set. The client is then read from using
             the receive method coroutine until the connection is lost.
             The receive method calls the proper handlers if they are
-            defined and the message is valid. If `use_auth` is `False`,
-            the auth plugin set on the server will not be used. If
-            `use_cipher` is `False`, the cipher plugin set on the server
-            will not be used.
+            defined and the message is valid. If `max_in_flight` is
+            greater than 1, messages are instead handled concurrently by
+            `receive_pipelined`. If `use_auth` is `False`, the auth
+            plugin set on the server will not be used. If `use_cipher`
+            is `False`, the cipher plugin set on the server will not be
+            used.
         """
-        addr = writer.get_extra_info("peername")
-        self.logger.info("Client connected from %s", addr)
-        self.clients.add(writer)
+        if not self._open_connection(writer):
+            writer.close()
+            await writer.wait_closed()
+            return
+        addr = self.address_of(writer)
 
         try:
-            while writer and not writer.is_closing():
-                await self.receive(
+            if self.max_in_flight > 1:
+                await self.receive_pipelined(
                     reader, writer, use_auth=use_auth, use_cipher=use_cipher
                 )
+            else:
+                while writer and not writer.is_closing():
+                    await self.receive(
+                        reader, writer, use_auth=use_auth,
+                        use_cipher=use_cipher
+                    )
         except asyncio.IncompleteReadError:
             self.logger.info("Client disconnected from %s", addr)
             pass  # Client disconnected
@@ -286,68 +646,311 @@ class TCPServer:
         except Exception as e:
             self.logger.error("Error handling client:", exc_info=True)
         finally:
-            self.logger.info("Removing closed client %s", addr)
-            self.clients.discard(writer)
-            for key, subscribers in list(self.subscriptions.items()):
-                if writer in subscribers:
-                    subscribers.discard(writer)
-                    if not subscribers:
-                        del self.subscriptions[key]
+            queue = self._forget_connection(writer)
+            if queue is not None:
+                await queue.close()
             writer.close()
             await writer.wait_closed()
 
+    def _open_connection(
+            self, writer: asyncio.StreamWriter | FrameProtocol
+        ) -> bool:
+        """Add a new client connection to the clients set, with an
+            outbound queue if the server uses them. Returns `False`
+            without adding it if the admission control rejects it.
+        """
+        if self.path is not None:
+            addr = (self.path, next(self._connection_numbers))
+            self._unix_addrs[writer] = addr
+            if isinstance(writer, Connection):
+                writer.peername = addr
+        else:
+            addr = writer.get_extra_info("peername")
+        if self.admission is not None and \
+                not self.admission.connect(writer, len(self.clients)):
+            self.logger.warning(
+                "Rejecting client from %s: too many connections", addr
+            )
+            self._unix_addrs.pop(writer, None)
+            return False
+        self.logger.info("Client connected from %s", addr)
+        if self.use_outbound_queues:
+            self.outbound[writer] = OutboundQueue(
+                writer, policy=self.slow_consumer_policy,
+                shared_counters=self.slow_consumer_counters,
+                logger=self.logger,
+            )
+        self.clients.add(writer)
+        if self.keepalive is not None:
+            self.keepalive.add(writer)
+        if self.metrics is not None:
+            self.metrics.counters['connections_opened'] += 1
+        return True
+
+    def _forget_connection(
+            self, writer: asyncio.StreamWriter | FrameProtocol
+        ) -> OutboundQueue | None:
+        """Remove a closed client connection from the clients set and
+            all subscriptions. Returns its outbound queue, if any, for
+            the caller to close.
+        """
+        self.logger.info(
+            "Removing closed client %s", self.address_of(writer)
+        )
+        self.clients.discard(writer)
+        if self.keepalive is not None:
+            self.keepalive.remove(writer)
+        if self.admission is not None:
+            self.admission.disconnect(writer)
+        if self.metrics is not None:
+            self.metrics.counters['connections_closed'] += 1
+        self.unsubscribe_all(writer)
+        self._unix_addrs.pop(writer, None)
+        return self.outbound.pop(writer, None)
+
+    def address_of(self, writer: asyncio.StreamWriter | FrameProtocol) -> Any:
+        """Return the address that identifies a client connection, by
+            which its peer is found in `peer_addrs`: its `peername`, or
+            `(path, n)` for a Unix domain socket connection.
+        """
+        return writer.get_extra_info("peername") or \
+            self._unix_addrs.get(writer)
+
+    def _lookup_peer(
+            self, writer: asyncio.StreamWriter | FrameProtocol,
+            addr: tuple[str, int] | None
+        ) -> Peer | None:
+        """Return the known peer at the client's address, if any. For
+            a compact `Connection`, the result is cached on the
+            connection until the peer list changes.
+        """
+        if type(writer) is Connection:
+            if writer.peers_version != self._peers_version:
+                peer_id = self.peer_addrs.get(addr)
+                writer.peer = self.peers.get(peer_id) \
+                    if peer_id is not None else None
+                writer.peers_version = self._peers_version
+            return writer.peer
+        peer_id = self.peer_addrs.get(addr)
+        return self.peers.get(peer_id) if peer_id is not None else None
+
     async def receive(
-            self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, *,
+            self, reader: asyncio.StreamReader | FrameProtocol,
+            writer: asyncio.StreamWriter | FrameProtocol, *,
             use_auth: bool = True, use_cipher: bool = True,
         ):
         """Receive and process a message from a client. Used by the
             `handle_client` coroutine. Calls the proper handlers if they
-            are defined and the message is valid. If `use_auth` is
-            `False`, the auth plugin set on the server will not be used.
-            If `use_cipher` is `False`, the cipher plugin set on the
-            server will not be used.
+            are defined and the message is valid, then sends the
+            response, if any. If `use_auth` is `False`, the auth plugin
+            set on the server will not be used. If `use_cipher` is
+            `False`, the cipher plugin set on the server will not be
+            used.
         """
-        addr = writer.get_extra_info("peername")
-        self.logger.debug("Received data from %s", addr)
-        header_length = self.header_class.header_length()
-        peer_id = self.peer_addrs.get(addr)
-        peer = self.peers.get(peer_id) if peer_id is not None else None
-        auth_plugin = None
-        cipher_plugin = None
-        header_bytes = await reader.readexactly(header_length)
-        header = self.header_class.decode(
-            header_bytes,
-            message_type_class=self.message_type_class
+        header, payload = await read_frame(
+            reader, self.header_class, self.message_type_class
         )
+        if self.keepalive is not None:
+            self.keepalive.received(writer)
+        if self.admission is not None and not await self._admit(writer):
+            return
+        try:
+            timer = self._start_timer(header, payload)
+            trace = self.trace_sampler(self.logger)
+            response = await self.handle_frame(
+                header, payload, writer, use_auth=use_auth,
+                use_cipher=use_cipher, timer=timer, trace=trace
+            )
+            if response is not None:
+                response.encode()
+                timer.mark('encode')
+                await self.send(
+                    writer, response, use_auth=False, use_cipher=False,
+                    trace=trace
+                )
+                timer.mark('write')
+            timer.finish()
+        finally:
+            if self.admission is not None:
+                self.admission.release()
+
+    async def _admit(
+            self, writer: asyncio.StreamWriter | FrameProtocol
+        ) -> bool:
+        """Ask the admission control whether to handle a message just
+            read from the client. If not, the message is shed, with an
+            error response if the policy says to respond.
+        """
+        admission = cast(AdmissionControl, self.admission)
+        peer_id = self.peer_addrs.get(self.address_of(writer))
+        if admission.admit(writer, peer_id):
+            return True
+        if admission.policy.respond:
+            await self.send(
+                writer, self.make_error("rate limited"), # type: ignore
+                use_auth=False, use_cipher=False
+            )
+        return False
+
+    def _start_timer(
+            self, header: HeaderProtocol, payload: memoryview
+        ) -> StageTimer:
+        """Count a received frame and return a `StageTimer` for it, or
+            a timer that records nothing if the server has no `Metrics`.
+        """
+        if self.metrics is None:
+            return NULL_TIMER # type: ignore
+        self.metrics.received(header.header_length() + len(payload))
+        return self.metrics.timer(header.message_type)
+
+    async def receive_pipelined(
+            self, reader: asyncio.StreamReader | FrameProtocol,
+            writer: asyncio.StreamWriter | FrameProtocol, *,
+            use_auth: bool = True, use_cipher: bool = True,
+        ):
+        """Receive messages from a client until the connection ends,
+            handling up to `max_in_flight` of them concurrently so that
+            a slow handler does not block later messages. Once the limit
+            is reached, no more is read from the socket until a message
+            has been handled and its response sent. Responses are sent
+            in request order if `ordered_responses` is `True` and in
+            completion order otherwise. Used by `handle_client`.
+        """
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks: set[asyncio.Task] = set()
+        previous: asyncio.Future | None = None
+        loop = asyncio.get_running_loop()
+
+        async def handle(
+                header: HeaderProtocol, payload: memoryview,
+                previous: asyncio.Future | None, sent: asyncio.Future | None
+            ):
+            try:
+                timer = self._start_timer(header, payload)
+                trace = self.trace_sampler(self.logger)
+                response = await self.handle_frame(
+                    header, payload, writer, use_auth=use_auth,
+                    use_cipher=use_cipher, timer=timer, trace=trace
+                )
+                if response is not None:
+                    response.encode()
+                    timer.mark('encode')
+                if previous is not None:
+                    await previous
+                    timer.skip()
+                if response is not None:
+                    await self.send(
+                        writer, response, use_auth=False, use_cipher=False,
+                        trace=trace
+                    )
+                    timer.mark('write')
+                timer.finish()
+            except Exception as e:
+                self.logger.error("Error handling message:", exc_info=True)
+            finally:
+                if sent is not None:
+                    sent.set_result(None)
+                in_flight.release()
+                if self.admission is not None:
+                    self.admission.release()
 
-        auth_bytes = await reader.readexactly(header.auth_length)
-        auth = self.auth_fields_class.decode(auth_bytes)
+        try:
+            while writer and not writer.is_closing():
+                await in_flight.acquire()
+                try:
+                    header, payload = await read_frame(
+                        reader, self.header_class, self.message_type_class
+                    )
+                except BaseException:
+                    in_flight.release()
+                    raise
+                if self.keepalive is not None:
+                    self.keepalive.received(writer)
+                if self.admission is not None and \
+                        not await self._admit(writer):
+                    in_flight.release()
+                    continue
+                sent = loop.create_future() if self.ordered_responses else None
+                task = asyncio.create_task(
+                    handle(header, payload, previous, sent)
+                )
+                previous = sent
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            # finish handling messages that were already received
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
 
-        body_bytes = await reader.readexactly(header.body_length)
-        body = self.body_class.decode(body_bytes)
+    async def handle_frame(
+            self, header: HeaderProtocol, payload: memoryview,
+            writer: asyncio.StreamWriter | FrameProtocol, *,
+            use_auth: bool = True, use_cipher: bool = True,
+            timer: StageTimer | None = None,
+            trace: bool | None = None,
+        ) -> MessageProtocol | None:
+        """Process a received frame: decode the message from the header
+            and the `payload` (the auth fields followed by the body),
+            check and decrypt it with the plugins, and call the proper
+            handler. Returns the response with all plugins applied,
+            ready to be sent with `use_auth=False` and
+            `use_cipher=False`, or `None` if there is nothing to send.
+            If `use_auth` is `False`, the auth plugin set on the server
+            will not be used. If `use_cipher` is `False`, the cipher
+            plugin set on the server will not be used. If a `timer` is
+            provided, the time spent in each stage is marked on it and
+            its `route` is set to the key of the handler called. `trace`
+            is the caller's `TraceSampler` decision for the message; if
+            it is `None`, the message is sampled here.
+        """
+        if trace is None:
+            trace = self.trace_sampler(self.logger)
+        if timer is None:
+            timer = NULL_TIMER # type: ignore
+        addr = self.address_of(writer)
+        if trace:
+            self.logger.debug("Received data from %s", addr)
+        peer = self._lookup_peer(writer, addr)
+        auth_plugin = None
+        cipher_plugin = None
+        cache_key: CacheKey | None = None
+        generation = 0
+        auth = self.auth_fields_class.decode(payload[:header.auth_length])
+        body = self.body_class.decode(payload[header.auth_length:])
+        request_id = auth.fields.get(self.request_id_field) \
+            if self.request_id_field is not None else None
 
         message = self.message_class(
             header=header,
             auth_data=auth,
             body=body
         )
-        self.logger.debug(
-            "Received message with checksum=%s from %s",
-            message.header.checksum, addr
-        )
+        if trace:
+            self.logger.debug(
+                "Received message with checksum=%s from %s",
+                message.header.checksum, addr
+            )
         response: MessageProtocol | None = None
 
         if not message.check():
-            self.logger.debug(
-                "Invalid message received from %s",
-                addr
-            )
+            if trace:
+                self.logger.debug(
+                    "Invalid message received from %s",
+                    addr
+                )
             response = self.make_error("invalid message")
         else:
+            timer.mark('decode')
+
             # outer auth
             if use_auth and self.auth_plugin is not None:
-                self.logger.debug("Calling self.auth_plugin.check on auth and body")
-                check = self.auth_plugin.check(
+                if trace:
+                    self.logger.debug("Calling self.auth_plugin.check on auth and body")
+                check = await call_plugin(self.auth_plugin, 'check',
                     message.auth_data, message.body, self, peer,
                     self.peer_plugin
                 )
@@ -355,27 +958,25 @@ class TCPServer:
                     self.logger.warning(
                         "Invalid auth_fields received from %s", addr
                     )
-                    response = self.handle_auth_error(
-                        self, self.auth_plugin, message
+                    # sent as-is, without plugins
+                    return self._echo_request_id(
+                        request_id,
+                        self.handle_auth_error(self, self.auth_plugin, message)
                     )
-                    if response is not None:
-                        await self.send(
-                            writer, response, use_auth=False, use_cipher=False
-                        )
-                        response = None # prevent double sending
-                    return
-                else:
+                elif trace:
                     self.logger.debug(
                         "Valid auth_fields received from %s", addr
                     )
+                timer.mark('outer_auth')
 
             # outer cipher
             if use_cipher and self.cipher_plugin is not None:
-                self.logger.debug(
-                    "Calling self.cipher_plugin.decrypt on message"
-                )
+                if trace:
+                    self.logger.debug(
+                        "Calling self.cipher_plugin.decrypt on message"
+                    )
                 try:
-                    message = self.cipher_plugin.decrypt(
+                    message = await call_plugin(self.cipher_plugin, 'decrypt',
                         message, self, peer, self.peer_plugin
                     )
                 except Exception as e:
@@ -383,28 +984,36 @@ class TCPServer:
                         "Error decrypting message; dropping",
                         exc_info=True
                     )
-                    return
+                    return None
+                timer.mark('outer_cipher')
 
-            keys = self.extract_keys(message, addr)
-            self.logger.debug(
-                "Message received from %s with keys=%s", addr, keys
-            )
+            keys = self._handler_keys(message, addr)
+            if trace:
+                self.logger.debug(
+                    "Message received from %s with keys=%s", addr, keys
+                )
 
             for key in keys:
                 if key in self.handlers or key in self.ephemeral_handlers:
-                    if key in self.ephemeral_handlers:
+                    ephemeral = key in self.ephemeral_handlers
+                    if ephemeral:
                         (
                             handler, auth_plugin, cipher_plugin
                         ) = self.ephemeral_handlers.pop(key)
+                        if key not in self.handlers:
+                            self.router.remove(key)
                     else:
                         handler, auth_plugin, cipher_plugin = self.handlers[key]
+                    timer.route = key
+                    timer.mark('routing')
 
                     # inner auth
                     if auth_plugin is not None:
-                        self.logger.debug(
-                            "Calling auth_plugin.check on auth and body"
-                        )
-                        check = auth_plugin.check(
+                        if trace:
+                            self.logger.debug(
+                                "Calling auth_plugin.check on auth and body"
+                            )
+                        check = await call_plugin(auth_plugin, 'check',
                             message.auth_data, message.body, self, peer,
                             self.peer_plugin
                         )
@@ -417,20 +1026,20 @@ class TCPServer:
                                 self, auth_plugin, message
                             )
                             if response is not None:
-                                await self.send(
-                                    writer, response, use_auth=False,
-                                    use_cipher=False
+                                # sent as-is, without plugins
+                                return self._echo_request_id(
+                                    request_id, response
                                 )
-                                response = None # prevent double sending
-                                break
+                        timer.mark('inner_auth')
 
                     # inner cipher
                     if cipher_plugin is not None:
-                        self.logger.debug(
-                            "Calling cipher_plugin.decrypt on message"
-                        )
+                        if trace:
+                            self.logger.debug(
+                                "Calling cipher_plugin.decrypt on message"
+                            )
                         try:
-                            message = cipher_plugin.decrypt(
+                            message = await call_plugin(cipher_plugin, 'decrypt',
                                 message, self, peer, self.peer_plugin
                             )
                         except Exception as e:
@@ -438,17 +1047,51 @@ class TCPServer:
                                 "Error decrypting message; dropping",
                                 exc_info=True
                             )
-                            return
+                            return None
+                        timer.mark('inner_cipher')
+
+                    cache = self.response_cache
+                    if cache is not None and not ephemeral and \
+                            request_id is None and not self._peer_specific(
+                                use_auth, use_cipher, auth_plugin,
+                                cipher_plugin
+                            ):
+                        cache_key = cache.key(message, key)
+                    if cache_key is not None:
+                        cached = cache.get(cache_key) # type: ignore
+                        timer.mark('cache')
+                        if cached is not None:
+                            return cached
+                        generation = cache.generation( # type: ignore
+                            message.body.uri
+                        )
 
-                    self.logger.debug("Calling handler for key=%s", key)
+                    if trace:
+                        self.logger.debug("Calling handler for key=%s", key)
                     tcp_handler = cast(Handler, handler)
-                    response_or_coro = tcp_handler(message, writer)
-                    if isinstance(response_or_coro, Coroutine):
-                        response_or_coro = await response_or_coro
+                    coalescer = self.request_coalescer
+                    coalesce_key = coalescer.key(message, key) \
+                        if coalescer is not None and not ephemeral else None
+                    if coalesce_key is not None:
+                        response_or_coro, shared = await coalescer.call( # type: ignore
+                            coalesce_key, lambda: tcp_handler(message, writer)
+                        )
+                        if shared and \
+                                isinstance(response_or_coro, MessageProtocol):
+                            # the plugins below modify the response
+                            response_or_coro = response_or_coro.copy()
+                    else:
+                        response_or_coro = tcp_handler(message, writer)
+                        if isinstance(response_or_coro, Coroutine):
+                            response_or_coro = await response_or_coro
                     response = response_or_coro if \
                         isinstance(response_or_coro, MessageProtocol) else None
+                    timer.mark('handler')
+                    if cache is not None:
+                        cache.invalidate_for(message, response)
                     break
             else:
+                timer.mark('routing')
                 self.logger.warning(
                     "No handler found for keys=%s, calling default handler",
                     keys
@@ -459,70 +1102,224 @@ class TCPServer:
                     default_response_or_coro = await default_response_or_coro
                 response = default_response_or_coro if \
                     isinstance(default_response_or_coro, MessageProtocol) else None
+                timer.mark('handler')
 
         if response is not None:
+            self._echo_request_id(request_id, response)
+
             # inner cipher
             if cipher_plugin is not None:
-                self.logger.debug(
-                    "Calling cipher_plugin.encrypt on response (handler)"
-                )
-                response = cipher_plugin.encrypt(
+                if trace:
+                    self.logger.debug(
+                        "Calling cipher_plugin.encrypt on response (handler)"
+                    )
+                response = await call_plugin(cipher_plugin, 'encrypt',
                     response, self, peer, self.peer_plugin
                 )
+                timer.mark('inner_cipher')
 
             # inner auth
             if auth_plugin is not None:
-                self.logger.debug(
-                    "Calling auth_plugin.make on response.body (handler)"
-                )
-                auth_plugin.make(
+                if trace:
+                    self.logger.debug(
+                        "Calling auth_plugin.make on response.body (handler)"
+                    )
+                await call_plugin(auth_plugin, 'make',
                     response.auth_data, response.body, self, peer,
                     self.peer_plugin
                 )
+                timer.mark('inner_auth')
 
             # outer cipher
             if use_cipher and self.cipher_plugin is not None:
-                self.logger.debug(
-                    "Calling cipher_plugin.encrypt on response"
-                )
-                response = self.cipher_plugin.encrypt(
+                if trace:
+                    self.logger.debug(
+                        "Calling cipher_plugin.encrypt on response"
+                    )
+                response = await call_plugin(self.cipher_plugin, 'encrypt',
                     response, self, peer, self.peer_plugin
                 )
+                timer.mark('outer_cipher')
 
             # outer auth
             if use_auth and self.auth_plugin is not None:
-                self.logger.debug(
-                    "Calling self.auth_plugin.make on response.body"
-                )
-                self.auth_plugin.make(
+                if trace:
+                    self.logger.debug(
+                        "Calling self.auth_plugin.make on response.body"
+                    )
+                await call_plugin(self.auth_plugin, 'make',
                     response.auth_data, response.body, self, peer,
                     self.peer_plugin
                 )
+                timer.mark('outer_auth')
 
-            await self.send(
-                writer, response, use_auth=False, use_cipher=False
+            if cache_key is not None:
+                self.response_cache.put( # type: ignore
+                    cache_key, response, generation
+                )
+
+        return response
+
+    def _peer_specific(
+            self, use_auth: bool, use_cipher: bool,
+            auth_plugin: AuthPluginProtocol | None,
+            cipher_plugin: CipherPluginProtocol | None
+        ) -> bool:
+        """Return whether any plugin applied to a message with these
+            arguments makes it specific to its peer.
+        """
+        return any(
+            plugin is not None and plugin.is_peer_specific()
+            for plugin in (
+                self.auth_plugin if use_auth else None,
+                self.cipher_plugin if use_cipher else None,
+                auth_plugin, cipher_plugin,
             )
+        )
 
-    async def start(self, *, use_auth: bool = True, use_cipher: bool = True):
-        """Start the server."""
-        self.server: asyncio.Server = await asyncio.start_server(
-            lambda r, w: self.handle_client(
-                r, w, use_auth=use_auth, use_cipher=use_cipher
-            ),
-            self.interface, self.port
+    def _echo_request_id(
+            self, request_id: bytes | None, response: MessageProtocol | None
+        ) -> MessageProtocol | None:
+        """Set the `request_id_field` of the response to the request ID
+            of the message it responds to, or remove a stale one if that
+            message had none. Returns the response.
+        """
+        if response is not None and self.request_id_field is not None:
+            if request_id is None:
+                response.auth_data.fields.pop(self.request_id_field, None)
+            else:
+                response.auth_data.fields[self.request_id_field] = request_id
+        return response
+
+    def _stats_handler(
+            self, message: MessageProtocol, _: Any
+        ) -> MessageProtocol:
+        """Respond to a request for the stats URI with the serialized
+            metrics snapshot.
+        """
+        return make_respond_uri_msg(
+            packify.pack(self.metrics.snapshot()), # type: ignore
+            message.body.uri, message_class=self.message_class,
+            message_type_class=self.message_type_class,
+            body_class=self.body_class,
         )
-        self.logger.info(f"Server started on {self.interface}:{self.port}")
+
+    def _send_ping(
+            self, writer: asyncio.StreamWriter | FrameProtocol
+        ) -> Coroutine[Any, Any, None]:
+        """Send a keepalive `PING` to a silent client."""
+        return self.send(writer, make_ping_msg( # type: ignore
+            message_class=self.message_class,
+            message_type_class=self.message_type_class,
+            body_class=self.body_class,
+        ))
+
+    def _close_idle(self, writer: asyncio.StreamWriter | FrameProtocol):
+        """Abort the connection of a client that timed out, discarding
+            anything still buffered for it.
+        """
+        if writer.transport is not None:
+            writer.transport.abort()
+
+    def _ping_handler(
+            self, message: MessageProtocol, _: Any
+        ) -> MessageProtocol:
+        """Answer a keepalive `PING` with a `PONG`."""
+        return make_pong_msg(
+            message, message_class=self.message_class,
+            message_type_class=self.message_type_class,
+            body_class=self.body_class,
+        )
+
+    def _pong_handler(
+            self, message: MessageProtocol,
+            writer: asyncio.StreamWriter | FrameProtocol
+        ) -> None:
+        """Record the round-trip time from a keepalive `PONG`."""
+        self.keepalive.pong(writer, message.body.content) # type: ignore
+
+    async def start(
+            self, *, use_auth: bool = True, use_cipher: bool = True,
+            reuse_port: bool = False
+        ):
+        """Start the server. If `reuse_port` is `True`, the listening
+            socket is bound with `SO_REUSEPORT`, so several processes
+            can serve the same port (see `WorkerPool`). Raises
+            `ValueError` if `reuse_port` is `True` for a server with a
+            Unix domain socket `path`.
+        """
+        if self.path is not None and reuse_port:
+            raise ValueError("reuse_port cannot be used with a Unix socket")
+        loop = asyncio.get_running_loop()
+        if self.compact_connections or self.use_buffered_protocol:
+            if self.compact_connections:
+                factory = lambda: Connection(
+                    self, use_auth=use_auth, use_cipher=use_cipher,
+                    buffer_size=self.connection_buffer_size,
+                )
+            else:
+                factory = lambda: FrameProtocol(
+                    self.header_class, self.message_type_class,
+                    client_connected_cb=lambda p: self.handle_client(
+                        p, p, use_auth=use_auth, use_cipher=use_cipher
+                    ),
+                )
+            if self.path is not None:
+                self.server: asyncio.Server = await loop.create_unix_server(
+                    factory, self.path
+                )
+            else:
+                self.server = await loop.create_server(
+                    factory, self.interface, self.port,
+                    reuse_port=reuse_port or None
+                )
+        else:
+            client_connected_cb = lambda r, w: self.handle_client(
+                r, w, use_auth=use_auth, use_cipher=use_cipher
+            )
+            if self.path is not None:
+                self.server = await asyncio.start_unix_server(
+                    client_connected_cb, self.path
+                )
+            else:
+                self.server = await asyncio.start_server(
+                    client_connected_cb, self.interface, self.port,
+                    reuse_port=reuse_port or None
+                )
+        if self.path is not None:
+            self.logger.info(f"Server started on {self.path}")
+        else:
+            self.logger.info(f"Server started on {self.interface}:{self.port}")
+        if self.watchdog is not None:
+            self.watchdog.start_lag_monitor()
+        if self.keepalive is not None:
+            self.keepalive.start()
         try:
             await self.server.serve_forever()
             self.logger.info("serve_forever() exited normally")
         except asyncio.CancelledError:
             self.logger.info("serve_forever() received CancelledError")
             raise
+        finally:
+            self._remove_socket_file()
 
     async def stop(self):
         """Stops the server."""
+        if self.watchdog is not None:
+            self.watchdog.stop_lag_monitor()
+        if self.keepalive is not None:
+            self.keepalive.stop()
         self.server.close()
         await self.server.wait_closed()
+        self._remove_socket_file()
+
+    def _remove_socket_file(self):
+        """Remove the Unix domain socket file, if the server has one."""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
 
     def prepare_message(
             self, message: MessageProtocol, *,
@@ -530,13 +1327,18 @@ class TCPServer:
             auth_plugin: AuthPluginProtocol|None = None,
             cipher_plugin: CipherPluginProtocol|None = None,
             peer: Peer|None = None,
+            trace: bool|None = None,
         ) -> MessageProtocol|None:
         """Prepares a message for transmission by invoking all necessary
-            plugins.
+            plugins. `trace` is the caller's `TraceSampler` decision for
+            the message; if it is `None`, the message is sampled here.
         """
+        if trace is None:
+            trace = self.trace_sampler(self.logger)
         # inner cipher
         if cipher_plugin is not None:
-            self.logger.debug("Calling cipher_plugin.encrypt on message")
+            if trace:
+                self.logger.debug("Calling cipher_plugin.encrypt on message")
             try:
                 message = cipher_plugin.encrypt(
                     message, self, peer, self.peer_plugin
@@ -549,7 +1351,8 @@ class TCPServer:
 
         # inner auth
         if auth_plugin is not None:
-            self.logger.debug("Calling auth_plugin.make on auth_data and body")
+            if trace:
+                self.logger.debug("Calling auth_plugin.make on auth_data and body")
             try:
                 auth_plugin.make(
                     message.auth_data, message.body, self, peer,
@@ -563,7 +1366,8 @@ class TCPServer:
 
         # outer cipher
         if use_cipher and self.cipher_plugin is not None:
-            self.logger.debug("Calling self.cipher_plugin.encrypt on message")
+            if trace:
+                self.logger.debug("Calling self.cipher_plugin.encrypt on message")
             try:
                 message = self.cipher_plugin.encrypt(
                     message, self, peer, self.peer_plugin
@@ -576,9 +1380,10 @@ class TCPServer:
 
         # outer auth
         if use_auth and self.auth_plugin is not None:
-            self.logger.debug(
-                "Calling self.auth_plugin.make on auth_data and body"
-            )
+            if trace:
+                self.logger.debug(
+                    "Calling self.auth_plugin.make on auth_data and body"
+                )
             try:
                 self.auth_plugin.make(
                     message.auth_data, message.body, self, peer,
@@ -592,12 +1397,38 @@ class TCPServer:
 
         return message
 
+    async def _prepare_message_offloaded(
+            self, message: MessageProtocol, *,
+            use_auth: bool = True, use_cipher: bool = True,
+            auth_plugin: AuthPluginProtocol|None = None,
+            cipher_plugin: CipherPluginProtocol|None = None,
+            peer: Peer|None = None,
+            trace: bool|None = None,
+        ) -> MessageProtocol|None:
+        """Call `prepare_message` in the `Offloader` of the first
+            `OffloadedPlugin` it would use, or directly if it uses none.
+        """
+        offloader = plugin_offloader(
+            cipher_plugin, auth_plugin,
+            self.cipher_plugin if use_cipher else None,
+            self.auth_plugin if use_auth else None,
+        )
+        prepare = partial(
+            self.prepare_message, message, use_auth=use_auth,
+            use_cipher=use_cipher, auth_plugin=auth_plugin,
+            cipher_plugin=cipher_plugin, peer=peer, trace=trace,
+        )
+        if offloader is None:
+            return prepare()
+        return await offloader.run(prepare)
+
     async def send(
             self, client: asyncio.StreamWriter, message: MessageProtocol, *,
             collection: set[asyncio.StreamWriter] | None = None,
             use_auth: bool = True, use_cipher: bool = True,
             auth_plugin: AuthPluginProtocol|None = None,
-            cipher_plugin: CipherPluginProtocol|None = None
+            cipher_plugin: CipherPluginProtocol|None = None,
+            trace: bool|None = None
         ):
         """Helper coroutine to send a message to a client. On error, it
             logs the exception and removes the client from the given
@@ -608,22 +1439,35 @@ class TCPServer:
             cipher plugin that is set on the server. If `use_auth` is
             `False`, the auth plugin set on the server will not be used.
             If `use_cipher` is `False`, the cipher plugin set on the
-            server will not be used.
+            server will not be used. `trace` is the caller's
+            `TraceSampler` decision for the message; if it is `None`,
+            the message is sampled here.
         """
-        addr = client.get_extra_info("peername")
-        peer_id = self.peer_addrs.get(addr, None)
-        peer = self.peers.get(peer_id) if peer_id is not None else None
-        prepared_msg: MessageProtocol | None = self.prepare_message(
-            message, use_auth=use_auth, use_cipher=use_cipher,
-            auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
-            peer=peer,
-        )
+        if trace is None:
+            trace = self.trace_sampler(self.logger)
+        addr = self.address_of(client)
+        peer = self._lookup_peer(client, addr)
+        prepared_msg: MessageProtocol | None = \
+            await self._prepare_message_offloaded(
+                message, use_auth=use_auth, use_cipher=use_cipher,
+                auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                peer=peer, trace=trace,
+            )
         if not prepared_msg:
             return
 
+        queue = self.outbound.get(client)
+        if queue is not None:
+            self._enqueue(client, queue, prepared_msg, collection)
+            return
+
         try:
-            self.logger.debug("Sending message to %s", addr)
-            client.write(prepared_msg.encode())
+            if trace:
+                self.logger.debug("Sending message to %s", addr)
+            data = prepared_msg.encode()
+            client.write(data)
+            if self.metrics is not None:
+                self.metrics.sent(len(data))
             await client.drain()
         except Exception as e:
             self.logger.error("Error sending to client:", exc_info=True)
@@ -631,26 +1475,259 @@ class TCPServer:
                 self.logger.info("Removing client %s from collection", addr)
                 collection.discard(client)
 
+    def send_nowait(
+            self, client: asyncio.StreamWriter | FrameProtocol,
+            message: MessageProtocol, *,
+            collection: set[asyncio.StreamWriter] | None = None,
+            use_auth: bool = True, use_cipher: bool = True,
+            auth_plugin: AuthPluginProtocol|None = None,
+            cipher_plugin: CipherPluginProtocol|None = None,
+            key: Hashable | None = None,
+            trace: bool|None = None
+        ) -> bool:
+        """Prepare a message and put it in the client's outbound queue
+            without awaiting. Returns `True` if it was queued. If the
+            client has no open outbound queue, the message is dropped,
+            the client is removed from the given collection, and `False`
+            is returned. `key` is the conflation key for the slow
+            consumer policy. Plugins and `trace` are used as in `send`.
+        """
+        queue = self.outbound.get(client)
+        if queue is None:
+            self.logger.debug("No outbound queue for client; dropping message")
+            if collection is not None:
+                collection.discard(client)
+            return False
+        addr = self.address_of(client)
+        peer = self._lookup_peer(client, addr)
+        prepared_msg: MessageProtocol | None = self.prepare_message(
+            message, use_auth=use_auth, use_cipher=use_cipher,
+            auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+            peer=peer, trace=trace,
+        )
+        if not prepared_msg:
+            return False
+        return self._enqueue(client, queue, prepared_msg, collection, key)
+
+    def _enqueue(
+            self, client: asyncio.StreamWriter | FrameProtocol,
+            queue: OutboundQueue, message: MessageProtocol,
+            collection: set[asyncio.StreamWriter] | None,
+            key: Hashable | None = None
+        ) -> bool:
+        """Put a prepared message in an outbound queue. If the queue
+            is closed, removes the client from the collection.
+        """
+        data = message.encode()
+        if queue.put(data, key):
+            if self.metrics is not None:
+                self.metrics.sent(len(data))
+            return True
+        if queue.closed:
+            self.logger.debug("Outbound queue closed; dropping message")
+            if collection is not None:
+                collection.discard(client) # type: ignore
+        return False
+
+    async def send_frame(
+            self, clients: Iterable[asyncio.StreamWriter | FrameProtocol],
+            data: bytes, *,
+            collection: set[asyncio.StreamWriter] | None = None,
+            key: Hashable | None = None
+        ):
+        """Send an encoded frame to every client, passing the same
+            `bytes` object to each client's `write` (or outbound queue,
+            with `key` as the conflation key), then wait for the clients
+            with unsent data to drain. No per-client message work is
+            done, so the frame must already be prepared with any
+            plugins. Clients that are closing or fail are removed from
+            the given collection.
+        """
+        draining = self._write_frames(
+            ((client, data) for client in clients), collection, key
+        )
+        if draining:
+            await self._drain_clients(draining, collection)
+
+    def _write_frames(
+            self, frames: Iterable[
+                tuple[asyncio.StreamWriter | FrameProtocol, bytes]
+            ],
+            collection: set[asyncio.StreamWriter] | None,
+            key: Hashable | None = None
+        ) -> list[asyncio.StreamWriter | FrameProtocol]:
+        """Write each frame to its client or put it in the client's
+            outbound queue, without awaiting. Clients that are closing
+            or fail are removed from the collection once every frame is
+            written. Returns the clients with unsent data to drain.
+        """
+        outbound = self.outbound
+        use_queues = self.use_outbound_queues
+        draining = []
+        failed = []
+        sent = 0
+        size = 0
+        for client, data in frames:
+            if use_queues:
+                queue = outbound.get(client)
+                if queue is not None and queue.put(data, key):
+                    sent += 1
+                    size += len(data)
+                elif queue is None or queue.closed:
+                    failed.append(client)
+                continue
+            if client.is_closing():
+                failed.append(client)
+                continue
+            try:
+                client.write(data)
+            except Exception as e:
+                self.logger.error("Error sending to client:", exc_info=True)
+                failed.append(client)
+                continue
+            sent += 1
+            size += len(data)
+            if client.transport.get_write_buffer_size(): # type: ignore
+                draining.append(client)
+
+        if self.metrics is not None and sent:
+            self.metrics.sent(size, sent)
+        if collection is not None:
+            for client in failed:
+                collection.discard(client) # type: ignore
+        return draining
+
+    async def _drain_clients(
+            self, clients: list[asyncio.StreamWriter | FrameProtocol],
+            collection: set[asyncio.StreamWriter] | None
+        ):
+        """Wait for the clients to drain, removing those that fail from
+            the collection.
+        """
+        results = await asyncio.gather(
+            *[client.drain() for client in clients], return_exceptions=True
+        )
+        if collection is not None:
+            for client, result in zip(clients, results):
+                if isinstance(result, Exception):
+                    collection.discard(client) # type: ignore
+
+    async def _send_per_peer(
+            self, clients: Iterable[asyncio.StreamWriter | FrameProtocol],
+            message: MessageProtocol, *,
+            use_auth: bool, use_cipher: bool,
+            auth_plugin: AuthPluginProtocol | None,
+            cipher_plugin: CipherPluginProtocol | None,
+            key: Hashable | None = None, trace: bool = False
+        ):
+        """Prepare a copy of the message for the peer of each client in
+            batches of `peer_batch_size` clients run in `peer_offloader`,
+            writing each batch's frames as soon as the batch is ready.
+        """
+        message.encode()
+        targets = [
+            (client, self._lookup_peer(client, self.address_of(client)))
+            for client in clients
+        ]
+        size = self.peer_batch_size
+        prepare = partial(
+            self._prepare_frames, message, use_auth=use_auth,
+            use_cipher=use_cipher, auth_plugin=auth_plugin,
+            cipher_plugin=cipher_plugin, trace=trace,
+        )
+        batches = [
+            asyncio.ensure_future(self.peer_offloader.run( # type: ignore
+                prepare, targets[i:i+size]
+            ))
+            for i in range(0, len(targets), size)
+        ]
+        draining = []
+        for batch in asyncio.as_completed(batches):
+            try:
+                frames = await batch
+            except Exception as e:
+                self.logger.error(
+                    "Error preparing messages for peers:", exc_info=True
+                )
+                continue
+            draining.extend(self._write_frames(frames, self.clients, key))
+        if draining:
+            await self._drain_clients(draining, self.clients)
+
+    def _prepare_frames(
+            self, message: MessageProtocol,
+            targets: list[tuple[asyncio.StreamWriter | FrameProtocol, Peer | None]],
+            *, use_auth: bool, use_cipher: bool,
+            auth_plugin: AuthPluginProtocol | None,
+            cipher_plugin: CipherPluginProtocol | None, trace: bool = False
+        ) -> list[tuple[asyncio.StreamWriter | FrameProtocol, bytes]]:
+        """Prepare and encode a copy of the message for each client's
+            peer. Runs in a `peer_offloader` thread.
+        """
+        frames = []
+        for client, peer in targets:
+            prepared_msg = self.prepare_message(
+                message.copy(), use_auth=use_auth, use_cipher=use_cipher,
+                auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                peer=peer, trace=trace,
+            )
+            if prepared_msg is not None:
+                frames.append((client, prepared_msg.encode()))
+        return frames
+
+    def _warn_if_plugins_not_forwarded(
+            self, auth_plugin: AuthPluginProtocol | None,
+            cipher_plugin: CipherPluginProtocol | None
+        ):
+        """Log a warning that per-call plugins of a peer-specific
+            `notify` or `broadcast` are not applied by other workers.
+        """
+        if auth_plugin is not None or cipher_plugin is not None:
+            self.logger.warning(
+                "auth_plugin and cipher_plugin are not forwarded to other "
+                "workers; they only apply the server plugins"
+            )
+
+    def set_slow_consumer_policy(
+            self, client: asyncio.StreamWriter | FrameProtocol,
+            policy: SlowConsumerPolicy | None
+        ):
+        """Replace the slow consumer policy of one client's outbound
+            queue. Raises `KeyError` if the client has no outbound queue.
+        """
+        self.outbound[client].policy = policy
+
     async def broadcast(
             self, message: MessageProtocol, *,
             use_auth: bool = True, use_cipher: bool = True,
             auth_plugin: AuthPluginProtocol|None = None,
-            cipher_plugin: CipherPluginProtocol|None = None
+            cipher_plugin: CipherPluginProtocol|None = None,
+            forward: bool = True
         ):
         """Send the message to all connected clients concurrently using
-            `asyncio.gather`. If an auth plugin is provided, it will be
-            used to authorize the message in addition to any auth plugin
-            that is set on the server. If a cipher plugin is provided,
-            it will be used to encrypt the message in addition to any
-            cipher plugin that is set on the server. If `use_auth` is
+            `asyncio.gather`, or by putting it in each client's outbound
+            queue if `use_outbound_queues` is set. Unless a plugin is
+            peer-specific, the message is prepared and encoded once and
+            the frame is written to every client with `send_frame`. If
+            an auth plugin is provided, it will be used to authorize the
+            message in addition to any auth plugin that is set on the
+            server. If a cipher plugin is provided, it will be used to
+            encrypt the message in addition to any cipher plugin that is
+            set on the server. If `use_auth` is
             `False`, the auth plugin set on the server will not be used.
             If `use_cipher` is `False`, the cipher plugin set on the
-            server will not be used.
+            server will not be used. If the server is sharded with a
+            `WorkerBus`, the message is also forwarded to the other
+            workers unless `forward` is `False`.
         """
-        if len(self.clients) == 0:
-            self.logger.debug("Skipping broadcast -- no clients")
+        trace = self.trace_sampler(self.logger)
+        forward = forward and self.bus is not None
+        if len(self.clients) == 0 and not forward:
+            if trace:
+                self.logger.debug("Skipping broadcast -- no clients")
             return
-        self.logger.debug("Broadcasting message to all clients")
+        if trace:
+            self.logger.debug("Broadcasting message to all clients")
 
         # check if any plugin is peer-specific
         peer_specific = False
@@ -664,65 +1741,92 @@ class TCPServer:
             peer_specific = True
 
         if peer_specific:
+            if forward:
+                self._warn_if_plugins_not_forwarded(auth_plugin, cipher_plugin)
+                self.bus.broadcast( # type: ignore
+                    message, prepared=False,
+                    use_auth=use_auth, use_cipher=use_cipher
+                )
             # for peer-specific plugins, send unique message to each client
+            if self.peer_offloader is not None:
+                await self._send_per_peer(
+                    list(self.clients), message,
+                    use_auth=use_auth, use_cipher=use_cipher,
+                    auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                    trace=trace
+                )
+                return
+            if self.use_outbound_queues:
+                for client in list(self.clients):
+                    self.send_nowait(
+                        client, message.copy(), collection=self.clients,
+                        use_auth=use_auth, use_cipher=use_cipher,
+                        auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                        trace=trace
+                    )
+                return
             tasks = [
                 self.send(
                     client, message.copy(), collection=self.clients,
                     use_auth=use_auth, use_cipher=use_cipher,
-                    auth_plugin=auth_plugin, cipher_plugin=cipher_plugin
+                    auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                    trace=trace
                 )
                 for client in self.clients
             ]
+            await asyncio.gather(*tasks, return_exceptions=True)
         else:
             # optimize for non-peer-specific plugins by doing all calculations once
-            message = self.prepare_message(
+            message = await self._prepare_message_offloaded(
                 message, use_auth=use_auth, use_cipher=use_cipher,
                 auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                trace=trace,
             ) # type: ignore
             if not message:
                 return
-            # create coroutines
-            tasks = [
-                self.send(
-                    client, message, collection=self.clients,
-                    use_auth=False, use_cipher=False,
-                )
-                for client in self.clients
-            ]
-        await asyncio.gather(*tasks, return_exceptions=True)
+            if forward:
+                self.bus.broadcast(message, prepared=True) # type: ignore
+            await self.send_frame(
+                self.clients, message.encode(), collection=self.clients
+            )
 
     async def notify(
             self, key: Hashable, message: MessageProtocol, *,
             use_auth: bool = True,  use_cipher: bool = True,
             auth_plugin: AuthPluginProtocol|None = None,
-            cipher_plugin: CipherPluginProtocol|None = None
+            cipher_plugin: CipherPluginProtocol|None = None,
+            forward: bool = True
         ):
         """Send the message to all subscribed clients for the given key
-            concurrently using `asyncio.gather`. If an auth plugin is
+            concurrently using `asyncio.gather`, or by putting it in each
+            client's outbound queue if `use_outbound_queues` is set.
+            Unless a plugin is peer-specific, the message is prepared
+            and encoded once and the frame is written to every
+            subscriber with `send_frame`. If an auth plugin is
             provided, it will be used to authorize the message in
             addition to any auth plugin that is set on the server. If a
             cipher plugin is provided, it will be used to encrypt the
             message in addition to any cipher plugin that is set on
             the server. If `use_auth` is `False`, the auth plugin set on
             the server will not be used. If `use_cipher` is `False`, the
-            cipher plugin set on the server will not be used.
+            cipher plugin set on the server will not be used. If the
+            server is sharded with a `WorkerBus`, the message is also
+            forwarded to the other workers with subscribers for the key
+            unless `forward` is `False`.
         """
-        if key not in self.subscriptions:
-            self.logger.debug(
-                "No subscribers found for key=%s, skipping notification", key
-            )
-            return
-
-        subscribers = self.subscriptions.get(key, set())
-        if not subscribers:
-            self.logger.debug(
-                "No subscribers found for key=%s, removing from subscriptions",
-                key
-            )
-            del self.subscriptions[key]
+        trace = self.trace_sampler(self.logger)
+        subscribers = self.get_subscribers(key)
+        forward = forward and self.bus is not None and \
+            self.bus.has_subscribers(key)
+        if not subscribers and not forward:
+            if trace:
+                self.logger.debug(
+                    "No subscribers found for key=%s, skipping notification", key
+                )
             return
 
-        self.logger.debug("Notifying %d clients for key=%s", len(subscribers), key)
+        if trace:
+            self.logger.debug("Notifying %d clients for key=%s", len(subscribers), key)
 
         # check if any plugin is peer-specific
         peer_specific = False
@@ -736,35 +1840,57 @@ class TCPServer:
             peer_specific = True
 
         if peer_specific:
+            if forward:
+                self._warn_if_plugins_not_forwarded(auth_plugin, cipher_plugin)
+                self.bus.notify( # type: ignore
+                    key, message, prepared=False,
+                    use_auth=use_auth, use_cipher=use_cipher
+                )
             # for peer-specific plugins, send unique message to each client
-            tasks = [
-                self.send(
-                    client, message.copy(), collection=self.clients,
+            if self.peer_offloader is not None:
+                await self._send_per_peer(
+                    list(subscribers), message,
                     use_auth=use_auth, use_cipher=use_cipher,
-                    auth_plugin=auth_plugin, cipher_plugin=cipher_plugin
+                    auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                    key=key, trace=trace
                 )
-                for client in subscribers
-            ]
+            elif self.use_outbound_queues:
+                for client in list(subscribers):
+                    self.send_nowait(
+                        client, message.copy(), collection=self.clients,
+                        use_auth=use_auth, use_cipher=use_cipher,
+                        auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                        key=key, trace=trace
+                    )
+            else:
+                tasks = [
+                    self.send(
+                        client, message.copy(), collection=self.clients,
+                        use_auth=use_auth, use_cipher=use_cipher,
+                        auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                        trace=trace
+                    )
+                    for client in subscribers
+                ]
+                await asyncio.gather(*tasks, return_exceptions=True)
         else:
             # optimize for non-peer-specific plugins by doing all calculations once
-            prepared_msg = self.prepare_message(
+            prepared_msg = await self._prepare_message_offloaded(
                 message, use_auth=use_auth, use_cipher=use_cipher,
                 auth_plugin=auth_plugin, cipher_plugin=cipher_plugin,
+                trace=trace,
             )
             if not prepared_msg:
                 return
-            # create coroutines
-            tasks = [
-                self.send(
-                    client, prepared_msg, collection=self.clients,
-                    use_auth=False, use_cipher=False,
-                )
-                for client in subscribers
-            ]
-
-        await asyncio.gather(*tasks, return_exceptions=True)
+            if forward:
+                self.bus.notify(key, prepared_msg, prepared=True) # type: ignore
+            await self.send_frame(
+                subscribers, prepared_msg.encode(), collection=self.clients,
+                key=key
+            )
 
-        self.logger.debug("Notified %d clients for key=%s", len(subscribers), key)
+        if trace:
+            self.logger.debug("Notified %d clients for key=%s", len(subscribers), key)
 
     def add_or_update_peer(
             self, peer_id: bytes, peer_data: bytes, addr: tuple[str, int]
@@ -774,23 +1900,29 @@ class TCPServer:
             `True` if a `PEER_DISCOVERED` message should be sent (`False`
             if it is the local peer).
         """
+        # not a per-message path, so no sample tick is spent on it
+        trace = self.logger.isEnabledFor(logging.DEBUG)
         if self.local_peer is not None and peer_id == self.local_peer.id:
-            self.logger.debug("Ignoring local peer.")
+            if trace:
+                self.logger.debug("Ignoring local peer.")
             return False
         if peer_id in self.peers:
-            self.logger.debug(
-                "Updating peer 0x%s at %s with data %s",
-                peer_id.hex(), addr, peer_data.hex()
-            )
+            if trace:
+                self.logger.debug(
+                    "Updating peer 0x%s at %s with data %s",
+                    peer_id.hex(), addr, peer_data.hex()
+                )
             self.peers[peer_id].update(peer_data)
             self.peers[peer_id].addrs.add(addr)
         else:
-            self.logger.debug(
-                "Adding peer 0x%s at %s with data %s",
-                peer_id.hex(), addr, peer_data.hex()
-            )
+            if trace:
+                self.logger.debug(
+                    "Adding peer 0x%s at %s with data %s",
+                    peer_id.hex(), addr, peer_data.hex()
+                )
             self.peers[peer_id] = Peer({addr}, peer_id, peer_data)
         self.peer_addrs[addr] = peer_id
+        self._peers_version += 1
         return True
 
     def get_peer(
@@ -811,21 +1943,21 @@ class TCPServer:
 
     def remove_peer(self, writer: asyncio.StreamWriter, peer_id: bytes):
         """Remove a peer from the peer list and all related subscriptions."""
-        addr = writer.get_extra_info("peername")
+        addr = self.address_of(writer)
         self.logger.debug(
             "Removing peer 0x%s at %s from peer list", peer_id.hex(), addr
         )
         if peer_id in self.peers:
             peer = self.peers[peer_id]
             del self.peers[peer_id]
-            for addr in peer.addrs:
-                if addr in self.subscriptions:
-                    del self.subscriptions[addr]
+            for peer_addr in peer.addrs:
+                self._remove_subscription_key(peer_addr)
+            if self.admission is not None:
+                self.admission.forget_peer(peer_id)
         if addr in self.peer_addrs:
             del self.peer_addrs[addr]
-        for key in self.subscriptions:
-            if writer in self.subscriptions[key]:
-                self.subscriptions[key].remove(writer)
+        self._peers_version += 1
+        self.unsubscribe_all(writer)
 
     async def manage_peers_automatically(
             self, app_id: bytes = b'netaio', *,
@@ -864,7 +1996,7 @@ class TCPServer:
         def handle_advertise_peer(
                 message: MessageProtocol, writer: asyncio.StreamWriter
             ):
-            addr = writer.get_extra_info("peername")
+            addr = self.address_of(writer)
             self.logger.debug("Received ADVERTISE_PEER message from %s", addr)
 
             if app_id != message.body.uri:
@@ -914,7 +2046,7 @@ class TCPServer:
         def handle_peer_discovered(
                 message: MessageProtocol, writer: asyncio.StreamWriter
             ):
-            addr = writer.get_extra_info("peername")
+            addr = self.address_of(writer)
             self.logger.debug("Received PEER_DISCOVERED message from %s", addr)
 
             if app_id != message.body.uri:
@@ -948,7 +2080,7 @@ class TCPServer:
             auth_plugin=auth_plugin, cipher_plugin=cipher_plugin
         )
         def handle_disconnect(message: MessageProtocol, writer: asyncio.StreamWriter):
-            addr = writer.get_extra_info("peername")
+            addr = self.address_of(writer)
             self.logger.debug("Received DISCONNECT message from %s", addr)
 
             if app_id != message.body.uri:
@@ -0,0 +1,34 @@
+from __future__ import annotations
+import logging
+
+
+class TraceSampler:
+    """Decides whether the debug logging on the hot path (receiving,
+        preparing, and sending messages) runs for a message. Call it
+        once per message with the logger and guard the `debug` calls
+        for that message with the result: when `DEBUG` is disabled,
+        this costs one cached `isEnabledFor` check instead of a call
+        (and possibly eager formatting) per log line. When it is
+        enabled, only one in every `every` messages is traced.
+    """
+    __slots__ = ('every', '_countdown')
+    every: int
+
+    def __init__(self, every: int = 1):
+        """Initialize the sampler. Raises `ValueError` if `every` is
+            less than 1.
+        """
+        if every < 1:
+            raise ValueError('every must be at least 1')
+        self.every = every
+        self._countdown = 1
+
+    def __call__(self, logger: logging.Logger) -> bool:
+        """Return `True` if debug logging for this message should run."""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return False
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self.every
+        return True
@@ -0,0 +1,298 @@
+from __future__ import annotations
+from .common import HeaderProtocol
+from collections import deque
+from enum import IntEnum
+from typing import Any, Callable, Coroutine, Iterable
+import asyncio
+
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    """Frame-parsing `asyncio.BufferedProtocol` used as an alternative
+        to `StreamReader`/`StreamWriter` pairs by `TCPServer` and
+        `TCPClient` when they are created with
+        `use_buffered_protocol=True`. The socket is read directly into
+        a reusable `bytearray`, and every complete frame available
+        after a read is parsed and queued at once, so reading a queued
+        frame does not suspend. Reading pauses while more than
+        `max_queued_frames` frames are waiting.
+
+        The protocol also implements the subset of the `StreamWriter`
+        interface used by netaio (`write`, `writelines`, `drain`,
+        `get_extra_info`, `close`, `is_closing`, `wait_closed`), so it
+        is passed to handlers and stored in `clients` and
+        `subscriptions` in place of a `StreamWriter`.
+    """
+    __slots__ = (
+        'header_class', 'message_type_class', 'max_queued_frames',
+        'transport', 'frames', '_client_connected_cb', '_task',
+        '_header_length', '_buffer', '_start', '_end', '_pending_header',
+        '_frame_length', '_eof', '_error', '_reading_paused',
+        '_writing_paused', '_connection_lost', '_read_waiter',
+        '_drain_waiters', '_loop', '_closed',
+    )
+    header_class: type[HeaderProtocol]
+    message_type_class: type[IntEnum]
+    max_queued_frames: int
+    transport: asyncio.Transport | None
+    frames: deque[tuple[HeaderProtocol, memoryview]]
+
+    def __init__(
+            self, header_class: type[HeaderProtocol],
+            message_type_class: type[IntEnum], *,
+            client_connected_cb: Callable[
+                [FrameProtocol], Coroutine[Any, Any, Any] | None
+            ] | None = None,
+            buffer_size: int = 2**16,
+            max_queued_frames: int = 64,
+        ):
+        """Initialize the protocol. `header_class` and
+            `message_type_class` are used to parse frame headers.
+            `client_connected_cb` is called with the protocol when the
+            connection is made; if it returns a coroutine, it is run as
+            a task. `buffer_size` is the initial size of the receive
+            buffer, which grows to fit larger frames.
+        """
+        self.header_class = header_class
+        self.message_type_class = message_type_class
+        self.max_queued_frames = max_queued_frames
+        self.transport = None
+        self.frames = deque()
+        self._client_connected_cb = client_connected_cb
+        self._task: asyncio.Task | None = None
+        self._header_length = header_class.header_length()
+        self._buffer = bytearray(buffer_size)
+        self._start = 0
+        self._end = 0
+        self._pending_header: HeaderProtocol | None = None
+        self._frame_length = self._header_length
+        self._eof = False
+        self._error: BaseException | None = None
+        self._reading_paused = False
+        self._writing_paused = False
+        self._connection_lost = False
+        self._read_waiter: asyncio.Future | None = None
+        # created on first use, since most connections never need them
+        self._drain_waiters: deque[asyncio.Future] | None = None
+        self._loop = asyncio.get_running_loop()
+        self._closed: asyncio.Future | None = None
+
+    # asyncio protocol callbacks
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        """Store the transport and run the `client_connected_cb`."""
+        self.transport = transport # type: ignore
+        if self._client_connected_cb is not None:
+            result = self._client_connected_cb(self)
+            if asyncio.iscoroutine(result):
+                self._task = self._loop.create_task(result)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        """Return the free tail of the receive buffer, first moving any
+            unparsed bytes to the front or growing the buffer if the
+            pending frame would not fit.
+        """
+        pending = self._end - self._start
+        needed = max(self._frame_length, pending + 1)
+        size = len(self._buffer)
+        if needed > size:
+            buffer = bytearray(needed)
+            buffer[:pending] = self._buffer[self._start:self._end]
+            self._buffer = buffer
+            self._start, self._end = 0, pending
+        elif self._start and (
+            self._start + needed > size or size - self._end < size // 4
+        ):
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start, self._end = 0, pending
+        return memoryview(self._buffer)[self._end:]
+
+    def buffer_updated(self, nbytes: int):
+        """Parse and queue every complete frame in the buffer."""
+        self._end += nbytes
+        queued = len(self.frames)
+        try:
+            self._parse_frames()
+        except Exception as e:
+            self._error = e
+            if self.transport is not None:
+                self.transport.close()
+        if len(self.frames) != queued or self._error is not None:
+            self._wake_reader()
+        if len(self.frames) >= self.max_queued_frames and \
+                not self._reading_paused and self.transport is not None:
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+    def eof_received(self) -> bool:
+        """Mark the end of the stream. The transport is kept open so
+            that responses to already queued frames can be sent.
+        """
+        self._eof = True
+        self._wake_reader()
+        return True
+
+    def connection_lost(self, exc: Exception | None):
+        """Wake any waiting readers and writers."""
+        self._eof = True
+        self._connection_lost = True
+        if exc is not None and self._error is None:
+            self._error = exc
+        self._wake_reader()
+        while self._drain_waiters:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                if exc is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(exc)
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def pause_writing(self):
+        """Make `drain` wait until the transport resumes writing."""
+        self._writing_paused = True
+
+    def resume_writing(self):
+        """Release any coroutines waiting in `drain`."""
+        self._writing_paused = False
+        while self._drain_waiters:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    # reading
+
+    def _parse_frames(self):
+        """Move every complete frame from the buffer into `frames`. The
+            payload (auth fields and body) is copied out because the
+            buffer is reused for subsequent reads.
+        """
+        header_length = self._header_length
+        with memoryview(self._buffer) as view:
+            while True:
+                header = self._pending_header
+                if header is None:
+                    if self._end - self._start < header_length:
+                        self._frame_length = header_length
+                        break
+                    header = self.header_class.decode(
+                        view[self._start:self._start + header_length],
+                        message_type_class=self.message_type_class
+                    )
+                frame_length = header_length + header.auth_length + \
+                    header.body_length
+                if self._end - self._start < frame_length:
+                    self._pending_header = header
+                    self._frame_length = frame_length
+                    break
+                payload_start = self._start + header_length
+                self._start += frame_length
+                self._pending_header = None
+                self.frames.append((
+                    header,
+                    memoryview(bytes(view[payload_start:self._start])),
+                ))
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _wake_reader(self):
+        """Wake the coroutine waiting in `read_frame`, if any."""
+        waiter = self._read_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def read_frame(self) -> tuple[HeaderProtocol, memoryview]:
+        """Return the next queued `(header, payload)` pair, where the
+            payload is a `memoryview` of the auth fields followed by the
+            body. Only waits if no complete frame is queued. Raises the
+            connection or parsing error if one occurred, or
+            `asyncio.IncompleteReadError` once the stream has ended.
+        """
+        while not self.frames:
+            if self._error is not None:
+                raise self._error
+            if self._eof:
+                raise asyncio.IncompleteReadError(b'', None)
+            self._read_waiter = self._loop.create_future()
+            try:
+                await self._read_waiter
+            finally:
+                self._read_waiter = None
+
+        frame = self.frames.popleft()
+        if self._reading_paused and \
+                len(self.frames) <= self.max_queued_frames // 2:
+            self._reading_paused = False
+            if self.transport is not None:
+                self.transport.resume_reading()
+        return frame
+
+    # StreamWriter interface
+
+    def write(self, data: bytes | bytearray | memoryview):
+        """Write data to the transport."""
+        self.transport.write(data) # type: ignore
+
+    def writelines(self, data: Iterable[bytes | bytearray | memoryview]):
+        """Write a sequence of buffers to the transport."""
+        self.transport.writelines(data) # type: ignore
+
+    async def drain(self):
+        """Wait until the transport write buffer is below its high
+            water mark. Raises `ConnectionResetError` if the connection
+            was lost.
+        """
+        if self._connection_lost:
+            raise ConnectionResetError('Connection lost')
+        if not self._writing_paused:
+            return
+        waiter = self._loop.create_future()
+        if self._drain_waiters is None:
+            self._drain_waiters = deque()
+        self._drain_waiters.append(waiter)
+        await waiter
+
+    def get_extra_info(self, name: str, default: Any = None) -> Any:
+        """Return transport information, e.g. `peername`."""
+        if self.transport is None:
+            return default
+        return self.transport.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        """Return `True` if the transport is closing or closed."""
+        return self.transport is None or self.transport.is_closing()
+
+    def close(self):
+        """Close the transport."""
+        if self.transport is not None:
+            self.transport.close()
+
+    async def wait_closed(self):
+        """Wait until the connection is lost."""
+        if self._connection_lost:
+            return
+        if self._closed is None:
+            self._closed = self._loop.create_future()
+        await self._closed
+
+
+async def read_frame(
+        reader: asyncio.StreamReader | FrameProtocol,
+        header_class: type[HeaderProtocol],
+        message_type_class: type[IntEnum],
+    ) -> tuple[HeaderProtocol, memoryview]:
+    """Read one frame from a `StreamReader` or a `FrameProtocol` and
+        return the decoded header with a `memoryview` of the auth fields
+        followed by the body.
+    """
+    if isinstance(reader, FrameProtocol):
+        return await reader.read_frame()
+    header = header_class.decode(
+        await reader.readexactly(header_class.header_length()),
+        message_type_class=message_type_class
+    )
+    # read auth and body together so both decode from one view
+    payload = memoryview(
+        await reader.readexactly(header.auth_length + header.body_length)
+    )
+    return header, payload
@@ -0,0 +1,285 @@
+from __future__ import annotations
+from .offload import Offloader, OffloadedPlugin
+from dataclasses import dataclass
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, Coroutine, Generator, Hashable
+import asyncio
+import logging
+
+
+@dataclass(slots=True)
+class CallStats:
+    """Timing of the calls made under one watchdog key. Times are in
+        seconds; for coroutine handlers, `max_time` is the longest
+        single step, i.e. the longest the event loop was blocked.
+    """
+    calls: int = 0
+    slow_calls: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    migrated: bool = False
+
+
+class _StepTimer:
+    """Awaitable that drives a coroutine and times each of its steps,
+        since each step runs without yielding to the event loop.
+    """
+    __slots__ = ('coro', 'longest')
+
+    def __init__(self, coro: Coroutine):
+        self.coro = coro
+        self.longest = 0.0
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        coro = self.coro
+        value, error = None, None
+        while True:
+            start = perf_counter()
+            try:
+                if error is not None:
+                    result = coro.throw(error)
+                else:
+                    result = coro.send(value)
+            except StopIteration as e:
+                self.longest = max(self.longest, perf_counter() - start)
+                return e.value
+            self.longest = max(self.longest, perf_counter() - start)
+            try:
+                value, error = (yield result), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class _TimedPlugin:
+    """Proxy for an auth or cipher plugin that times its `check`,
+        `make`, `encrypt`, and `decrypt` calls.
+    """
+    __slots__ = ('plugin', 'watchdog', 'label')
+    _timed_methods = ('check', 'make', 'encrypt', 'decrypt')
+
+    def __init__(self, plugin: Any, watchdog: Watchdog, label: Hashable):
+        self.plugin = plugin
+        self.watchdog = watchdog
+        self.label = label
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.plugin, name)
+        if name not in self._timed_methods:
+            return attr
+        watchdog, key = self.watchdog, (self.label, name)
+
+        @wraps(attr)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                watchdog.record(key, perf_counter() - start)
+        return timed
+
+
+class Watchdog:
+    """Measures how long handler and plugin calls block the event loop,
+        and how late the loop runs scheduled callbacks (loop lag). Calls
+        over `budget` seconds are logged, passed to `on_slow_call`, and
+        counted per key in `stats`, and `top` lists the worst
+        offenders. If an `offloader` and `migrate_after` are set, a sync
+        handler that has exceeded the budget `migrate_after` times is
+        moved to the offloader's executor.
+
+        Pass a watchdog to `TCPServer`, `TCPClient`, or `UDPNode` with
+        `watchdog=...`: their outer plugins, default handler, and every
+        handler (with its inner plugins) registered afterwards are then
+        timed, and the loop lag monitor starts with the server, client
+        connection, or node. `UDPNode` handlers cannot be migrated since
+        the node does not await handler results.
+    """
+    budget: float
+    top_n: int
+    lag_interval: float
+    offloader: Offloader | None
+    migrate_after: int | None
+    on_slow_call: Callable[[Hashable, float], Any] | None
+    stats: dict[Hashable, CallStats]
+    lag: float
+    max_lag: float
+    lag_over_budget: int
+    logger: logging.Logger | None
+
+    def __init__(
+            self, budget: float = 0.01, *, top_n: int = 10,
+            lag_interval: float = 0.1,
+            offloader: Offloader | None = None,
+            migrate_after: int | None = None,
+            on_slow_call: Callable[[Hashable, float], Any] | None = None,
+            logger: logging.Logger | None = None,
+        ):
+        """Initialize the watchdog. `budget` is the longest a single
+            call or loop delay may take, in seconds. `top_n` is the
+            default length of `top`. The loop lag is sampled every
+            `lag_interval` seconds. `on_slow_call` is called with the
+            key and elapsed time of every call over budget; loop lag is
+            reported under the key `'loop_lag'`. Logs warnings to
+            `logger` if one is provided.
+        """
+        self.budget = budget
+        self.top_n = top_n
+        self.lag_interval = lag_interval
+        self.offloader = offloader
+        self.migrate_after = migrate_after
+        self.on_slow_call = on_slow_call
+        self.stats = {}
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.lag_over_budget = 0
+        self.logger = logger
+        self._lag_task: asyncio.Task | None = None
+
+    def record(self, key: Hashable, elapsed: float) -> CallStats:
+        """Record one call under the key and return its stats."""
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = CallStats()
+        stats.calls += 1
+        stats.total_time += elapsed
+        if elapsed > stats.max_time:
+            stats.max_time = elapsed
+        if elapsed > self.budget:
+            stats.slow_calls += 1
+            self._report(key, elapsed)
+        return stats
+
+    def top(self, n: int | None = None) -> list[tuple[Hashable, CallStats]]:
+        """Return the `n` (default `top_n`) keys with the most calls
+            over budget, worst first, with their stats.
+        """
+        offenders = [
+            (key, stats) for key, stats in self.stats.items()
+            if stats.slow_calls
+        ]
+        offenders.sort(key=lambda i: (i[1].slow_calls, i[1].max_time), reverse=True)
+        return offenders[:n or self.top_n]
+
+    def wrap_handler(
+            self, key: Hashable, handler: Callable, *,
+            migratable: bool = True
+        ) -> Callable:
+        """Return a handler that times calls to `handler` under the key.
+            If `migratable` and the handler is sync, it is moved to the
+            offloader once it is a repeat offender.
+        """
+        if isinstance(handler, _TimedHandler):
+            return handler
+        return _TimedHandler(self, key, handler, migratable)
+
+    def wrap(
+            self, key: Hashable, handler: Callable, auth_plugin: Any,
+            cipher_plugin: Any, *, migratable: bool = True
+        ) -> tuple[Callable, Any, Any]:
+        """Wrap a handler and its inner plugins for registration under
+            the key.
+        """
+        return (
+            self.wrap_handler(key, handler, migratable=migratable),
+            self.wrap_plugin(auth_plugin, (key, 'auth_plugin')),
+            self.wrap_plugin(cipher_plugin, (key, 'cipher_plugin')),
+        )
+
+    def wrap_plugin(self, plugin: Any, label: Hashable) -> Any:
+        """Return a proxy that times the plugin's calls under the keys
+            `(label, method_name)`. `None` and plugins that already run
+            in an `Offloader` are returned unchanged.
+        """
+        if plugin is None or isinstance(plugin, (_TimedPlugin, OffloadedPlugin)):
+            return plugin
+        return _TimedPlugin(plugin, self, label)
+
+    def start_lag_monitor(self):
+        """Start sampling the loop lag on the running loop, unless it
+            is already being sampled.
+        """
+        if self._lag_task is not None and not self._lag_task.done():
+            return
+        self._lag_task = asyncio.create_task(self._monitor_lag())
+
+    def stop_lag_monitor(self):
+        """Stop sampling the loop lag."""
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    async def _monitor_lag(self):
+        """Sleep for `lag_interval` repeatedly and record how much
+            later than scheduled the loop resumed.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.lag = max(0.0, loop.time() - expected)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+            if self.lag > self.budget:
+                self.lag_over_budget += 1
+                self._report('loop_lag', self.lag)
+
+    def _report(self, key: Hashable, elapsed: float):
+        """Log a call over budget and pass it to `on_slow_call`."""
+        if self.logger is not None:
+            self.logger.warning(
+                "Event loop blocked for %.1f ms by %s (budget %.1f ms)",
+                elapsed * 1000, key, self.budget * 1000
+            )
+        if self.on_slow_call is not None:
+            self.on_slow_call(key, elapsed)
+
+
+class _TimedHandler:
+    """Handler wrapper created by `Watchdog.wrap_handler`."""
+    __slots__ = ('watchdog', 'key', 'handler', 'target', 'migratable')
+
+    def __init__(
+            self, watchdog: Watchdog, key: Hashable, handler: Callable,
+            migratable: bool
+        ):
+        self.watchdog = watchdog
+        self.key = key
+        self.handler = handler
+        self.target = handler
+        self.migratable = migratable and \
+            not asyncio.iscoroutinefunction(handler)
+
+    def __call__(self, message: Any, writer_or_addr: Any) -> Any:
+        start = perf_counter()
+        result = self.target(message, writer_or_addr)
+        elapsed = perf_counter() - start
+        if isinstance(result, Coroutine):
+            return self._finish(result, elapsed)
+        self._record(elapsed)
+        return result
+
+    async def _finish(self, coro: Coroutine, elapsed: float) -> Any:
+        """Await a coroutine result, timing its longest step."""
+        timer = _StepTimer(coro)
+        try:
+            return await timer
+        finally:
+            self._record(max(elapsed, timer.longest))
+
+    def _record(self, elapsed: float):
+        """Record the call and migrate the handler if it is a repeat
+            offender.
+        """
+        watchdog = self.watchdog
+        stats = watchdog.record(self.key, elapsed)
+        if self.migratable and watchdog.offloader is not None and \
+                watchdog.migrate_after is not None and \
+                stats.slow_calls >= watchdog.migrate_after:
+            self.target = watchdog.offloader.wrap_handler(self.handler)
+            self.migratable = False
+            stats.migrated = True
+            if watchdog.logger is not None:
+                watchdog.logger.warning(
+                    "Moved handler for key=%s to an executor", self.key
+                )
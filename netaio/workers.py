@@ -0,0 +1,241 @@
+from __future__ import annotations
+from .bus import WorkerBus
+from .common import default_server_logger
+from .server import TCPServer
+from multiprocessing.connection import wait
+from time import monotonic, sleep
+from typing import Any, Callable, Coroutine
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+
+
+class WorkerPool:
+    """Supervisor that runs one `TCPServer` in several forked worker
+        processes. Every worker binds the same port with `SO_REUSEPORT`,
+        so the kernel spreads incoming connections across them and
+        plugin and handler work is no longer limited to one core.
+        Handlers, plugins, and other configuration are set up once on
+        the server before the pool starts and are inherited by every
+        worker through `fork`. Workers that exit while the pool is
+        running are restarted. With `use_bus=True`, the workers are
+        connected by a `WorkerBus`, so `notify` and `broadcast` reach
+        clients connected to any worker.
+    """
+    server: TCPServer
+    size: int
+    use_auth: bool
+    use_cipher: bool
+    restart_delay: float
+    max_restarts: int | None
+    on_worker_start: Callable[
+        [TCPServer, int], Coroutine[Any, Any, Any] | None
+    ] | None
+    use_bus: bool
+    bus_path: str | None
+    processes: list[multiprocessing.Process | None]
+    restarts: list[int]
+    logger: logging.Logger
+
+    def __init__(
+            self, server: TCPServer, workers: int | None = None, *,
+            use_auth: bool = True, use_cipher: bool = True,
+            restart_delay: float = 1.0,
+            max_restarts: int | None = None,
+            on_worker_start: Callable[
+                [TCPServer, int], Coroutine[Any, Any, Any] | None
+            ] | None = None,
+            use_bus: bool = False,
+            logger: logging.Logger = default_server_logger,
+        ):
+        """Initialize the pool. `workers` defaults to the number of
+            CPUs. `use_auth` and `use_cipher` are passed to
+            `TCPServer.start` in each worker. A crashed worker is
+            restarted after `restart_delay` seconds, at most
+            `max_restarts` times per worker slot (no limit if `None`).
+            `on_worker_start` is called in each worker with the server
+            and the worker index before the server starts; if it returns
+            a coroutine, it is awaited. If `use_bus` is `True`, each
+            worker starts a `WorkerBus` with its sockets in a temporary
+            directory (`bus_path`). Raises `ValueError` if `workers`
+            is less than 1 or the server listens on a Unix socket
+            (`path`), which cannot be shared with `SO_REUSEPORT`, or
+            `RuntimeError` if the platform does not support `fork` and
+            `SO_REUSEPORT`.
+        """
+        if not hasattr(socket, 'SO_REUSEPORT') or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError('WorkerPool requires fork and SO_REUSEPORT')
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        if server.path is not None:
+            raise ValueError(
+                'WorkerPool cannot shard a Unix socket server; use a TCP port'
+            )
+        self.server = server
+        self.size = workers
+        self.use_auth = use_auth
+        self.use_cipher = use_cipher
+        self.restart_delay = restart_delay
+        self.max_restarts = max_restarts
+        self.on_worker_start = on_worker_start
+        self.use_bus = use_bus
+        self.bus_path = None
+        self.processes = [None] * workers
+        self.restarts = [0] * workers
+        self.logger = logger
+        self._context = multiprocessing.get_context('fork')
+        self._stopping = False
+
+    @property
+    def pids(self) -> list[int]:
+        """The process IDs of the running workers."""
+        return [
+            p.pid for p in self.processes
+            if p is not None and p.pid is not None
+        ]
+
+    def start(self):
+        """Fork the worker processes and return without waiting."""
+        self._stopping = False
+        if self.use_bus and self.bus_path is None:
+            self.bus_path = tempfile.mkdtemp(prefix='netaio-bus-')
+        for index in range(self.size):
+            if self.processes[index] is None:
+                self._spawn(index)
+
+    def poll(self, timeout: float | None = None) -> list[int]:
+        """Wait up to `timeout` seconds for workers to exit, restart
+            every worker that exited, and return their indexes.
+        """
+        sentinels = {
+            p.sentinel: index for index, p in enumerate(self.processes)
+            if p is not None
+        }
+        if not sentinels:
+            return []
+        restarted = []
+        for sentinel in wait(list(sentinels), timeout):
+            index = sentinels[sentinel] # type: ignore
+            process = self.processes[index]
+            process.join() # type: ignore
+            self.processes[index] = None
+            if self._stopping:
+                continue
+            self.logger.warning(
+                "Worker %d (pid %s) exited with code %s",
+                index, process.pid, process.exitcode # type: ignore
+            )
+            if self.max_restarts is not None and \
+                    self.restarts[index] >= self.max_restarts:
+                self.logger.error(
+                    "Worker %d reached max_restarts; not restarting", index
+                )
+                continue
+            self.restarts[index] += 1
+            restarted.append(index)
+        if restarted and self.restart_delay > 0:
+            sleep(self.restart_delay)
+        for index in restarted:
+            self._spawn(index)
+        return restarted
+
+    def run(self):
+        """Start the workers and supervise them until the process
+            receives `SIGINT` or `SIGTERM` or every worker slot has
+            stopped, then stop the remaining workers. Blocks; must be
+            called from the main thread.
+        """
+        def request_stop(*_):
+            self._stopping = True
+
+        previous = {
+            sig: signal.signal(sig, request_stop)
+            for sig in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            self.start()
+            self.logger.info(
+                "Started %d workers on %s:%s",
+                self.size, self.server.interface, self.server.port
+            )
+            while not self._stopping and any(
+                p is not None for p in self.processes
+            ):
+                self.poll(0.5)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            self.stop()
+
+    def stop(self, timeout: float = 5.0):
+        """Send `SIGTERM` to every worker so that it closes its server,
+            and kill any worker still running after `timeout` seconds.
+        """
+        self._stopping = True
+        running = [p for p in self.processes if p is not None]
+        for process in running:
+            if process.is_alive():
+                process.terminate()
+        deadline = monotonic() + timeout
+        for process in running:
+            process.join(max(0.0, deadline - monotonic()))
+            if process.is_alive():
+                self.logger.warning(
+                    "Worker pid %s did not stop; killing it", process.pid
+                )
+                process.kill()
+                process.join()
+        self.processes = [None] * self.size
+        if self.bus_path is not None:
+            shutil.rmtree(self.bus_path, ignore_errors=True)
+            self.bus_path = None
+
+    def _spawn(self, index: int):
+        """Fork the worker process for a slot."""
+        process = self._context.Process(
+            target=self._run_worker, args=(index,),
+            name=f'netaio-worker-{index}', daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+
+    def _run_worker(self, index: int):
+        """Worker process entry point. `SIGINT` is left to the
+            supervisor, which stops workers with `SIGTERM`.
+        """
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        asyncio.run(self._serve(index))
+
+    async def _serve(self, index: int):
+        """Run the server in a worker until it receives `SIGTERM`."""
+        task = asyncio.current_task()
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, task.cancel # type: ignore
+        )
+        bus = None
+        if self.bus_path is not None:
+            bus = WorkerBus(self.bus_path, index, self.size, logger=self.logger)
+            await bus.start(self.server)
+        if self.on_worker_start is not None:
+            result = self.on_worker_start(self.server, index)
+            if asyncio.iscoroutine(result):
+                await result
+        try:
+            await self.server.start(
+                use_auth=self.use_auth, use_cipher=self.use_cipher,
+                reuse_port=True
+            )
+        except asyncio.CancelledError:
+            self.logger.info("Worker %d stopped", index)
+        finally:
+            if bus is not None:
+                await bus.stop()
@@ -1,5 +1,12 @@
 from context import netaio
 from enum import IntEnum
+from unittest import mock
+import asyncio
+import copy
+import logging
+import packify
+import pickle
+import time
 import unittest
 
 
@@ -84,6 +91,136 @@ class TestMisc(unittest.TestCase):
         msg.body.content = b'new content'
         assert msg.body.content != message.body.content
 
+    def test_Message_decoding_from_memoryview_is_lazy(self):
+        message = netaio.Message.prepare(
+            body=netaio.Body.prepare(b'content', b'uri'),
+            message_type=netaio.MessageType.OK,
+            auth_data=netaio.AuthFields({'test': b'test'})
+        )
+        data = message.encode()
+        view = memoryview(data)
+
+        # header decoding ignores any excess bytes after the header
+        header = netaio.Header.decode(view)
+        assert header.message_type is netaio.MessageType.OK
+        assert header.checksum == message.header.checksum
+
+        decoded = netaio.Message.decode(view)
+        body = decoded.body
+        assert body._uri is None and body._content is None
+        assert body.encode() == message.body.encode()
+        assert body._uri is None and body._content is None
+        assert body.uri == b'uri'
+        assert type(body.uri) is bytes
+        assert body._content is None
+        assert body.content == b'content'
+        assert body == message.body
+        assert decoded.auth_data.fields == {'test': b'test'}
+
+        # mutating a lazy body detaches it from the decoded buffer
+        body = netaio.Message.decode(data).body
+        body.uri = b'new uri'
+        body.uri_length = len(body.uri)
+        assert body._view is None
+        assert body.content == b'content'
+        assert body.encode() == netaio.Body.prepare(b'content', b'new uri').encode()
+
+        # lazy bodies copy and pickle by value
+        body = netaio.Message.decode(data).body
+        assert pickle.loads(pickle.dumps(body)) == message.body
+        assert copy.copy(body) == message.body
+
+        with self.assertRaises(ValueError):
+            netaio.Body.decode(b'\x00\x09uri')
+
+        with self.assertRaises(ValueError) as e:
+            netaio.Message.decode(data[:-1] + b'!')
+        assert 'checksum' in str(e.exception).lower()
+
+        assert netaio.common.compiled_struct('!BHHI') is \
+            netaio.common.compiled_struct('!BHHI')
+
+    def test_Message_encode_is_cached_until_mutated(self):
+        message = netaio.Message.prepare(
+            body=netaio.Body.prepare(b'content', b'uri'),
+            message_type=netaio.MessageType.OK,
+        )
+        with mock.patch.object(
+            netaio.common.packify, 'pack', wraps=netaio.common.packify.pack
+        ) as pack:
+            frame = message.encode()
+            for _ in range(10):
+                assert message.encode() is frame
+                assert message.check()
+            assert pack.call_count == 0, pack.call_count
+
+            # plugins mutate auth_fields.fields in place
+            auth_plugin = netaio.HMACAuthPlugin(config={'secret': 'test'})
+            auth_plugin.make(message.auth_data, message.body)
+            new_frame = message.encode()
+            assert new_frame is not frame
+            assert pack.call_count == 1, pack.call_count
+            assert message.encode() is new_frame
+            decoded = netaio.Message.decode(new_frame)
+            assert auth_plugin.check(decoded.auth_data, decoded.body)
+            assert decoded.auth_data.encode() == message.auth_data.encode()
+
+        frame = message.encode()
+        message.body.content = b'new content'
+        assert message.encode() is not frame
+        assert netaio.Message.decode(message.encode()).body.content == \
+            b'new content'
+
+        frame = message.encode()
+        message.header.message_type = netaio.MessageType.ERROR
+        assert message.encode() is not frame
+        assert netaio.Message.decode(message.encode()).header.message_type \
+            is netaio.MessageType.ERROR
+
+        frame = message.encode()
+        message.auth_data.fields = {}
+        assert message.encode() is not frame
+        assert netaio.Message.decode(message.encode()).auth_data.fields == {}
+
+    def test_message_type_table(self):
+        table = netaio.common.message_type_table(netaio.MessageType)
+        assert len(table) == 256
+        assert table is netaio.common.message_type_table(netaio.MessageType)
+        for mtype in netaio.MessageType:
+            assert table[mtype.value] is mtype
+        assert table[99] is None
+
+        header = netaio.Header(netaio.MessageType.OK, 0, 0, 0)
+        data = bytes([99]) + header.encode()[1:]
+        with self.assertRaises(ValueError):
+            netaio.Header.decode(data)
+        with self.assertRaises(ValueError):
+            netaio.CompactHeader.decode(data)
+
+    def test_CompactMessage_encoding_decoding_and_copying(self):
+        message = netaio.CompactMessage.prepare(
+            body=netaio.Body.prepare(b'content', b'uri'),
+            message_type=netaio.MessageType.OK,
+            auth_data=netaio.AuthFields({'test': b'test'})
+        )
+        assert isinstance(message, netaio.MessageProtocol)
+        assert isinstance(message.header, netaio.HeaderProtocol)
+        assert type(message.header) is netaio.CompactHeader
+
+        data = message.encode()
+        assert data == netaio.Message.decode(data).encode()
+        decoded = netaio.CompactMessage.decode(data)
+        assert type(decoded.header) is netaio.CompactHeader
+        assert decoded.header.message_type is netaio.MessageType.OK
+        assert decoded.auth_data.fields == {'test': b'test'}
+        assert decoded.body.uri == b'uri'
+        assert decoded.body.content == b'content'
+        assert decoded.copy() == decoded
+
+        for part in (decoded, decoded.header, decoded.auth_data, decoded.body):
+            assert not hasattr(part, '__dict__')
+        assert not hasattr(netaio.Peer(set()), '__dict__')
+
     def test_UDPNode_peer_helper_methods(self):
         node = netaio.UDPNode(local_peer=netaio.Peer(set(), b'local id', b'local data'))
         # first add a peer
@@ -111,6 +248,473 @@ class TestMisc(unittest.TestCase):
         node.remove_peer(('0.0.0.0', 8888), b'test id')
         assert len(node.peers) == 0
 
+    def test_TraceSampler(self):
+        logger = logging.getLogger('netaio.test_trace_sampler')
+        logger.setLevel(logging.INFO)
+        sampler = netaio.TraceSampler(3)
+        assert not any(sampler(logger) for _ in range(6))
+        logger.setLevel(logging.DEBUG)
+        assert [sampler(logger) for _ in range(6)] == [
+            True, False, False, True, False, False
+        ]
+        with self.assertRaises(ValueError):
+            netaio.TraceSampler(0)
+
+    def test_UDPNode_hot_path_debug_logging_is_guarded(self):
+        logger = logging.getLogger('netaio.test_hot_path')
+        node = netaio.UDPNode(
+            logger=logger, ignore_own_ip=False,
+            auth_plugin=netaio.HMACAuthPlugin(config={'secret': 'test'}),
+        )
+        node.add_handler(
+            netaio.MessageType.REQUEST_URI, lambda message, _: message
+        )
+
+        def receive():
+            message = netaio.Message.prepare(
+                netaio.Body.prepare(b'hello', uri=b'test'),
+                netaio.MessageType.REQUEST_URI
+            )
+            node.datagram_received(
+                node.prepare_message(message).encode(), ('127.0.0.1', 8888)
+            )
+
+        with mock.patch.object(logger, 'debug') as debug:
+            logger.setLevel(logging.INFO)
+            receive()
+            assert debug.call_count == 0
+            logger.setLevel(logging.DEBUG)
+            receive()
+            traced = debug.call_count
+            assert traced > 5
+            node.trace_sampler = netaio.TraceSampler(1000)
+            debug.reset_mock()
+            for _ in range(5):
+                receive()
+            assert 0 < debug.call_count < traced
+
+    def test_UDPNode_send_is_sampled_once_per_message(self):
+        logger = logging.getLogger('netaio.test_trace_once')
+        logger.setLevel(logging.DEBUG)
+        node = netaio.UDPNode(
+            logger=logger, trace_sample_every=2,
+            auth_plugin=netaio.HMACAuthPlugin(config={'secret': 'test'}),
+        )
+        node.transport = mock.Mock()
+        counts = []
+        with mock.patch.object(logger, 'debug') as debug:
+            for _ in range(4):
+                debug.reset_mock()
+                node.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'hello', uri=b'test'),
+                    netaio.MessageType.NOTIFY_URI
+                ), ('127.0.0.1', 8888))
+                counts.append(debug.call_count)
+        # every other message gets all of its log lines, the rest none
+        assert counts[1] == counts[3] == 0, counts
+        assert counts[0] == counts[2] > 1, counts
+
+    def test_TokenBucket(self):
+        bucket = netaio.TokenBucket(10, 2)
+        now = bucket.updated
+        assert bucket.take(now) and bucket.take(now)
+        assert not bucket.take(now)
+        assert not bucket.take(now + 0.05)
+        assert bucket.take(now + 0.15)
+        # refills up to the burst size only
+        assert [bucket.take(now + 10) for _ in range(3)] == [True, True, False]
+        with self.assertRaises(ValueError):
+            netaio.TokenBucket(0)
+        with self.assertRaises(ValueError):
+            netaio.TokenBucket(1, 0.5)
+
+    def test_AdmissionControl_peer_rate(self):
+        admission = netaio.AdmissionControl(netaio.AdmissionPolicy(
+            peer_rate=0.001, peer_burst=2
+        ))
+        assert admission.connect('a', 0) and admission.connect('b', 1)
+        # both connections of the peer share its bucket
+        assert admission.admit('a', b'peer')
+        assert admission.admit('b', b'peer')
+        assert not admission.admit('a', b'peer')
+        assert admission.admit('a', None)
+        assert admission.counters == {'peer_rate_limited': 1}
+        assert admission.in_flight == 3
+        admission.forget_peer(b'peer')
+        assert admission.admit('b', b'peer')
+
+    def test_TimerWheel(self):
+        wheel = netaio.TimerWheel(resolution=1.0, slots=4, now=0.0)
+        wheel.schedule('a', 0.5)
+        wheel.schedule('b', 2.0)
+        wheel.schedule('c', 9.0)  # more than a full turn ahead
+        wheel.schedule('d', 3.0)
+        wheel.cancel('d')
+        assert len(wheel) == 3 and 'd' not in wheel
+        assert wheel.advance(0.9) == []
+        assert wheel.advance(1.0) == ['a']
+        assert wheel.advance(2.5) == ['b']
+        assert wheel.advance(8.0) == []
+        # rescheduling replaces the previous deadline
+        wheel.schedule('b', 8.5)
+        assert sorted(wheel.advance(9.0)) == ['b', 'c']
+        assert len(wheel) == 0
+        with self.assertRaises(ValueError):
+            netaio.TimerWheel(resolution=0)
+
+    def test_KeepAlive_tick(self):
+        pinged, closed = [], []
+        keepalive = netaio.KeepAlive(
+            netaio.KeepAlivePolicy(interval=2, idle_timeout=5, resolution=1),
+            pinged.append, closed.append
+        )
+        keepalive.add('a')
+        keepalive.add('b')
+        start = keepalive.links['a'].last_rx
+        keepalive.tick(start + 1)
+        assert pinged == [] and closed == []
+        keepalive.tick(start + 3)
+        assert sorted(pinged) == ['a', 'b']
+        # 'a' answers; 'b' stays silent and is closed
+        keepalive.links['a'].last_rx = start + 3
+        keepalive.tick(start + 6)
+        assert closed == ['b'] and 'b' not in keepalive.links
+        assert sorted(pinged) == ['a', 'a', 'b']
+        keepalive.links['a'].last_rx = start + 6
+        keepalive.tick(start + 10)
+        assert closed == ['b']
+        assert keepalive.counters['reaped'] == 1
+        assert keepalive.counters['pings_sent'] == 4
+
+        ping = netaio.keepalive.make_ping_msg(
+            message_class=netaio.Message,
+            message_type_class=netaio.MessageType, body_class=netaio.Body
+        )
+        assert ping.header.message_type is netaio.MessageType.PING
+        rtt = keepalive.pong('a', ping.body.content)
+        assert rtt is not None and 0 <= rtt < 1
+        assert keepalive.rtt('a') == rtt
+        assert keepalive.pong('a', b'junk') is None
+
+    def test_ResponseCache(self):
+        def respond(content: bytes) -> netaio.Message:
+            return netaio.Message.prepare(
+                netaio.Body.prepare(content, uri=b'x'),
+                netaio.MessageType.RESPOND_URI
+            )
+
+        def request(
+                uri: bytes, message_type=netaio.MessageType.REQUEST_URI,
+                content: bytes = b''
+            ):
+            return netaio.Message.prepare(
+                netaio.Body.prepare(content, uri=uri), message_type
+            )
+
+        size = len(respond(b'a').encode())
+        cache = netaio.ResponseCache(size * 2, exclude=[b'secret'])
+        assert cache.cacheable(request(b'a'))
+        assert not cache.cacheable(request(b'secret'))
+        assert not cache.cacheable(request(b'a', netaio.MessageType.PUBLISH_URI))
+        assert cache.key(request(b'secret')) is None
+        a, b, c, d, e = [
+            cache.key(request(uri)) for uri in (b'a', b'b', b'c', b'd', b'e')
+        ]
+
+        assert cache.get(a) is None
+        assert cache.put(a, respond(b'a'))
+        assert cache.put(b, respond(b'b'))
+        assert cache.get(a).body.content == b'a'
+        # 'b' is the least recently used, so it is evicted for 'c'
+        assert cache.put(c, respond(b'c'))
+        assert cache.get(b) is None
+        assert cache.size == size * 2 and len(cache) == 2
+        assert not cache.put(d, respond(b'd' * 100))
+        assert not cache.put(e, netaio.make_not_found_msg(uri=b'e'))
+
+        # successful writes invalidate; failed ones do not
+        update = request(b'a', netaio.MessageType.UPDATE_URI)
+        cache.invalidate_for(update, netaio.make_error_msg(b'no'))
+        assert cache.get(a) is not None
+        cache.invalidate_for(update, None)
+        assert cache.get(a) is None
+        assert cache.invalidate(b'c') == 1
+        assert cache.stats() == {
+            'entries': 0, 'bytes': 0, 'hits': 2, 'misses': 3,
+            'stores': 3, 'evictions': 1, 'invalidations': 2, 'too_large': 1,
+        }
+
+        # the content of the request is part of the key
+        cache = netaio.ResponseCache()
+        query = cache.key(request(b'q', content=b'1'))
+        other = cache.key(request(b'q', content=b'2'))
+        assert query != other
+        # so is the route the request was handled by
+        assert cache.key(request(b'q', content=b'1'), b'route') != query
+        cache.put(query, respond(b'1'))
+        cache.put(other, respond(b'2'))
+        assert cache.get(query).body.content == b'1'
+        assert cache.invalidate(b'q') == 2 and len(cache) == 0
+
+        # a response made before its URI was invalidated is not stored
+        generation = cache.generation(b'q')
+        assert cache.put(query, respond(b'1'), generation)
+        cache.invalidate(b'q')
+        assert not cache.put(query, respond(b'1'), generation)
+        assert cache.get(query) is None and cache.counters['stale'] == 1
+        generation = cache.generation(b'q')
+        cache.invalidate(b'other')
+        assert cache.put(query, respond(b'1'), generation)
+        cache.clear()
+        assert not cache.put(query, respond(b'1'), generation)
+
+        cache = netaio.ResponseCache(ttl=0.01, max_entries=1)
+        cache.put(a, respond(b'a'))
+        cache.put(b, respond(b'b'))
+        assert len(cache) == 1 and cache.counters['evictions'] == 1
+        time.sleep(0.02)
+        assert cache.get(b) is None
+        assert cache.counters['expirations'] == 1 and len(cache) == 0
+        with self.assertRaises(ValueError):
+            netaio.ResponseCache(0)
+
+    def test_RequestCoalescer(self):
+        async def run_test():
+            coalescer = netaio.RequestCoalescer()
+            calls = []
+
+            async def fetch(uri: bytes) -> netaio.Message:
+                calls.append(uri)
+                await asyncio.sleep(0.05)
+                return netaio.make_respond_uri_msg(b'value', uri)
+
+            request = netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'hot'),
+                netaio.MessageType.REQUEST_URI
+            )
+            key = coalescer.key(request)
+            assert key is not None
+            assert coalescer.key(request, b'route') != key
+            assert coalescer.key(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'hot'),
+                netaio.MessageType.PUBLISH_URI
+            )) is None
+
+            results = await asyncio.gather(*[
+                coalescer.call(key, lambda: fetch(b'hot')) for _ in range(5)
+            ])
+            assert calls == [b'hot']
+            assert all(r is results[0][0] for r, _ in results)
+            assert all(shared for _, shared in results)
+            assert len(coalescer) == 0
+            assert coalescer.counters == {'calls': 1, 'coalesced': 4}
+
+            # a call that finished is not shared with later requests
+            response, shared = await coalescer.call(key, lambda: fetch(b'hot'))
+            assert calls == [b'hot', b'hot'] and not shared
+            # sync results are returned as-is
+            assert await coalescer.call(key, lambda: None) == (None, False)
+
+            async def fail():
+                await asyncio.sleep(0.01)
+                raise RuntimeError('backend down')
+
+            results = await asyncio.gather(
+                coalescer.call(key, fail), coalescer.call(key, fail),
+                return_exceptions=True
+            )
+            assert all(isinstance(r, RuntimeError) for r in results)
+
+        asyncio.run(run_test())
+
+    def test_send_frame_fans_out_one_bytes_object(self):
+        def writer(closing: bool = False, buffered: int = 0):
+            client = mock.Mock()
+            client.is_closing.return_value = closing
+            client.transport.get_write_buffer_size.return_value = buffered
+            client.drain = mock.AsyncMock()
+            return client
+
+        server = netaio.TCPServer(metrics=netaio.Metrics())
+        clients = [writer(), writer(buffered=10), writer(closing=True)]
+        server.clients.update(clients)
+        message = netaio.Message.prepare(
+            netaio.Body.prepare(b'hello', uri=b'news'),
+            netaio.MessageType.PUBLISH_URI
+        )
+        asyncio.run(server.broadcast(message))
+        frame = clients[0].write.call_args.args[0]
+        assert frame == message.encode()
+        assert clients[1].write.call_args.args[0] is frame
+        clients[0].drain.assert_not_awaited()
+        clients[1].drain.assert_awaited_once()
+        clients[2].write.assert_not_called()
+        assert clients[2] not in server.clients
+        assert server.metrics.counters['messages_out'] == 2
+
+        node = netaio.UDPNode()
+        node.transport = mock.Mock()
+        addrs = [('127.0.0.1', 8000 + i) for i in range(3)]
+        for addr in addrs:
+            node.subscribe(b'news', addr)
+        node.notify(b'news', message)
+        calls = node.transport.sendto.call_args_list
+        assert sorted(c.args[1] for c in calls) == addrs
+        assert all(c.args[0] is calls[0].args[0] for c in calls)
+
+    def test_UDPNode_subscription_index(self):
+        node = netaio.UDPNode()
+        addr1, addr2 = ('0.0.0.0', 8888), ('0.0.0.0', 9999)
+        for i in range(10):
+            node.subscribe(f'key{i}'.encode(), addr1)
+        node.subscribe(b'key0', addr2)
+        assert len(node.subscribed_keys[addr1]) == 10
+        assert node.subscribed_keys[addr2] == {b'key0'}
+
+        node.unsubscribe(b'key0', addr2)
+        assert addr2 not in node.subscribed_keys
+        assert node.subscriptions[b'key0'] == {addr1}
+
+        # removing a peer only touches the keys it held
+        node.add_or_update_peer(b'test id', b'test data', addr1)
+        node.subscribe(b'key0', addr2)
+        node.remove_peer(addr1, b'test id')
+        assert addr1 not in node.subscribed_keys
+        assert node.subscriptions == {b'key0': {addr2}}
+
+        node.unsubscribe_all(addr2)
+        assert node.subscriptions == {}
+        assert node.subscribed_keys == {}
+
+    def test_UriTrie(self):
+        trie = netaio.UriTrie()
+        trie[b'sensors/*'] = 'one'
+        trie[b'sensors/**'] = 'any'
+        trie[b'sensors/*/temp'] = 'temp'
+        trie[b'**/alarm'] = 'alarm'
+        trie[b'sensors/1'] = 'exact'
+        assert len(trie) == 5
+        assert b'sensors/*' in trie
+        assert b'sensors/2' not in trie
+        assert set(trie) == {
+            b'sensors/*', b'sensors/**', b'sensors/*/temp', b'**/alarm',
+            b'sensors/1',
+        }
+
+        assert sorted(trie.match(b'sensors')) == ['any']
+        assert sorted(trie.match(b'sensors/1')) == ['any', 'exact', 'one']
+        assert sorted(trie.match(b'sensors/2')) == ['any', 'one']
+        assert sorted(trie.match(b'sensors/2/temp')) == ['any', 'temp']
+        assert sorted(trie.match(b'sensors/2/alarm')) == ['alarm', 'any']
+        assert trie.match(b'alarm') == ['alarm']
+        assert trie.match(b'actuators/1') == []
+
+        assert trie.pop(b'sensors/**') == 'any'
+        assert trie.pop(b'sensors/**') is None
+        assert len(trie) == 4
+        assert trie.match(b'sensors') == []
+        for pattern in list(trie):
+            trie.pop(pattern)
+        assert len(trie) == 0
+        assert trie._root.children == {}
+
+    def test_Router(self):
+        router = netaio.Router()
+        MT = netaio.MessageType
+        host = ('127.0.0.1', 8888)
+        keys = [
+            MT.REQUEST_URI,
+            (MT.REQUEST_URI, b'users/{id}'),
+            (MT.REQUEST_URI, b'users/me'),
+            (MT.REQUEST_URI, b'users/{id}/posts/{post}'),
+            (MT.REQUEST_URI, b'users/me', host),
+            (MT.REQUEST_URI, b'users/{id}', host),
+            (MT.REQUEST_URI, b'a', b'b', b'c'),
+        ]
+        for key in keys:
+            router.add(key)
+        assert len(router) == 6
+        assert keys[-1] not in router
+
+        assert router.resolve(MT.REQUEST_URI, b'users/me') == (keys[2], {})
+        assert router.resolve(MT.REQUEST_URI, b'users/42') == \
+            (keys[1], {'id': b'42'})
+        assert router.resolve(MT.REQUEST_URI, b'users/42/posts/7') == \
+            (keys[3], {'id': b'42', 'post': b'7'})
+        assert router.resolve(MT.REQUEST_URI, b'users/me', host) == (keys[4], {})
+        assert router.resolve(MT.REQUEST_URI, b'users/42', host) == \
+            (keys[5], {'id': b'42'})
+        assert router.resolve(MT.REQUEST_URI, b'other') == (keys[0], {})
+        assert router.resolve(MT.CREATE_URI, b'users/me') is None
+
+        for key in keys[1:]:
+            router.remove(key)
+        assert router.resolve(MT.REQUEST_URI, b'users/42', host) == (keys[0], {})
+        router.remove(keys[0])
+        assert len(router) == 0
+        assert router._routes == {}
+
+    def test_LatencyHistogram(self):
+        histogram = netaio.LatencyHistogram()
+        assert histogram.percentile(50) == 0
+        for us in range(1, 10001):
+            histogram.record(us / 1_000_000)
+        assert histogram.count == 10000
+        assert histogram.min == 1 and histogram.max == 10000
+        # buckets are within about 6% of the recorded values
+        for p in (50, 90, 99, 99.9):
+            exact = 10000 * p / 100
+            assert exact <= histogram.percentile(p) <= exact * 1.07, p
+        assert histogram.percentile(100) == 10000
+        snapshot = histogram.snapshot()
+        assert snapshot['count'] == 10000
+        assert snapshot['mean_us'] == 5000.5
+        # large values only add a few buckets
+        histogram.record(3600.0)
+        assert len(histogram.counts) < 500
+
+    def test_Metrics_snapshot(self):
+        metrics = netaio.Metrics()
+        MT = netaio.MessageType
+        metrics.observe(MT.REQUEST_URI, (MT.REQUEST_URI, b'items/{id}'), {
+            'decode': 0.0001, 'handler': 0.002,
+        })
+        metrics.observe(MT.REQUEST_URI, None, {'handler': 0.001})
+        metrics.observe(MT.PUBLISH_URI, MT.PUBLISH_URI, {'handler': 0.001})
+        metrics.received(100)
+        metrics.sent(50)
+        metrics.add_gauge('answer', lambda: 42)
+        snapshot = metrics.snapshot()
+        assert snapshot['counters'] == {
+            'messages_in': 1, 'bytes_in': 100,
+            'messages_out': 1, 'bytes_out': 50,
+        }
+        assert snapshot['gauges'] == {'answer': 42}
+        assert set(snapshot['stages']['handler']) == {
+            'REQUEST_URI items/{id}', 'REQUEST_URI (default)', 'PUBLISH_URI',
+        }
+        assert snapshot['stages']['decode']['REQUEST_URI items/{id}']['count'] == 1
+        assert packify.unpack(packify.pack(snapshot)) == snapshot
+        metrics.reset()
+        assert metrics.snapshot()['stages'] == {}
+
+    def test_UDPNode_pattern_subscriptions(self):
+        node = netaio.UDPNode()
+        addr1, addr2 = ('0.0.0.0', 8888), ('0.0.0.0', 9999)
+        node.subscribe(b'sensors/*', addr1)
+        node.subscribe(b'sensors/**', addr2)
+        node.subscribe(b'sensors/1', addr2)
+        assert node.get_subscribers(b'sensors/1') == {addr1, addr2}
+        assert node.get_subscribers(b'sensors/1/temp') == {addr2}
+        assert node.get_subscribers(b'actuators/1') == set()
+
+        node.unsubscribe(b'sensors/**', addr2)
+        assert b'sensors/**' not in node.pattern_subscriptions
+        assert node.get_subscribers(b'sensors/1/temp') == set()
+        node.unsubscribe_all(addr1)
+        assert len(node.pattern_subscriptions) == 0
+        assert node.get_subscribers(b'sensors/1') == {addr2}
+
     def test_make_error_msg(self):
         msg = netaio.make_error_msg("test error")
         assert msg.header.message_type == netaio.MessageType.ERROR
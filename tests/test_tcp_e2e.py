@@ -1,10 +1,19 @@
 from context import netaio, asymmetric
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from nacl.signing import SigningKey
 from os import urandom
 from random import randint
+from unittest import mock
 import asyncio
 import logging
+import multiprocessing
+import os
+import packify
+import shutil
 import tapescript
+import tempfile
+import threading
+import time
 import unittest
 
 
@@ -1057,6 +1066,139 @@ class TestTCPE2E(unittest.TestCase):
         print(f'{self.__class__.__name__}.test_server_broadcast')
         asyncio.run(run_test())
 
+    def test_server_pattern_subscriptions(self):
+        async def run_test():
+            server = netaio.TCPServer(port=self.PORT)
+            client = netaio.TCPClient(port=self.PORT)
+            second_client = netaio.TCPClient(port=self.PORT)
+
+            @server.on(netaio.MessageType.SUBSCRIBE_URI)
+            def server_subscribe(message: netaio.Message, writer):
+                server.subscribe(message.body.uri, writer)
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=message.body.uri),
+                    netaio.MessageType.CONFIRM_SUBSCRIBE
+                )
+
+            def notification(uri: bytes) -> netaio.Message:
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(uri, uri=uri),
+                    netaio.MessageType.NOTIFY_URI
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+            await second_client.connect()
+
+            for c, pattern in ((client, b'sensors/*'), (second_client, b'sensors/**')):
+                await c.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=pattern),
+                    netaio.MessageType.SUBSCRIBE_URI
+                ))
+                response = await c.receive_once()
+                assert response is not None
+                assert response.header.message_type is \
+                    netaio.MessageType.CONFIRM_SUBSCRIBE
+
+            # only matching URIs reach each client
+            await server.notify(b'sensors/1/temp', notification(b'sensors/1/temp'))
+            await server.notify(b'actuators/1', notification(b'actuators/1'))
+            await server.notify(b'sensors/2', notification(b'sensors/2'))
+            response = await client.receive_once()
+            assert response is not None
+            assert response.body.content == b'sensors/2', response.body.content
+            response = await second_client.receive_once()
+            assert response is not None
+            assert response.body.content == b'sensors/1/temp', response.body.content
+            response = await second_client.receive_once()
+            assert response is not None
+            assert response.body.content == b'sensors/2', response.body.content
+
+            # disconnecting removes the pattern subscription
+            await client.close()
+            await second_client.close()
+            await asyncio.sleep(0.1)
+            assert len(server.pattern_subscriptions) == 0
+            assert server.subscriptions == {}
+
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_server_pattern_subscriptions')
+        asyncio.run(run_test())
+
+    def test_server_parameterized_routes(self):
+        async def run_test():
+            def default_handler(message: netaio.Message, writer):
+                # params left over from a previous route must not leak
+                params = netaio.get_route_params()
+                return netaio.make_not_found_msg(
+                    b','.join(params.values()), message.body.uri
+                )
+
+            server = netaio.TCPServer(
+                port=self.PORT, default_handler=default_handler
+            )
+            client = netaio.TCPClient(port=self.PORT)
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'users/{id}'))
+            def get_user(message: netaio.Message, writer):
+                user_id = netaio.get_route_params()['id']
+                return netaio.make_respond_uri_msg(b'user ' + user_id, message.body.uri)
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'users/me'))
+            def get_me(message: netaio.Message, writer):
+                return netaio.make_respond_uri_msg(b'me', message.body.uri)
+
+            @server.once(netaio.MessageType.PUBLISH_URI)
+            def publish_once(message: netaio.Message, writer):
+                return netaio.make_ok_msg()
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+
+            for uri, expected in (
+                (b'users/42', b'user 42'), (b'users/me', b'me'),
+                (b'users/7', b'user 7'), (b'groups/7', b''),
+            ):
+                await client.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=uri),
+                    netaio.MessageType.REQUEST_URI
+                ))
+                response = await client.receive_once()
+                assert response is not None
+                assert response.body.content == expected, response.body.content
+
+            # ephemeral handlers are removed from the router once called
+            assert netaio.MessageType.PUBLISH_URI in server.router
+            for expected in (netaio.MessageType.OK, netaio.MessageType.NOT_FOUND):
+                await client.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=b'topic'),
+                    netaio.MessageType.PUBLISH_URI
+                ))
+                response = await client.receive_once()
+                assert response is not None
+                assert response.header.message_type is expected, \
+                    response.header.message_type
+            assert netaio.MessageType.PUBLISH_URI not in server.router
+
+            await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_server_parameterized_routes')
+        asyncio.run(run_test())
+
 
 class TestTCPE2EWithoutDefaultPlugins(unittest.TestCase):
     PORT = randint(10000, 65535)
@@ -1347,5 +1489,1888 @@ class TestTCPE2ETwoLayersOfPlugins(unittest.TestCase):
         asyncio.run(run_test())
 
 
+class TestTCPE2EBufferedProtocol(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_e2e_buffered_protocol(self):
+        async def run_test():
+            server_log: list[netaio.Message] = []
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, use_buffered_protocol=True
+            )
+            client = netaio.TCPClient(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, use_buffered_protocol=True
+            )
+            stream_client = netaio.TCPClient(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin
+            )
+
+            @server.on((netaio.MessageType.PUBLISH_URI, b'echo'))
+            def server_echo(message: netaio.Message, writer):
+                assert isinstance(writer, netaio.FrameProtocol)
+                server_log.append(message)
+                return netaio.Message.prepare(
+                    message.body, netaio.MessageType.OK
+                )
+
+            @server.on(netaio.MessageType.SUBSCRIBE_URI)
+            def server_subscribe(message: netaio.Message, writer):
+                server.subscribe(message.body.uri, writer)
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=message.body.uri),
+                    netaio.MessageType.CONFIRM_SUBSCRIBE
+                )
+
+            def echo_msg(content: bytes) -> netaio.Message:
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(content, uri=b'echo'),
+                    netaio.MessageType.PUBLISH_URI
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+            await stream_client.connect()
+
+            # pipeline many frames so that several arrive in one read
+            contents = [f'hello {i}'.encode() for i in range(50)]
+            reader, writer = client.hosts[client.default_host]
+            assert isinstance(reader, netaio.FrameProtocol)
+            for content in contents:
+                msg = echo_msg(content)
+                auth_plugin.make(msg.auth_data, msg.body, client, None, None)
+                msg = cipher_plugin.encrypt(msg, client, None, None)
+                auth_plugin.make(msg.auth_data, msg.body, client, None, None)
+                writer.write(msg.encode())
+            await writer.drain()
+            for content in contents:
+                response = await client.receive_once()
+                assert response is not None
+                assert response.header.message_type is netaio.MessageType.OK
+                assert response.body.content == content, response.body.content
+            assert [m.body.content for m in server_log] == contents
+
+            # a frame larger than the initial receive buffer
+            big = b'x' * 60_000
+            await client.send(echo_msg(big))
+            response = await client.receive_once()
+            assert response is not None
+            assert response.body.content == big
+
+            # stream-mode clients interoperate with a buffered server
+            await stream_client.send(echo_msg(b'stream'))
+            response = await stream_client.receive_once()
+            assert response is not None
+            assert response.body.content == b'stream'
+
+            # protocol writers can be subscribed and notified
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'sub'),
+                netaio.MessageType.SUBSCRIBE_URI
+            ))
+            response = await client.receive_once()
+            assert response is not None
+            assert response.header.message_type is \
+                netaio.MessageType.CONFIRM_SUBSCRIBE
+            await server.notify(b'sub', netaio.Message.prepare(
+                netaio.Body.prepare(b'news', uri=b'sub'),
+                netaio.MessageType.NOTIFY_URI
+            ))
+            response = await client.receive_once()
+            assert response is not None
+            assert response.body.content == b'news'
+
+            # disconnects are detected and cleaned up
+            await client.close()
+            await stream_client.close()
+            await asyncio.sleep(0.1)
+            assert len(server.clients) == 0
+            assert b'sub' not in server.subscriptions
+
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_e2e_buffered_protocol')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EPipelined(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def run_pipelined(
+            self, port: int, ordered_responses: bool,
+            use_buffered_protocol: bool = False
+        ) -> tuple[list[bytes], list[bytes], int]:
+        """Send two slow requests followed by two fast ones to a server
+            with `max_in_flight=3`. Returns the order in which the
+            handlers finished, the order in which the responses arrived,
+            and the highest number of handlers running at once.
+        """
+        async def run_test():
+            finished: list[bytes] = []
+            running = 0
+            most_running = 0
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            server = netaio.TCPServer(
+                port=port, auth_plugin=auth_plugin, max_in_flight=3,
+                ordered_responses=ordered_responses,
+                use_buffered_protocol=use_buffered_protocol,
+            )
+            client = netaio.TCPClient(
+                port=port, auth_plugin=auth_plugin,
+                use_buffered_protocol=use_buffered_protocol,
+            )
+
+            @server.on(netaio.MessageType.REQUEST_URI)
+            async def handler(message: netaio.Message, _):
+                nonlocal running, most_running
+                running += 1
+                most_running = max(most_running, running)
+                if message.body.uri.startswith(b'slow'):
+                    await asyncio.sleep(0.2)
+                finished.append(message.body.uri)
+                running -= 1
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=message.body.uri),
+                    netaio.MessageType.RESPOND_URI
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+
+            uris = [b'slow 1', b'slow 2', b'fast 1', b'fast 2']
+            for uri in uris:
+                await client.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=uri),
+                    netaio.MessageType.REQUEST_URI
+                ))
+            received = []
+            for _ in uris:
+                response = await client.receive_once()
+                assert response is not None
+                received.append(response.body.uri)
+
+            await client.close()
+            await asyncio.sleep(0.1)
+            assert len(server.clients) == 0
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+            return finished, received, most_running
+
+        return asyncio.run(run_test())
+
+    def test_pipelined_completion_order(self):
+        print()
+        print(f'{self.__class__.__name__}.test_pipelined_completion_order')
+        finished, received, most_running = self.run_pipelined(
+            self.PORT, ordered_responses=False
+        )
+        # the fast request ran while both slow ones were in flight
+        assert finished[0] == b'fast 1', finished
+        assert received == finished, (received, finished)
+        assert most_running == 3, most_running
+
+    def test_pipelined_request_order(self):
+        print()
+        print(f'{self.__class__.__name__}.test_pipelined_request_order')
+        finished, received, most_running = self.run_pipelined(
+            self.PORT + 1 if self.PORT < 65535 else self.PORT - 1,
+            ordered_responses=True, use_buffered_protocol=True
+        )
+        assert finished[0] == b'fast 1', finished
+        assert received == [b'slow 1', b'slow 2', b'fast 1', b'fast 2'], \
+            received
+        assert most_running == 3, most_running
+
+
+
+class TestTCPE2ERequestIds(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_concurrent_requests_for_same_uri(self):
+        async def run_test():
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, max_in_flight=32,
+                ordered_responses=False, request_id_field='rid',
+            )
+            client = netaio.TCPClient(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, request_id_field='rid',
+            )
+
+            @server.on(netaio.MessageType.REQUEST_URI)
+            async def server_request(message: netaio.Message, _):
+                # finish in a different order than received
+                await asyncio.sleep(randint(0, 20) / 1000)
+                if message.body.uri == b'slow/uri':
+                    await asyncio.sleep(0.1)
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(
+                        message.body.content, uri=message.body.uri
+                    ),
+                    netaio.MessageType.RESPOND_URI
+                )
+
+            @server.on(netaio.MessageType.CREATE_URI)
+            def server_create(message: netaio.Message, _):
+                return netaio.make_ok_msg(b'created', message.body.uri)
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+
+            contents = [f'{i}'.encode() for i in range(200)]
+            responses = await asyncio.gather(*[
+                client.request(b'same/uri', content=content)
+                for content in contents
+            ])
+            for content, response in zip(contents, responses):
+                assert response.header.message_type is \
+                    netaio.MessageType.RESPOND_URI
+                assert response.body.content == content, \
+                    (response.body.content, content)
+
+            response = await client.create(b'new/uri', b'data')
+            assert response.header.message_type is netaio.MessageType.OK
+            response = await client.delete(b'missing/uri')
+            assert response.header.message_type is \
+                netaio.MessageType.NOT_FOUND
+
+            # no ephemeral handlers were used and nothing is left over
+            assert client.ephemeral_handlers == {}
+            assert client.pending_requests == {}
+            assert await client.get_receive_loops() == {}
+
+            # requests without an ID get no ID back
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'plain', uri=b'same/uri'),
+                netaio.MessageType.REQUEST_URI
+            ))
+            response = await client.receive_once()
+            assert response is not None
+            assert 'rid' not in response.auth_data.fields
+
+            # a response that fails auth fails its request at once
+            task = asyncio.create_task(
+                client.request_by_id(b'slow/uri', timeout=5)
+            )
+            await asyncio.sleep(0.05)
+            client.auth_plugin = netaio.HMACAuthPlugin(config={"secret": "other"})
+            with self.assertRaises(ValueError):
+                await asyncio.wait_for(task, 1)
+            assert client.pending_requests == {}
+            client.auth_plugin = auth_plugin
+
+            with self.assertRaises(TimeoutError):
+                server.request_id_field = None
+                await client.request(b'same/uri', timeout=0.2)
+            assert client.pending_requests == {}
+
+            await client.close()
+            await asyncio.sleep(0.1)
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_concurrent_requests_for_same_uri')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EOutboundQueues(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_outbound_queues_coalesce_writes(self):
+        async def run_test():
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, use_outbound_queues=True,
+            )
+            client = netaio.TCPClient(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin,
+            )
+
+            @server.on(netaio.MessageType.SUBSCRIBE_URI)
+            def server_subscribe(message: netaio.Message, writer):
+                server.subscribe(message.body.uri, writer)
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=message.body.uri),
+                    netaio.MessageType.CONFIRM_SUBSCRIBE
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+
+            # responses go through the queue
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'topic'),
+                netaio.MessageType.SUBSCRIBE_URI
+            ))
+            response = await client.receive_once()
+            assert response is not None
+            assert response.header.message_type is \
+                netaio.MessageType.CONFIRM_SUBSCRIBE
+            assert len(server.outbound) == 1
+            queue = list(server.outbound.values())[0]
+            assert queue.messages_sent == 1
+            writes = queue.writes
+
+            # a burst of notifications is written with few syscalls
+            for i in range(100):
+                await server.notify(b'topic', netaio.Message.prepare(
+                    netaio.Body.prepare(f'{i}'.encode(), uri=b'topic'),
+                    netaio.MessageType.NOTIFY_URI
+                ))
+            await server.broadcast(netaio.Message.prepare(
+                netaio.Body.prepare(b'all', uri=b'broadcast'),
+                netaio.MessageType.NOTIFY_URI
+            ))
+            await queue.flush()
+            assert queue.messages_sent == 102, queue.messages_sent
+            assert queue.writes - writes <= 2, queue.writes - writes
+
+            for i in range(100):
+                response = await client.receive_once()
+                assert response is not None
+                assert response.body.content == f'{i}'.encode()
+            response = await client.receive_once()
+            assert response is not None
+            assert response.body.content == b'all'
+
+            # the queue is closed when the client disconnects
+            await client.close()
+            await asyncio.sleep(0.1)
+            assert server.outbound == {}
+            assert queue.closed
+            assert not server.send_nowait(queue.writer, netaio.make_ok_msg())
+
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_outbound_queues_coalesce_writes')
+        asyncio.run(run_test())
+
+    def test_slow_consumer_policies(self):
+        async def run_test():
+            server = netaio.TCPServer(
+                port=self.PORT,
+                slow_consumer_policy=netaio.SlowConsumerPolicy(
+                    max_buffered_messages=3,
+                ),
+            )
+            client = netaio.TCPClient(port=self.PORT)
+
+            @server.on(netaio.MessageType.SUBSCRIBE_URI)
+            def server_subscribe(message: netaio.Message, writer):
+                server.subscribe(message.body.uri, writer)
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=message.body.uri),
+                    netaio.MessageType.CONFIRM_SUBSCRIBE
+                )
+
+            def notification(content: bytes) -> netaio.Message:
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(content, uri=b'topic'),
+                    netaio.MessageType.NOTIFY_URI
+                )
+
+            async def receive_contents(count: int) -> list[bytes]:
+                contents = []
+                for _ in range(count):
+                    response = await client.receive_once()
+                    assert response is not None
+                    contents.append(response.body.content)
+                return contents
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            assert server.use_outbound_queues
+            await client.connect()
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'topic'),
+                netaio.MessageType.SUBSCRIBE_URI
+            ))
+            assert (await client.receive_once()) is not None
+            writer, queue = list(server.outbound.items())[0]
+
+            # the writer task does not run until this coroutine yields,
+            # so the notifications below pile up in the queue
+            for i in range(5):
+                await server.notify(b'topic', notification(f'{i}'.encode()))
+            assert len(queue) == 3
+            assert queue.counters['drop_oldest'] == 2
+            assert await receive_contents(3) == [b'2', b'3', b'4']
+
+            server.set_slow_consumer_policy(writer, netaio.SlowConsumerPolicy(
+                max_buffered_messages=3,
+                action=netaio.OverflowAction.DROP_NEWEST,
+            ))
+            for i in range(5):
+                await server.notify(b'topic', notification(f'{i}'.encode()))
+            assert queue.counters['drop_newest'] == 2
+            assert await receive_contents(3) == [b'0', b'1', b'2']
+
+            # conflation replaces the queued frame with the same key
+            server.set_slow_consumer_policy(writer, netaio.SlowConsumerPolicy(
+                max_buffered_bytes=1,
+                action=netaio.OverflowAction.CONFLATE,
+            ))
+            for i in range(5):
+                await server.notify(b'topic', notification(f'{i}'.encode()))
+            assert len(queue) == 1
+            assert queue.counters['conflate'] == 4
+            assert await receive_contents(1) == [b'4']
+
+            # the counters are shared across connections
+            counters = server.slow_consumer_counters
+            assert counters['drop_oldest'] == 2
+            assert counters['drop_newest'] == 2
+            assert counters['conflate'] == 4
+
+            # a disconnect closes the connection and drops the subscriber
+            server.set_slow_consumer_policy(writer, netaio.SlowConsumerPolicy(
+                max_buffered_messages=1,
+                action=netaio.OverflowAction.DISCONNECT,
+            ))
+            for i in range(2):
+                await server.notify(b'topic', notification(f'{i}'.encode()))
+            assert queue.closed
+            assert counters['disconnect'] == 1
+            await asyncio.sleep(0.1)
+            assert server.outbound == {}
+            assert writer not in server.clients
+            assert writer not in server.subscriptions.get(b'topic', set())
+            assert writer not in server.subscribed_keys
+
+            await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_slow_consumer_policies')
+        asyncio.run(run_test())
+
+    def test_stalled_consumer_is_dropped(self):
+        async def run_test():
+            server = netaio.TCPServer(
+                port=self.PORT + 1,
+                slow_consumer_policy=netaio.SlowConsumerPolicy(
+                    send_timeout=0.1,
+                ),
+            )
+            client = netaio.TCPClient(port=self.PORT + 1)
+
+            @server.on(netaio.MessageType.SUBSCRIBE_URI)
+            def server_subscribe(message: netaio.Message, writer):
+                server.subscribe(message.body.uri, writer)
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=message.body.uri),
+                    netaio.MessageType.CONFIRM_SUBSCRIBE
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'topic'),
+                netaio.MessageType.SUBSCRIBE_URI
+            ))
+            assert (await client.receive_once()) is not None
+            writer, queue = list(server.outbound.items())[0]
+
+            # the client stops reading, so the server's buffers fill up
+            # and a drain never finishes
+            notification = netaio.Message.prepare(
+                netaio.Body.prepare(b'x' * 60_000, uri=b'topic'),
+                netaio.MessageType.NOTIFY_URI
+            )
+            for _ in range(2000):
+                if queue.closed:
+                    break
+                await server.notify(b'topic', notification)
+                await asyncio.sleep(0.001)
+            assert queue.closed
+            assert queue.counters['send_timeout'] == 1
+            await asyncio.sleep(0.1)
+            assert writer not in server.clients
+            assert server.outbound == {}
+            assert writer not in server.subscribed_keys
+
+            await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_stalled_consumer_is_dropped')
+        asyncio.run(run_test())
+
+def process_echo(message: netaio.Message, _) -> netaio.Message:
+    """Handler run in a `ProcessPoolExecutor` by `TestTCPE2EOffload`."""
+    return netaio.make_respond_uri_msg(str(os.getpid()), message.body.uri)
+
+
+class TestTCPE2EOffload(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_offloaded_handlers_and_plugins(self):
+        async def run_test():
+            threads = netaio.Offloader(max_pending=2)
+            processes = netaio.Offloader(ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context('fork')
+            ))
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            make_threads = []
+
+            class ThreadRecordingAuthPlugin(netaio.HMACAuthPlugin):
+                def make(self, *args, **kwargs):
+                    make_threads.append(threading.get_ident())
+                    return super().make(*args, **kwargs)
+
+            server = netaio.TCPServer(
+                port=self.PORT,
+                auth_plugin=netaio.OffloadedPlugin(
+                    ThreadRecordingAuthPlugin(config={"secret": "test"}),
+                    threads
+                ),
+            )
+            clients = [
+                netaio.TCPClient(port=self.PORT, auth_plugin=auth_plugin)
+                for _ in range(2)
+            ]
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'slow'), offloader=threads)
+            def slow(message: netaio.Message, _):
+                time.sleep(0.3)
+                return netaio.make_respond_uri_msg(b'slow', b'slow')
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'fast'))
+            def fast(message: netaio.Message, _):
+                return netaio.make_respond_uri_msg(b'fast', b'fast')
+
+            server.add_handler(
+                (netaio.MessageType.REQUEST_URI, b'process'), process_echo,
+                offloader=processes
+            )
+
+            with self.assertRaises(TypeError):
+                async def handler(message, _):
+                    pass
+                threads.wrap_handler(handler)
+            with self.assertRaises(TypeError):
+                netaio.OffloadedPlugin(auth_plugin, processes)
+            with self.assertRaises(ValueError):
+                netaio.Offloader(max_pending=0)
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            for client in clients:
+                await client.connect()
+
+            def request(uri: bytes) -> netaio.Message:
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=uri),
+                    netaio.MessageType.REQUEST_URI
+                )
+
+            # the slow handler does not block the other connection
+            await clients[0].send(request(b'slow'))
+            await asyncio.sleep(0.05)
+            await clients[1].send(request(b'fast'))
+            order = []
+
+            async def receive(client):
+                response = await client.receive_once()
+                assert response is not None
+                order.append(response.body.content)
+
+            await asyncio.gather(*[receive(c) for c in clients])
+            assert order == [b'fast', b'slow'], order
+
+            # process handlers receive and return encoded messages
+            await clients[0].send(request(b'process'))
+            response = await clients[0].receive_once()
+            assert response is not None
+            assert int(response.body.content) != os.getpid()
+
+            # messages sent by the server are also prepared in threads
+            make_threads.clear()
+            await server.broadcast(request(b'everyone'))
+            for writer in list(server.clients):
+                await server.send(writer, request(b'one'))
+            for client in clients:
+                for uri in (b'everyone', b'one'):
+                    response = await client.receive_once()
+                    assert response is not None
+                    assert response.body.uri == uri, response.body.uri
+            assert len(make_threads) == 3, make_threads
+            assert threading.get_ident() not in make_threads
+
+            for client in clients:
+                await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+            threads.shutdown()
+            processes.shutdown()
+
+        print()
+        print(f'{self.__class__.__name__}.test_offloaded_handlers_and_plugins')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EWatchdog(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_watchdog_records_and_migrates_slow_handlers(self):
+        async def run_test():
+            threads = netaio.Offloader()
+            slow_calls = []
+            watchdog = netaio.Watchdog(
+                0.05, lag_interval=0.01, offloader=threads, migrate_after=2,
+                on_slow_call=lambda key, elapsed: slow_calls.append(key),
+            )
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin, watchdog=watchdog
+            )
+            client = netaio.TCPClient(port=self.PORT, auth_plugin=auth_plugin)
+            slow_key = (netaio.MessageType.REQUEST_URI, b'slow')
+            blocking_key = (netaio.MessageType.REQUEST_URI, b'blocking')
+            fast_key = (netaio.MessageType.REQUEST_URI, b'fast')
+
+            @server.on(slow_key)
+            def slow(message: netaio.Message, _):
+                time.sleep(0.1)
+                return netaio.make_respond_uri_msg(b'slow', b'slow')
+
+            @server.on(blocking_key)
+            async def blocking(message: netaio.Message, _):
+                await asyncio.sleep(0.1)
+                time.sleep(0.1)
+                return netaio.make_respond_uri_msg(b'blocking', b'blocking')
+
+            @server.on(fast_key)
+            def fast(message: netaio.Message, _):
+                return netaio.make_respond_uri_msg(b'fast', b'fast')
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+
+            async def request(uri: bytes) -> bytes:
+                await client.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=uri),
+                    netaio.MessageType.REQUEST_URI
+                ))
+                response = await client.receive_once()
+                assert response is not None
+                return response.body.content
+
+            for _ in range(3):
+                assert await request(b'slow') == b'slow'
+            assert await request(b'blocking') == b'blocking'
+            assert await request(b'fast') == b'fast'
+
+            # the sync handler was migrated after two slow calls
+            stats = watchdog.stats[slow_key]
+            assert stats.calls == 3, stats
+            assert stats.slow_calls == 2, stats
+            assert stats.migrated
+
+            # only the blocking step of a coroutine handler counts
+            stats = watchdog.stats[blocking_key]
+            assert stats.slow_calls == 1, stats
+            assert 0.1 <= stats.max_time < 0.2, stats
+            assert not stats.migrated
+
+            assert watchdog.stats[fast_key].slow_calls == 0
+            assert ('auth_plugin', 'check') in watchdog.stats
+            assert ('auth_plugin', 'make') in watchdog.stats
+            assert [key for key, _ in watchdog.top()] == [slow_key, blocking_key]
+            assert len(watchdog.top(1)) == 1
+
+            # the blocking calls delayed the event loop
+            assert watchdog.lag_over_budget >= 1
+            assert watchdog.max_lag >= 0.05
+            assert slow_calls.count(slow_key) == 2
+            assert 'loop_lag' in slow_calls
+
+            await client.close()
+            await server.stop()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+            threads.shutdown()
+
+        print()
+        print(f'{self.__class__.__name__}.test_watchdog_records_and_migrates_slow_handlers')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EMetrics(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_server_metrics_and_stats_uri(self):
+        async def run_test():
+            metrics = netaio.Metrics()
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, metrics=metrics,
+                use_outbound_queues=True,
+            )
+            client = netaio.TCPClient(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin
+            )
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'items/{id}'))
+            def item(message: netaio.Message, writer):
+                server.subscribe(b'items', writer)
+                return netaio.make_respond_uri_msg(
+                    netaio.get_route_params()['id'], b'items'
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+
+            async def request(uri: bytes) -> netaio.Message:
+                await client.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=uri),
+                    netaio.MessageType.REQUEST_URI
+                ))
+                response = await client.receive_once()
+                assert response is not None
+                return response
+
+            for i in range(3):
+                response = await request(f'items/{i}'.encode())
+                assert response.body.content == str(i).encode()
+            response = await request(b'missing')
+            assert response.header.message_type is netaio.MessageType.NOT_FOUND
+
+            response = await request(netaio.STATS_URI)
+            snapshot = packify.unpack(response.body.content)
+            assert snapshot['counters']['messages_in'] == 5
+            assert snapshot['counters']['messages_out'] == 4
+            assert snapshot['counters']['bytes_in'] > 0
+            assert snapshot['counters']['connections_opened'] == 1
+            assert snapshot['gauges']['connections'] == 1
+            assert snapshot['gauges']['subscriptions'] == 1
+            assert snapshot['gauges']['queued_messages'] == 0
+
+            route = 'REQUEST_URI items/{id}'
+            stages = snapshot['stages']
+            for stage in (
+                'decode', 'outer_auth', 'outer_cipher', 'routing',
+                'handler', 'encode', 'write',
+            ):
+                assert stages[stage][route]['count'] == 3, stage
+            assert 'inner_cipher' not in stages
+            assert stages['handler']['REQUEST_URI (default)']['count'] == 1
+            assert stages['handler'][route]['p99_us'] >= \
+                stages['handler'][route]['p50_us']
+
+            await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_server_metrics_and_stats_uri')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EAdmission(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_admission_control_sheds_before_plugins(self):
+        async def run_test():
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin, max_in_flight=4,
+                admission_policy=netaio.AdmissionPolicy(
+                    max_connections=1, connection_rate=0.001,
+                    connection_burst=3, max_in_flight=1, respond=True,
+                ),
+            )
+            client = netaio.TCPClient(
+                port=self.PORT,
+                auth_plugin=netaio.HMACAuthPlugin(config={"secret": "test"})
+            )
+            admission = server.admission
+            assert admission is not None
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'slow'))
+            async def slow(message: netaio.Message, _):
+                await asyncio.sleep(0.2)
+                return netaio.make_respond_uri_msg(b'slow', b'slow')
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'fast'))
+            def fast(message: netaio.Message, _):
+                return netaio.make_respond_uri_msg(b'fast', b'fast')
+
+            def request(uri: bytes) -> netaio.Message:
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=uri),
+                    netaio.MessageType.REQUEST_URI
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+
+            # a second connection is closed by the server
+            other = netaio.TCPClient(port=self.PORT, auth_plugin=auth_plugin)
+            await other.connect()
+            with self.assertRaises(asyncio.IncompleteReadError):
+                await other.receive_once()
+            assert admission.counters['connections_rejected'] == 1
+
+            with mock.patch.object(
+                auth_plugin, 'check', wraps=auth_plugin.check
+            ) as check:
+                # the global in-flight cap sheds the second message
+                await client.send(request(b'slow'))
+                await asyncio.sleep(0.05)
+                await client.send(request(b'fast'))
+                responses = [await client.receive_once(use_auth=False)]
+                responses.append(await client.receive_once())
+                assert [
+                    r.header.message_type for r in responses if r
+                ] == [netaio.MessageType.ERROR, netaio.MessageType.RESPOND_URI]
+                assert admission.counters['in_flight_limited'] == 1
+                assert admission.in_flight == 0
+
+                # the connection's burst of 3 is used up
+                for _ in range(2):
+                    await client.send(request(b'fast'))
+                    response = await client.receive_once()
+                    assert response is not None
+                    assert response.body.content == b'fast'
+                await client.send(request(b'fast'))
+                response = await client.receive_once(use_auth=False)
+                assert response is not None
+                assert response.header.message_type is netaio.MessageType.ERROR
+                assert admission.counters['connection_rate_limited'] == 1
+
+                # shed messages never reached the auth plugin
+                assert check.call_count == 3, check.call_count
+
+            await client.close()
+            await other.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_admission_control_sheds_before_plugins')
+        asyncio.run(run_test())
+
+
+class TestTCPE2ECompactConnections(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_compact_connections(self):
+        async def run_test():
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, compact_connections=True,
+                connection_buffer_size=64,
+            )
+            client = netaio.TCPClient(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin
+            )
+            peers_seen = []
+
+            @server.on((netaio.MessageType.PUBLISH_URI, b'echo'))
+            def server_echo(message: netaio.Message, writer):
+                assert isinstance(writer, netaio.Connection)
+                peers_seen.append(writer.peer)
+                return netaio.Message.prepare(
+                    message.body, netaio.MessageType.OK
+                )
+
+            def echo_msg(content: bytes) -> netaio.Message:
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(content, uri=b'echo'),
+                    netaio.MessageType.PUBLISH_URI
+                )
+
+            with self.assertRaises(ValueError):
+                netaio.TCPServer(compact_connections=True, max_in_flight=2)
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+            await asyncio.sleep(0.05)
+            assert len(server.clients) == 1
+            connection = next(iter(server.clients))
+            assert isinstance(connection, netaio.Connection)
+            assert not hasattr(connection, '__dict__')
+            assert connection.get_extra_info('peername') == \
+                connection.transport.get_extra_info('peername')
+
+            # idle connections keep no task and a small buffer
+            assert connection._task is None
+            assert len(connection._buffer) == 64
+            big = b'x' * 10_000
+            await client.send(echo_msg(big))
+            response = await client.receive_once()
+            assert response is not None
+            assert response.body.content == big
+            await asyncio.sleep(0.05)
+            assert connection._task is None
+            assert len(connection._buffer) == 64
+
+            # the resolved peer is cached until the peer list changes
+            assert peers_seen == [None]
+            server.add_or_update_peer(
+                b'peer1', b'', connection.get_extra_info('peername')
+            )
+            await client.send(echo_msg(b'hello'))
+            response = await client.receive_once()
+            assert response is not None
+            assert response.body.content == b'hello'
+            assert peers_seen[-1] is server.peers[b'peer1']
+            server.remove_peer(connection, b'peer1')
+            await client.send(echo_msg(b'hello'))
+            response = await client.receive_once()
+            assert response is not None
+            assert peers_seen[-1] is None
+
+            # disconnects are cleaned up without a task per connection
+            await client.close()
+            await asyncio.sleep(0.1)
+            assert len(server.clients) == 0
+
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_compact_connections')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EKeepAlive(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_heartbeats_measure_rtt_and_reap_dead_clients(self):
+        async def run_test():
+            policy = netaio.KeepAlivePolicy(
+                interval=0.1, idle_timeout=0.4, resolution=0.05
+            )
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                keepalive_policy=policy
+            )
+            # only answers the server's PINGs
+            live = netaio.TCPClient(
+                port=self.PORT,
+                auth_plugin=netaio.HMACAuthPlugin(config={"secret": "test"}),
+                keepalive_policy=netaio.KeepAlivePolicy(
+                    interval=None, idle_timeout=None
+                )
+            )
+            # pings often enough that the server never has to
+            pinger = netaio.TCPClient(
+                port=self.PORT,
+                auth_plugin=netaio.HMACAuthPlugin(config={"secret": "test"}),
+                keepalive_policy=netaio.KeepAlivePolicy(
+                    interval=0.05, idle_timeout=0.4, resolution=0.01
+                )
+            )
+            # never reads, so never answers a PING
+            dead = netaio.TCPClient(port=self.PORT)
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            for client in (live, pinger):
+                await client.connect()
+                await client.start_receive_loop()
+            await dead.connect()
+            await asyncio.sleep(0.05)
+            assert len(server.clients) == 3
+
+            await asyncio.sleep(0.8)
+            assert len(server.clients) == 2
+            assert server.keepalive.counters['reaped'] == 1
+            assert any(
+                server.keepalive.rtt(writer) is not None
+                for writer in server.clients
+            )
+            assert pinger.keepalive.rtt(pinger.default_host) is not None
+            assert live.keepalive.counters['pings_sent'] == 0
+            assert pinger.keepalive.counters['reaped'] == 0
+
+            with self.assertRaises(ValueError):
+                netaio.TCPServer(
+                    message_type_class=netaio.make_message_type_class(
+                        'Custom', {}
+                    ),
+                    keepalive_policy=netaio.KeepAlivePolicy(interval=0),
+                )
+
+            await live.close()
+            await pinger.close()
+            await dead.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_heartbeats_measure_rtt_and_reap_dead_clients')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EResponseCache(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_response_cache_hits_and_invalidation(self):
+        async def run_test():
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+            cache = netaio.ResponseCache()
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, response_cache=cache,
+                metrics=netaio.Metrics(),
+            )
+            client = netaio.TCPClient(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin
+            )
+            data = {b'item': b'v1'}
+            calls = []
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'item'))
+            def request_item(message: netaio.Message, writer):
+                calls.append(message.body.uri)
+                return netaio.make_respond_uri_msg(
+                    data[b'item'], message.body.uri
+                )
+
+            @server.on((netaio.MessageType.UPDATE_URI, b'item'))
+            def update_item(message: netaio.Message, writer):
+                data[b'item'] = message.body.content
+                return netaio.make_ok_msg(uri=message.body.uri)
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await client.connect()
+            await client.start_receive_loop()
+
+            response = await client.request(b'item')
+            assert response.body.content == b'v1'
+            response = await client.request(b'item')
+            assert response.body.content == b'v1'
+            assert calls == [b'item']
+            assert cache.counters['hits'] == 1
+
+            # a successful write invalidates the cached response
+            response = await client.request(
+                b'item', message_type=netaio.MessageType.UPDATE_URI,
+                content=b'v2'
+            )
+            assert response.header.message_type is netaio.MessageType.OK
+            response = await client.request(b'item')
+            assert response.body.content == b'v2'
+            assert calls == [b'item', b'item']
+            assert cache.counters['invalidations'] == 1
+
+            # the stats URI is never cached
+            await client.request(netaio.STATS_URI)
+            await client.request(netaio.STATS_URI)
+            assert netaio.STATS_URI in cache.exclude
+            assert len(cache) == 1
+
+            await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_response_cache_hits_and_invalidation')
+        asyncio.run(run_test())
+
+    def test_response_cache_skips_responses_made_before_a_write(self):
+        async def run_test():
+            cache = netaio.ResponseCache()
+            server = netaio.TCPServer(port=self.PORT + 1, response_cache=cache)
+            reader = netaio.TCPClient(port=self.PORT + 1)
+            writer = netaio.TCPClient(port=self.PORT + 1)
+            data = {b'item': b'v1'}
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'item'))
+            async def request_item(message: netaio.Message, _):
+                value = data[b'item']
+                await asyncio.sleep(0.2)
+                return netaio.make_respond_uri_msg(value, message.body.uri)
+
+            @server.on((netaio.MessageType.UPDATE_URI, b'item'))
+            def update_item(message: netaio.Message, _):
+                data[b'item'] = message.body.content
+                return netaio.make_ok_msg(uri=message.body.uri)
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            await reader.connect()
+            await writer.connect()
+
+            # the update finishes while the slow request is in its handler
+            slow = asyncio.create_task(reader.request(b'item'))
+            await asyncio.sleep(0.05)
+            response = await writer.request(
+                b'item', message_type=netaio.MessageType.UPDATE_URI,
+                content=b'v2'
+            )
+            assert response.header.message_type is netaio.MessageType.OK
+            assert (await slow).body.content == b'v1'
+            assert cache.counters['stale'] == 1 and len(cache) == 0
+
+            response = await reader.request(b'item')
+            assert response.body.content == b'v2'
+            assert len(cache) == 1
+
+            await reader.close()
+            await writer.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(
+            f'{self.__class__.__name__}.'
+            'test_response_cache_skips_responses_made_before_a_write'
+        )
+        asyncio.run(run_test())
+
+    def test_response_cache_keeps_host_routes_apart(self):
+        async def run_test():
+            cache = netaio.ResponseCache()
+            server = netaio.TCPServer(port=self.PORT + 2, response_cache=cache)
+            clients = [netaio.TCPClient(port=self.PORT + 2) for _ in range(2)]
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'item'))
+            def request_item(message: netaio.Message, _):
+                return netaio.make_respond_uri_msg(b'public', b'item')
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            for client in clients:
+                await client.connect()
+            _, writer = clients[0].hosts[clients[0].default_host]
+            host = writer.get_extra_info('sockname')
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'item', host))
+            def request_own_item(message: netaio.Message, _):
+                return netaio.make_respond_uri_msg(b'private', b'item')
+
+            # the host-specific response is only served to its host
+            for _ in range(2):
+                response = await clients[0].request(b'item')
+                assert response.body.content == b'private'
+                response = await clients[1].request(b'item')
+                assert response.body.content == b'public'
+            assert cache.counters['hits'] == 2 and len(cache) == 2
+
+            for client in clients:
+                await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(
+            f'{self.__class__.__name__}.'
+            'test_response_cache_keeps_host_routes_apart'
+        )
+        asyncio.run(run_test())
+
+
+class TestTCPE2ERequestCoalescing(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_concurrent_requests_share_one_handler_call(self):
+        async def run_test():
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+            coalescer = netaio.RequestCoalescer()
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, request_coalescer=coalescer,
+                max_in_flight=4, request_id_field='rid',
+            )
+            clients = [
+                netaio.TCPClient(
+                    port=self.PORT, auth_plugin=auth_plugin,
+                    cipher_plugin=cipher_plugin, request_id_field='rid',
+                )
+                for _ in range(4)
+            ]
+            calls = []
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'hot/{id}'))
+            async def request_hot(message: netaio.Message, writer):
+                calls.append(message.body.uri)
+                await asyncio.sleep(0.1)
+                return netaio.make_respond_uri_msg(
+                    b'value of ' + message.body.uri, message.body.uri
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            for client in clients:
+                await client.connect()
+
+            requests = [
+                client.request_by_id(b'hot/1') for client in clients
+            ] + [
+                clients[0].request_by_id(b'hot/1'),
+                clients[1].request_by_id(b'hot/2'),
+            ]
+            responses = await asyncio.gather(*requests)
+            assert sorted(calls) == [b'hot/1', b'hot/2']
+            assert coalescer.counters['coalesced'] == 4
+            for response in responses[:5]:
+                assert response.body.content == b'value of hot/1'
+            assert responses[5].body.content == b'value of hot/2'
+            assert len(coalescer) == 0
+
+            for client in clients:
+                await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_concurrent_requests_share_one_handler_call')
+        asyncio.run(run_test())
+
+    def test_host_routes_are_not_shared_with_other_hosts(self):
+        async def run_test():
+            coalescer = netaio.RequestCoalescer()
+            server = netaio.TCPServer(
+                port=self.PORT + 1, request_coalescer=coalescer,
+            )
+            clients = [netaio.TCPClient(port=self.PORT + 1) for _ in range(2)]
+            writers = []
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'hot'))
+            async def request_hot(message: netaio.Message, writer):
+                writers.append(writer)
+                await asyncio.sleep(0.1)
+                return netaio.make_respond_uri_msg(b'public', b'hot')
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            for client in clients:
+                await client.connect()
+            _, writer = clients[0].hosts[clients[0].default_host]
+            host = writer.get_extra_info('sockname')
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'hot', host))
+            async def request_own_hot(message: netaio.Message, writer):
+                writers.append(writer)
+                await asyncio.sleep(0.1)
+                return netaio.make_respond_uri_msg(b'private', b'hot')
+
+            # each host's requests only share a call with its own handler
+            responses = await asyncio.gather(
+                clients[1].request(b'hot'), clients[0].request(b'hot'),
+            )
+            assert [r.body.content for r in responses] == [b'public', b'private']
+            assert len(writers) == 2 and writers[0] is not writers[1]
+            assert coalescer.counters == {'calls': 2}
+
+            for client in clients:
+                await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(
+            f'{self.__class__.__name__}.'
+            'test_host_routes_are_not_shared_with_other_hosts'
+        )
+        asyncio.run(run_test())
+
+
+class TestTCPE2EPeerOffloader(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_peer_specific_fan_out_runs_in_threads(self):
+        threads = set()
+
+        class PeerCipherPlugin(netaio.Sha256StreamCipherPlugin):
+            def encrypt(self, *args, **kwargs):
+                threads.add(threading.current_thread())
+                return super().encrypt(*args, **kwargs)
+
+            @staticmethod
+            def is_peer_specific() -> bool:
+                return True
+
+        async def run_test():
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            server = netaio.TCPServer(
+                port=self.PORT, auth_plugin=auth_plugin,
+                cipher_plugin=PeerCipherPlugin(config={"key": "test"}),
+                peer_offloader=netaio.Offloader(ThreadPoolExecutor(2)),
+                peer_batch_size=2,
+            )
+            clients = [
+                netaio.TCPClient(
+                    port=self.PORT, auth_plugin=auth_plugin,
+                    cipher_plugin=netaio.Sha256StreamCipherPlugin(
+                        config={"key": "test"}
+                    )
+                )
+                for _ in range(5)
+            ]
+            message = netaio.Message.prepare(
+                netaio.Body.prepare(b'hello', uri=b'news'),
+                netaio.MessageType.NOTIFY_URI
+            )
+
+            with self.assertRaises(TypeError):
+                netaio.TCPServer(
+                    peer_offloader=netaio.Offloader(ProcessPoolExecutor(1))
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            for client in clients:
+                await client.connect()
+            await asyncio.sleep(0.05)
+            for writer in list(server.clients)[:3]:
+                server.subscribe(b'news', writer)
+
+            await server.broadcast(message)
+            for client in clients:
+                response = await client.receive_once()
+                assert response is not None
+                assert response.body.content == b'hello'
+            assert threading.main_thread() not in threads
+            assert len(threads) > 0
+
+            await server.notify(b'news', message)
+            received = 0
+            for client in clients:
+                try:
+                    response = await asyncio.wait_for(
+                        client.receive_once(), 0.2
+                    )
+                except asyncio.TimeoutError:
+                    continue
+                assert response is not None
+                assert response.body.content == b'hello'
+                received += 1
+            assert received == 3
+
+            for client in clients:
+                await client.close()
+            server.peer_offloader.shutdown()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+
+        print()
+        print(f'{self.__class__.__name__}.test_peer_specific_fan_out_runs_in_threads')
+        asyncio.run(run_test())
+
+
+class TestTCPE2EUnixSocket(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_unix_socket_transport(self):
+        async def run_test(tmpdir: str, server_options: dict, client_options: dict):
+            path = os.path.join(tmpdir, 'netaio.sock')
+            auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+            cipher_plugin = netaio.Sha256StreamCipherPlugin(config={"key": "test"})
+            server = netaio.TCPServer(
+                path=path, auth_plugin=auth_plugin,
+                cipher_plugin=cipher_plugin, **server_options
+            )
+            clients = [
+                netaio.TCPClient(
+                    path=path, auth_plugin=auth_plugin,
+                    cipher_plugin=cipher_plugin, **client_options
+                )
+                for _ in range(2)
+            ]
+            addrs = []
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'echo'))
+            def echo(message: netaio.Message, writer):
+                addrs.append(server.address_of(writer))
+                server.subscribe(b'news', writer)
+                return netaio.make_respond_uri_msg(
+                    message.body.content, b'echo'
+                )
+
+            server_task = asyncio.create_task(server.start())
+            await asyncio.sleep(0.1)
+            assert os.path.exists(path)
+            for client in clients:
+                await client.connect()
+                assert (path, 0) in client.hosts
+                response = await client.request(b'echo', content=b'hello')
+                assert response.body.content == b'hello'
+
+            # connections are told apart by connection number
+            assert [a[0] for a in addrs] == [path, path]
+            assert addrs[0] != addrs[1]
+            writer = next(
+                w for w in server.clients if server.address_of(w) == addrs[0]
+            )
+            server.add_or_update_peer(b'peer1', b'', addrs[0])
+            assert server._lookup_peer(writer, addrs[0]) is server.peers[b'peer1']
+
+            await server.notify(b'news', netaio.Message.prepare(
+                netaio.Body.prepare(b'update', uri=b'news'),
+                netaio.MessageType.NOTIFY_URI
+            ))
+            for client in clients:
+                response = await client.receive_once()
+                assert response is not None
+                assert response.body.content == b'update'
+
+            with self.assertRaises(ValueError):
+                await netaio.TCPServer(path=path).start(reuse_port=True)
+
+            for client in clients:
+                await client.close()
+            server_task.cancel()
+            try:
+                await server_task
+            except asyncio.CancelledError:
+                pass
+            assert not os.path.exists(path)
+
+        print()
+        print(f'{self.__class__.__name__}.test_unix_socket_transport')
+        buffered = {'use_buffered_protocol': True}
+        for server_options, client_options in (
+            ({}, {}),
+            (buffered, buffered),
+            ({'compact_connections': True}, {}),
+        ):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                asyncio.run(run_test(tmpdir, server_options, client_options))
+
+    def test_unix_default_is_not_used_for_tcp_hosts(self):
+        async def run_test(tmpdir: str):
+            path = os.path.join(tmpdir, 'netaio.sock')
+            other_path = os.path.join(tmpdir, 'other.sock')
+            unix_server = netaio.TCPServer(path=path)
+            other_server = netaio.TCPServer(path=other_path)
+            tcp_server = netaio.TCPServer(
+                interface='127.0.0.1', port=self.PORT
+            )
+            client = netaio.TCPClient(path=path, port=self.PORT)
+            tasks = [
+                asyncio.create_task(server.start())
+                for server in (unix_server, other_server, tcp_server)
+            ]
+            await asyncio.sleep(0.1)
+
+            # a TCP host gets the TCP port, not the Unix default's 0
+            await client.connect(host='127.0.0.1')
+            assert ('127.0.0.1', self.PORT) in client.hosts
+            assert len(tcp_server.clients) == 1
+
+            # port 0 only means a Unix socket for known paths
+            with self.assertRaises(OSError):
+                await client.connect(other_path, 0)
+            assert len(other_server.clients) == 0
+            await client.connect(path, 0)
+            assert (path, 0) in client.hosts
+            await client.connect(path=other_path)
+            assert client.unix_paths == {path, other_path}
+            await asyncio.sleep(0.1)
+            assert len(unix_server.clients) == 1
+            assert len(other_server.clients) == 1
+
+            for server in list(client.hosts):
+                await client.close(server)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        print()
+        print(f'{self.__class__.__name__}.test_unix_default_is_not_used_for_tcp_hosts')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            asyncio.run(run_test(tmpdir))
+
+
+class TestTCPE2EWorkerPool(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_worker_pool_serves_and_restarts_workers(self):
+        auth_plugin = netaio.HMACAuthPlugin(config={"secret": "test"})
+        server = netaio.TCPServer(
+            port=self.PORT, interface='127.0.0.1', auth_plugin=auth_plugin
+        )
+
+        @server.on((netaio.MessageType.REQUEST_URI, b'pid'))
+        def pid(message: netaio.Message, _):
+            return netaio.make_respond_uri_msg(str(os.getpid()), b'pid')
+
+        @server.on((netaio.MessageType.REQUEST_URI, b'crash'))
+        def crash(message: netaio.Message, _):
+            os._exit(1)
+
+        async def request_pid() -> int:
+            client = netaio.TCPClient(
+                host='127.0.0.1', port=self.PORT, auth_plugin=auth_plugin
+            )
+            await client.connect()
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'pid'),
+                netaio.MessageType.REQUEST_URI
+            ))
+            response = await client.receive_once()
+            await client.close()
+            assert response is not None
+            return int(response.body.content)
+
+        async def run_test():
+            await asyncio.sleep(0.5)
+            pids = {await request_pid() for _ in range(8)}
+            assert pids <= set(pool.pids), (pids, pool.pids)
+
+            # a crashed worker is replaced
+            old_pids = set(pool.pids)
+            client = netaio.TCPClient(
+                host='127.0.0.1', port=self.PORT, auth_plugin=auth_plugin
+            )
+            await client.connect()
+            await client.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'crash'),
+                netaio.MessageType.REQUEST_URI
+            ))
+            restarted = await asyncio.get_running_loop().run_in_executor(
+                None, pool.poll, 5.0
+            )
+            await client.close()
+            assert len(restarted) == 1, restarted
+            assert pool.restarts[restarted[0]] == 1
+            assert len(pool.pids) == 2
+            assert set(pool.pids) != old_pids
+            await asyncio.sleep(0.5)
+            pids = {await request_pid() for _ in range(8)}
+            assert pids <= set(pool.pids), (pids, pool.pids)
+
+        with self.assertRaises(ValueError):
+            netaio.WorkerPool(server, 0)
+        with self.assertRaises(ValueError):
+            netaio.WorkerPool(netaio.TCPServer(path='/tmp/netaio.sock'), 2)
+
+        pool = netaio.WorkerPool(server, 2, restart_delay=0)
+        pool.start()
+        try:
+            print()
+            print(f'{self.__class__.__name__}.test_worker_pool_serves_and_restarts_workers')
+            asyncio.run(run_test())
+        finally:
+            pool.stop()
+        assert pool.pids == []
+
+    def test_worker_bus_forwards_notify_and_broadcast(self):
+        port = self.PORT + 1
+        server = netaio.TCPServer(port=port, interface='127.0.0.1')
+
+        @server.on(netaio.MessageType.SUBSCRIBE_URI)
+        def subscribe(message: netaio.Message, writer):
+            server.subscribe(message.body.uri, writer)
+            return netaio.Message.prepare(
+                netaio.Body.prepare(str(os.getpid()).encode(), uri=message.body.uri),
+                netaio.MessageType.CONFIRM_SUBSCRIBE
+            )
+
+        @server.on(netaio.MessageType.PUBLISH_URI)
+        async def publish(message: netaio.Message, _):
+            await server.notify(message.body.uri, netaio.Message.prepare(
+                netaio.Body.prepare(message.body.content, uri=message.body.uri),
+                netaio.MessageType.NOTIFY_URI
+            ))
+            return netaio.make_ok_msg()
+
+        @server.on((netaio.MessageType.REQUEST_URI, b'broadcast'))
+        async def broadcast(message: netaio.Message, _):
+            await server.broadcast(netaio.Message.prepare(
+                netaio.Body.prepare(b'to everyone', uri=b'broadcast'),
+                netaio.MessageType.NOTIFY_URI
+            ))
+
+        async def run_test():
+            await asyncio.sleep(0.5)
+            # connect subscribers until both workers have one
+            subscribers, pids = [], set()
+            while len(pids) < 2 and len(subscribers) < 30:
+                client = netaio.TCPClient(host='127.0.0.1', port=port)
+                await client.connect()
+                await client.send(netaio.Message.prepare(
+                    netaio.Body.prepare(b'', uri=b'news'),
+                    netaio.MessageType.SUBSCRIBE_URI
+                ))
+                response = await client.receive_once()
+                assert response is not None
+                pids.add(int(response.body.content))
+                subscribers.append(client)
+            assert len(pids) == 2, pids
+            await asyncio.sleep(0.3)
+
+            publisher = netaio.TCPClient(host='127.0.0.1', port=port)
+            await publisher.connect()
+            await publisher.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'headline', uri=b'news'),
+                netaio.MessageType.PUBLISH_URI
+            ))
+            response = await publisher.receive_once()
+            assert response is not None
+            assert response.header.message_type is netaio.MessageType.OK
+            for client in subscribers:
+                response = await asyncio.wait_for(client.receive_once(), 2)
+                assert response is not None
+                assert response.body.content == b'headline', response.body.content
+
+            await publisher.send(netaio.Message.prepare(
+                netaio.Body.prepare(b'', uri=b'broadcast'),
+                netaio.MessageType.REQUEST_URI
+            ))
+            for client in subscribers:
+                response = await asyncio.wait_for(client.receive_once(), 2)
+                assert response is not None
+                assert response.body.content == b'to everyone', response.body.content
+
+            for client in subscribers + [publisher]:
+                await client.close()
+
+        pool = netaio.WorkerPool(server, 2, restart_delay=0, use_bus=True)
+        pool.start()
+        bus_path = pool.bus_path
+        try:
+            print()
+            print(f'{self.__class__.__name__}.test_worker_bus_forwards_notify_and_broadcast')
+            asyncio.run(run_test())
+        finally:
+            pool.stop()
+        assert not os.path.exists(bus_path)
+
+    def test_worker_bus_tracks_subscriber_interest(self):
+        async def run_test():
+            path = tempfile.mkdtemp()
+            servers = [netaio.TCPServer(port=self.PORT + 2) for _ in range(2)]
+            buses = [
+                netaio.WorkerBus(path, i, 2, max_pending=2) for i in range(2)
+            ]
+            for bus, server in zip(buses, servers):
+                await bus.start(server)
+            await asyncio.sleep(0.3)
+
+            # subscriptions are announced to the other worker
+            writer = object()
+            servers[1].subscribe(b'news', writer) # type: ignore
+            servers[1].subscribe(b'sensors/*', writer) # type: ignore
+            await asyncio.sleep(0.1)
+            assert buses[0].interest == {b'news': {1}, b'sensors/*': {1}}
+            assert buses[0].has_subscribers(b'sensors/1')
+            assert buses[1].interest == {}
+
+            # notifications are only forwarded where needed
+            message = netaio.Message.prepare(
+                netaio.Body.prepare(b'hello', uri=b'news'),
+                netaio.MessageType.NOTIFY_URI
+            )
+            await servers[0].notify(b'other', message)
+            assert buses[0].messages_forwarded == 0
+            servers[1].unsubscribe_all(writer) # type: ignore
+            await asyncio.sleep(0.1)
+            assert buses[0].interest == {}
+            await servers[0].notify(b'news', message)
+            assert buses[0].messages_forwarded == 0
+
+            # a slow forwarded fan-out does not delay announcements
+            release = asyncio.Event()
+            delivered = []
+            async def slow_broadcast(message, **kwargs):
+                await release.wait()
+                delivered.append(message.body.content)
+            servers[1].broadcast = slow_broadcast # type: ignore
+            await servers[0].broadcast(netaio.Message.prepare(
+                netaio.Body.prepare(b'0', uri=b'news'),
+                netaio.MessageType.NOTIFY_URI
+            ))
+            servers[0].subscribe(b'news', writer) # type: ignore
+            await asyncio.sleep(0.1)
+            assert buses[1].messages_received == 1
+            assert buses[1].interest == {b'news': {0}}
+
+            # reading stops while max_pending fan-outs are waiting, and
+            # forwarded messages are sent in the order they were received
+            for i in range(1, 6):
+                await servers[0].broadcast(netaio.Message.prepare(
+                    netaio.Body.prepare(str(i).encode(), uri=b'news'),
+                    netaio.MessageType.NOTIFY_URI
+                ))
+            await asyncio.sleep(0.1)
+            assert buses[1].messages_received == 4
+            release.set()
+            await asyncio.sleep(0.1)
+            assert buses[1].messages_received == 6
+            assert delivered == [b'0', b'1', b'2', b'3', b'4', b'5'], delivered
+
+            for bus in buses:
+                await bus.stop()
+            assert servers[0].bus is None
+            shutil.rmtree(path)
+
+        print()
+        print(f'{self.__class__.__name__}.test_worker_bus_tracks_subscriber_interest')
+        asyncio.run(run_test())
+
+
 if __name__ == "__main__":
     unittest.main()
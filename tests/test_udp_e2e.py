@@ -1163,5 +1163,77 @@ class TestUDPE2ETwoLayersOfPlugins(unittest.TestCase):
         asyncio.run(run_test())
 
 
+
+class TestUDPE2EResponseCache(unittest.TestCase):
+    PORT = randint(10000, 65535)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.local_ip = netaio.node.get_ip() if platform.system() == 'Windows' \
+            else '0.0.0.0'
+        netaio.default_server_logger.setLevel(logging.INFO)
+        netaio.default_client_logger.setLevel(logging.INFO)
+
+    def test_response_cache(self):
+        async def run_test():
+            client_log: list[netaio.Message] = []
+            calls = []
+            cache = netaio.ResponseCache()
+            server = netaio.UDPNode(
+                interface=self.local_ip, port=self.PORT,
+                logger=netaio.default_server_logger,
+                ignore_own_ip=False, response_cache=cache,
+            )
+            client = netaio.UDPNode(
+                interface=self.local_ip, port=self.PORT+1,
+                default_handler=lambda msg, addr: client_log.append(msg),
+                logger=netaio.default_client_logger,
+                ignore_own_ip=False
+            )
+            server_addr = (self.local_ip, self.PORT)
+            data = {b'item': b'v1'}
+
+            @server.on((netaio.MessageType.REQUEST_URI, b'item'))
+            def request_item(message: netaio.Message, _: tuple[str, int]):
+                calls.append(message.body.uri)
+                return netaio.make_respond_uri_msg(data[b'item'], b'item')
+
+            @server.on((netaio.MessageType.UPDATE_URI, b'item'))
+            def update_item(message: netaio.Message, _: tuple[str, int]):
+                data[b'item'] = message.body.content
+                return netaio.make_ok_msg(uri=b'item')
+
+            def msg(message_type, content: bytes = b'') -> netaio.Message:
+                return netaio.Message.prepare(
+                    netaio.Body.prepare(content, uri=b'item'), message_type
+                )
+
+            await server.start()
+            await client.start()
+            await asyncio.sleep(0.1)
+
+            for _ in range(2):
+                client.send(msg(netaio.MessageType.REQUEST_URI), server_addr)
+                await asyncio.sleep(0.1)
+            assert [m.body.content for m in client_log] == [b'v1', b'v1']
+            assert calls == [b'item']
+
+            client.send(msg(netaio.MessageType.UPDATE_URI, b'v2'), server_addr)
+            await asyncio.sleep(0.1)
+            client.send(msg(netaio.MessageType.REQUEST_URI), server_addr)
+            await asyncio.sleep(0.1)
+            assert client_log[-1].body.content == b'v2'
+            assert calls == [b'item', b'item']
+            assert cache.counters['hits'] == 1
+            assert cache.counters['invalidations'] == 1
+
+            await server.stop()
+            await client.stop()
+            await asyncio.sleep(0.1)
+
+        print()
+        asyncio.run(run_test())
+
+
 if __name__ == "__main__":
     unittest.main()